@@ -1,6 +1,7 @@
 // cronjob.js
 import cron from 'node-cron';
-import { exec } from 'child_process';
+import { exec, spawn } from 'child_process';
+import net from 'net';
 import path from 'path';
 import fs from 'fs';
 import { fileURLToPath } from 'url';
@@ -18,6 +19,8 @@ if (!fs.existsSync(pythonExecutable)) {
 
 const getAllScriptPath = path.join(backendRoot, 'scripts', 'get_all.py');
 const getSetupScriptPath = path.join(backendRoot, 'scripts', 'get_setup.py');
+const syncDaemonScriptPath = path.join(backendRoot, 'scripts', 'sync_daemon.py');
+const syncSocketPath = path.join(backendRoot, 'sync.sock');
 const configPath = path.join(backendRoot, 'config', 'setup.json');
 
 // Hilfsfunktion zum Laden der Konfigurationsdatei
@@ -36,6 +39,57 @@ function loadConfig() {
   }
 }
 
+// Persistenter Sync-Dienst (sync_daemon.py), wird bei Absturz neu gestartet
+function startSyncDaemon() {
+  console.log('[Sync Daemon] Starte sync_daemon.py...');
+  const child = spawn(pythonExecutable, [syncDaemonScriptPath], {
+    cwd: backendRoot,
+    env: { ...process.env, PYTHONUNBUFFERED: '1' },
+  });
+
+  child.stdout.on('data', (data) => console.log('[Sync Daemon]', data.toString().trimEnd()));
+  child.stderr.on('data', (data) => console.error('[Sync Daemon] STDERR:', data.toString().trimEnd()));
+
+  child.on('exit', (code, signal) => {
+    console.warn(`[Sync Daemon] ⚠️ Beendet (code=${code}, signal=${signal}) – Neustart in 10s`);
+    setTimeout(startSyncDaemon, 10000);
+  });
+}
+
+// get_setup.py im Long-Poll-Modus (--watch), wird bei Absturz neu gestartet
+function startSetupWatch() {
+  console.log('[Setup] Starte get_setup.py --watch...');
+  const child = spawn(pythonExecutable, [getSetupScriptPath, '--watch'], {
+    cwd: backendRoot,
+    env: { ...process.env, PYTHONUNBUFFERED: '1' },
+  });
+
+  child.stdout.on('data', (data) => console.log('[Setup]', data.toString().trimEnd()));
+  child.stderr.on('data', (data) => console.error('[Setup] STDERR:', data.toString().trimEnd()));
+
+  child.on('exit', (code, signal) => {
+    console.warn(`[Setup] ⚠️ Beendet (code=${code}, signal=${signal}) – Neustart in 10s`);
+    setTimeout(startSetupWatch, 10000);
+  });
+}
+
+// Sofortige Synchronisation beim laufenden sync_daemon.py anfordern
+export function triggerSync() {
+  return new Promise((resolve) => {
+    const socket = net.createConnection(syncSocketPath, () => {
+      socket.end('sync\n');
+    });
+    socket.on('data', (data) => {
+      resolve(data.toString().trim() === 'ok');
+      socket.destroy();
+    });
+    socket.on('error', (err) => {
+      console.warn('[Sync Daemon] ⚠️ Trigger fehlgeschlagen:', err.message);
+      resolve(false);
+    });
+  });
+}
+
 // Dynamischer Loop für get_all.py
 function startGetAllLoop() {
   const config = loadConfig();
@@ -44,6 +98,12 @@ function startGetAllLoop() {
     return;
   }
 
+  // Standard: persistenter Dienst; "sync_daemon": false nutzt den alten exec-Loop
+  if (config.sync_daemon !== false) {
+    startSyncDaemon();
+    return;
+  }
+
   const syncSeconds = config.sync_interval || 300;
   const intervalMs = syncSeconds * 1000;
 
@@ -62,8 +122,14 @@ function startGetAllLoop() {
   setInterval(execute, intervalMs);
 }
 
-// Fester Cronjob für get_setup.py (jede volle Stunde)
+// Fester Cronjob für get_setup.py (alle 5 Minuten),
+// mit "setup_long_poll": true stattdessen ein dauerhafter Long-Poll
 function scheduleGetSetupJob() {
+  if (loadConfig()?.setup_long_poll) {
+    startSetupWatch();
+    return;
+  }
+
   cron.schedule('*/5 * * * *', () => {
     console.log('[Cronjob] Starte get_setup.py...');
     exec(`${pythonExecutable} ${getSetupScriptPath}`, (error, stdout, stderr) => {
@@ -3,6 +3,7 @@ import fs from 'fs';
 import path from 'path';
 import { fileURLToPath } from 'url';
 import { execFile } from 'child_process';
+import { triggerSync } from '../jobs/cronjob.js';
 
 const router = express.Router();
 
@@ -10,10 +11,163 @@ const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
 const MEDIA_DIR = path.resolve(__dirname, '../downloads');
+const RENDITION_INDEX = path.join(MEDIA_DIR, 'renditions', 'index.json');
+const VIDEOPREP_INDEX = path.join(MEDIA_DIR, 'videoprep', 'index.json');
+const MEDIA_INDEX = path.join(MEDIA_DIR, 'media-index.json');
+const MEDIA_INDEX_VERSION = 1;
+// Zuletzt angezeigt (für die LRU-Verdrängung in storage_budget.py)
+const SHOWN_FILE = path.resolve(__dirname, '../config/media_shown.json');
+const SHOWN_FLUSH_MS = 60 * 1000;
 
-router.get('/', (req, res) => {
+// Löschaufträge so lange sammeln und dann gemeinsam an mark_to_delete.py geben
+const DELETE_BATCH_DELAY_MS = 500;
+
+// Zuletzt gelesener Medienindex (von get_all.py geschrieben), schon als JSON-String
+let mediaIndexCache = { mtimeMs: 0, media: null, body: null };
+
+// Dateinamen, die auf den nächsten mark_to_delete.py-Aufruf warten
+let pendingDeletes = new Set();
+let deleteTimer = null;
+
+// Original-URL → Zeitpunkt der letzten Auslieferung (ms), erst bei Bedarf geladen
+let shownAt = null;
+let shownTimer = null;
+// Ausgelieferte URL (Original oder bildschirmgerechte Kopie) → Original-URL
+let shownUrls = { media: null, map: new Map() };
+
+// Index-Datei der Nachbearbeitung lesen (fehlend/ungültig → leer)
+function loadIndex(file, key) {
+  try {
+    return JSON.parse(fs.readFileSync(file, 'utf-8'))[key] || {};
+  } catch {
+    return {};
+  }
+}
+
+// media-index.json nur neu einlesen, wenn sich die Datei geändert hat
+async function loadMediaIndex() {
+  let stat;
+  try {
+    stat = await fs.promises.stat(MEDIA_INDEX);
+  } catch {
+    return null;
+  }
+  if (mediaIndexCache.body && stat.mtimeMs === mediaIndexCache.mtimeMs) {
+    return mediaIndexCache;
+  }
+  try {
+    const index = JSON.parse(await fs.promises.readFile(MEDIA_INDEX, 'utf-8'));
+    if (index.version !== MEDIA_INDEX_VERSION || !Array.isArray(index.media)) {
+      return null;
+    }
+    mediaIndexCache = { mtimeMs: stat.mtimeMs, media: index.media, body: JSON.stringify(index.media) };
+    return mediaIndexCache;
+  } catch (err) {
+    console.error('[Backend] Medienindex ungültig:', err);
+    return null;
+  }
+}
+
+function loadShown() {
+  try {
+    const data = JSON.parse(fs.readFileSync(SHOWN_FILE, 'utf-8'));
+    return data && typeof data === 'object' ? data : {};
+  } catch {
+    return {};
+  }
+}
+
+// Atomar schreiben; Einträge nicht mehr vorhandener Medien fallen dabei weg
+function flushShown() {
+  shownTimer = null;
+  if (shownUrls.media) {
+    const known = new Set(shownUrls.map.values());
+    for (const url of Object.keys(shownAt)) {
+      if (!known.has(url)) delete shownAt[url];
+    }
+  }
+  const tmp = SHOWN_FILE + '.tmp';
+  fs.promises.writeFile(tmp, JSON.stringify(shownAt))
+    .then(() => fs.promises.rename(tmp, SHOWN_FILE))
+    .catch(err => console.error('[Backend] media_shown.json nicht geschrieben:', err));
+}
+
+function originalUrl(url) {
+  const media = mediaIndexCache.media;
+  if (media && shownUrls.media !== media) {
+    const map = new Map();
+    for (const m of media) {
+      map.set(m.url, m.url);
+      if (m.displayUrl) map.set(m.displayUrl, m.url);
+    }
+    shownUrls = { media, map };
+  }
+  if (shownUrls.map.has(url)) return shownUrls.map.get(url);
+  // Ohne Index: nur Originaldateien zuordnen
+  return /^\/downloads\/(images|videos)\/[^/]+$/.test(url) ? url : null;
+}
+
+// Middleware vor express.static('/downloads'): merkt sich, wann ein Medium
+// zuletzt an die Diashow ausgeliefert wurde
+export function recordShown(req, res, next) {
+  if (req.method === 'GET') {
+    let url = null;
+    try {
+      url = originalUrl('/downloads' + decodeURIComponent(req.path));
+    } catch {
+      // Ungültige Kodierung: nichts merken
+    }
+    if (url) {
+      shownAt ??= loadShown();
+      shownAt[url] = Date.now();
+      if (!shownTimer) {
+        shownTimer = setTimeout(flushShown, SHOWN_FLUSH_MS);
+      }
+    }
+  }
+  next();
+}
+
+// Gelöschte Datei sofort aus dem zwischengespeicherten Index entfernen
+function dropFromMediaIndex(url) {
+  if (!mediaIndexCache.media) return;
+  const media = mediaIndexCache.media.filter(m => m.url !== url);
+  mediaIndexCache = { ...mediaIndexCache, media, body: JSON.stringify(media) };
+}
+
+// Gesammelte Dateinamen in einem Prozess löschen lassen (über stdin).
+// Das Skript blendet die lokalen Kopien sofort aus und stellt sie wieder her,
+// falls der Server ablehnt – die Änderung am Medienindex meldet der Watcher.
+function flushDeletes() {
+  const filenames = [...pendingDeletes];
+  pendingDeletes = new Set();
+  deleteTimer = null;
+
+  const child = execFile('python3', ['scripts/mark_to_delete.py', '-'], (error, stdout) => {
+    console.log('mark_to_delete.py output:', stdout);
+    if (error) {
+      console.error('Error running mark_to_delete.py:', error);
+    }
+  });
+  child.stdin.end(filenames.join('\n') + '\n');
+}
+
+function queueDelete(filename) {
+  pendingDeletes.add(filename);
+  if (!deleteTimer) {
+    deleteTimer = setTimeout(flushDeletes, DELETE_BATCH_DELAY_MS);
+  }
+}
+
+router.get('/', async (req, res) => {
   console.log('[Backend] GET /media called');
 
+  const index = await loadMediaIndex();
+  if (index) {
+    return res.type('json').send(index.body);
+  }
+
+  // Fallback ohne Index (z.B. vor dem ersten Sync): Verzeichnisse durchsuchen
   const media = [];
 
   try {
@@ -25,7 +179,10 @@ router.get('/', (req, res) => {
         console.log(`[Backend] Verzeichnis nicht gefunden: ${dir}`);
         return [];
       }
-      return fs.readdirSync(dir).map(file => path.join(dir, file));
+      // Unfertige Downloads (*.part) ausblenden
+      return fs.readdirSync(dir)
+        .filter(file => !file.endsWith('.part'))
+        .map(file => path.join(dir, file));
     }
 
     const images = listFiles(imagesDir).map(f => ({ type: 'image', path: f }));
@@ -33,6 +190,10 @@ router.get('/', (req, res) => {
 
     media.push(...images, ...videos);
 
+    // Bildschirmgerechte Kopien aus renditions.py / videoprep.py
+    const renditions = loadIndex(RENDITION_INDEX, 'images');
+    const preparedVideos = loadIndex(VIDEOPREP_INDEX, 'videos');
+
     // console.log(`[Backend] Gefundene Medien: ${media.length}`);
     // media.forEach(m => console.log(m)); 
 
@@ -57,9 +218,16 @@ router.get('/', (req, res) => {
         }
       }
 
+      const fileName = path.basename(m.path);
+      const prepared = m.type === 'video' ? preparedVideos[fileName] || {} : {};
+      const rendition = m.type === 'image' ? renditions[fileName] : prepared.video;
+
+      // url bleibt der Originalpfad (wird zum Löschen verwendet)
       return {
         type: m.type,
         url: '/downloads/' + relativePath,
+        displayUrl: '/downloads/' + (rendition || relativePath),
+        poster: prepared.poster ? '/downloads/' + prepared.poster : undefined,
         subtitle,
       };
     });
@@ -74,6 +242,15 @@ router.get('/', (req, res) => {
   }
 });
 
+// Sofortige Synchronisation anstoßen
+router.post('/sync', async (req, res) => {
+  const ok = await triggerSync();
+  if (!ok) {
+    return res.status(503).json({ error: 'Sync-Dienst nicht erreichbar' });
+  }
+  res.json({ message: 'Synchronisation gestartet' });
+});
+
 router.delete('/', (req, res) => {
   const { url } = req.body;  // z.B. '/downloads/images/bild1.jpg'
 
@@ -88,26 +265,18 @@ router.delete('/', (req, res) => {
     return res.status(400).json({ error: 'Ungültiger Dateipfad' });
   }
 
-  fs.unlink(filePath, (err) => {
+  fs.access(filePath, (err) => {
     if (err) {
       console.error('[Backend] Fehler beim Löschen der Datei:', err);
       return res.status(500).json({ error: 'Datei konnte nicht gelöscht werden' });
     }
 
-    console.log(`[Backend] Datei gelöscht: ${filePath}`);
+    // Entfernen übernimmt mark_to_delete.py (mit Rücknahme bei Ablehnung)
+    console.log(`[Backend] Datei zum Löschen vorgemerkt: ${filePath}`);
+    dropFromMediaIndex(url);
+    queueDelete(path.basename(filePath));
     res.json({ message: 'Datei erfolgreich gelöscht' });
   });
-
-  // inside your router.delete handler, after file deletion success:
-  const filename = path.basename(filePath); // get just the filename with extension
-
-  execFile('python3', ['scripts/mark_to_delete.py', filename], (error, stdout, stderr) => {
-    if (error) {
-      console.error('Error running mark_to_delete.py:', error);
-      return; // or handle error
-    }
-    console.log('mark_to_delete.py output:', stdout);
-  });
 });
 
 export default router;
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+api_client.py
+
+Shared HTTP client for all backend scripts talking to the 'three-pics.com' API.
+
+Features:
+- One pooled keep-alive session per process (`SESSION`), shared by all threads
+- A default (connect, read) timeout on every request, so no call can hang
+- Retries with exponential backoff and full jitter for idempotent requests
+  (GET, HEAD, PUT, DELETE, OPTIONS) on timeouts, connection errors and
+  429/5xx answers; other methods are sent once unless a caller opts in
+- Request-level timing hooks: callables registered with `add_timing_hook()`
+  receive method, URL, status, duration and attempt of every request.
+  Setting THREEPICS_HTTP_TIMING=1 in the environment prints one line per
+  request.
+- THREEPICS_API_ORIGIN (e.g. http://127.0.0.1:8765) replaces
+  https://three-pics.com for all API and token requests.
+
+Usage:
+    import api_client
+    response = api_client.get(f"{api_client.API_BASE_URL}/setup/", headers=headers)
+
+Requirements:
+- Python 3.x
+- requests library
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+
+# THREEPICS_API_ORIGIN points the scripts at a stand-in server, e.g. the
+# local fake API of the benchmark suite (benchmarks/fake_api.py)
+API_ORIGIN = os.environ.get("THREEPICS_API_ORIGIN", "https://three-pics.com").rstrip("/")
+API_BASE_URL = f"{API_ORIGIN}/api"
+OAUTH2_TOKEN_URL = f"{API_ORIGIN}/o/token/"
+
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (10, 60)
+POOL_SIZE = 16
+MAX_RETRIES = 3
+# Base delay in seconds; attempt n waits up to RETRY_BACKOFF * 2 ** (n - 1)
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+def create_session(pool_size=POOL_SIZE):
+    """
+    Create a keep-alive session with a connection pool per host.
+
+    Args:
+        pool_size (int): Connections kept open per host.
+
+    Returns:
+        requests.Session: The new session.
+    """
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+    return session
+
+
+SESSION = create_session()
+
+
+def add_timing_hook(hook):
+    """
+    Register a callable that is told about every request.
+
+    Args:
+        hook (callable): Called as hook(method, url, status, elapsed, attempt);
+            status is None if no response arrived, elapsed is in seconds
+            (until the response headers for streamed requests).
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_timing_hook(hook):
+    """
+    Unregister a hook added with add_timing_hook().
+
+    Args:
+        hook (callable): The hook to remove.
+    """
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def print_timing(method, url, status, elapsed, attempt):
+    """
+    Timing hook that prints one line per request.
+    """
+    retry = f" (attempt {attempt})" if attempt > 1 else ""
+    print(f"⏱️  {method} {url} → {status or 'no response'} in {elapsed * 1000:.0f} ms{retry}")
+
+
+def _report(method, url, status, elapsed, attempt):
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        hook(method, url, status, elapsed, attempt)
+
+
+def backoff_delay(attempt, base=RETRY_BACKOFF):
+    """
+    Return the wait before the next attempt (exponential backoff, full jitter).
+
+    Args:
+        attempt (int): Number of the attempt that just failed (1-based).
+        base (float): Delay ceiling of the first retry in seconds.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    return random.uniform(0, base * 2 ** (attempt - 1))
+
+
+def is_retryable(error):
+    """
+    Check whether a failed request is worth retrying.
+
+    Args:
+        error (Exception): The exception raised by the request.
+
+    Returns:
+        bool: True for timeouts, connection errors, 429 and 5xx responses.
+    """
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.exceptions.HTTPError) and response is not None and \
+        (response.status_code == 429 or response.status_code >= 500)
+
+
+def request(method, url, session=None, timeout=DEFAULT_TIMEOUT, retries=None, **kwargs):
+    """
+    Send a request, retrying transient failures of idempotent requests.
+
+    Args:
+        method (str): HTTP method.
+        url (str): Full URL.
+        session (requests.Session): Session to use (default: SESSION).
+        timeout: Timeout passed to requests, a number or (connect, read).
+        retries (int): Retries after the first attempt; defaults to
+            MAX_RETRIES for idempotent methods and 0 otherwise. Bodies must
+            be re-sendable (bytes, dict or json) when retries are allowed.
+        **kwargs: Passed on to requests (headers, params, json, data, stream).
+
+    Returns:
+        requests.Response: The response. A retryable status (429/5xx) is
+        returned once retries are exhausted; callers check the status.
+
+    Raises:
+        requests.exceptions.RequestException: If no response arrived.
+    """
+    method = method.upper()
+    session = session or SESSION
+    if retries is None:
+        retries = MAX_RETRIES if method in IDEMPOTENT_METHODS else 0
+
+    attempt = 1
+    while True:
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            _report(method, url, None, time.monotonic() - started, attempt)
+            if attempt > retries:
+                raise
+        else:
+            _report(method, url, response.status_code, time.monotonic() - started, attempt)
+            if response.status_code not in RETRY_STATUSES or attempt > retries:
+                return response
+            response.close()
+        time.sleep(backoff_delay(attempt))
+        attempt += 1
+
+
+def get(url, **kwargs):
+    """
+    Send a GET request, see request().
+    """
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """
+    Send a POST request, see request().
+    """
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    """
+    Send a PUT request, see request().
+    """
+    return request("PUT", url, **kwargs)
+
+
+if os.environ.get("THREEPICS_HTTP_TIMING") == "1":
+    add_timing_hook(print_timing)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+bandwidth.py
+
+Token-bucket rate limiting for sync traffic (downloads in get_all.py, uploads
+in put_files.py), configured in config/setup.json.
+
+Settings (all optional, limits in Mbit/s, missing or 0 means unlimited):
+- `download_limit_mbit` / `upload_limit_mbit`: default limits
+- `bandwidth_profiles`: time-of-day profiles, the first one whose window
+  contains the current local time wins; windows may wrap past midnight:
+      [{"from": "07:00", "to": "23:00", "download_limit_mbit": 4,
+        "upload_limit_mbit": 1}]
+- `bandwidth_unlimited_when_display_off` (default true): lift the limit while
+  the display backlight is off, since nobody is watching the slideshow
+
+The active limit is re-evaluated every PROFILE_CHECK_INTERVAL seconds, so a
+long sync picks up profile changes and the display being switched off or on.
+One Throttle is shared by all workers of a run; it sums up the time the
+workers spent waiting, which the scripts report at the end of the run.
+
+Usage:
+    throttle = bandwidth.Throttle(setup, "download")
+    throttle.consume(len(chunk))
+    throttle.report()
+
+Requirements:
+- Python 3.x
+"""
+
+import glob
+import threading
+import time
+
+# Seconds between two checks of the time-of-day profile and the display
+PROFILE_CHECK_INTERVAL = 10
+# Bytes that may be sent at once after an idle phase, in seconds of the limit
+BURST_SECONDS = 0.5
+BACKLIGHT_GLOB = "/sys/class/backlight/*"
+
+
+def display_is_off():
+    """
+    Check whether the display backlight is switched off.
+
+    Returns:
+        bool: True if a backlight reports power-down or brightness 0; False
+        if it is on or there is no backlight to ask.
+    """
+    for device in glob.glob(BACKLIGHT_GLOB):
+        # bl_power: 0 is on, anything else a blanking level
+        for name, on_value in (("bl_power", 0), ("brightness", None)):
+            try:
+                with open(f"{device}/{name}", "r", encoding="utf-8") as f:
+                    value = int(f.read().strip())
+            except (OSError, ValueError):
+                continue
+            if (value != on_value) if on_value is not None else value == 0:
+                return True
+    return False
+
+
+def parse_clock(value):
+    """
+    Convert "HH:MM" into minutes after midnight.
+
+    Args:
+        value (str): The time of day.
+
+    Returns:
+        int: Minutes after midnight, or None if the value is invalid.
+    """
+    try:
+        hours, minutes = (int(part) for part in str(value).split(":"))
+    except ValueError:
+        return None
+    if not (0 <= hours <= 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def active_profile(setup, now=None):
+    """
+    Return the time-of-day profile that applies now.
+
+    Args:
+        setup (dict): The setup configuration.
+        now (time.struct_time): Local time to check (default: now).
+
+    Returns:
+        dict: The first matching entry of `bandwidth_profiles`, or None.
+    """
+    profiles = setup.get("bandwidth_profiles")
+    if not isinstance(profiles, list):
+        return None
+    now = now or time.localtime()
+    minute = now.tm_hour * 60 + now.tm_min
+    for profile in profiles:
+        if not isinstance(profile, dict):
+            continue
+        start, end = parse_clock(profile.get("from")), parse_clock(profile.get("to"))
+        if start is None or end is None:
+            continue
+        if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+            return profile
+    return None
+
+
+def current_limit(setup, direction, now=None):
+    """
+    Determine the rate limit that applies now.
+
+    Args:
+        setup (dict): The setup configuration.
+        direction (str): "download" or "upload".
+        now (time.struct_time): Local time to check (default: now).
+
+    Returns:
+        float: The limit in bytes per second, or None for unlimited.
+    """
+    if setup.get("bandwidth_unlimited_when_display_off", True) and display_is_off():
+        return None
+    key = f"{direction}_limit_mbit"
+    profile = active_profile(setup, now)
+    value = profile.get(key) if profile and key in profile else setup.get(key)
+    try:
+        mbit = float(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return mbit * 1000 * 1000 / 8 if mbit > 0 else None
+
+
+class Throttle:
+    """
+    Thread-safe token bucket limiting the transfer rate of one direction.
+
+    Args:
+        setup (dict): The setup configuration.
+        direction (str): "download" or "upload".
+    """
+
+    def __init__(self, setup, direction):
+        self.direction = direction
+        self.throttled_seconds = 0.0
+        self._setup = setup
+        self._lock = threading.Lock()
+        self._rate = None
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._checked = None
+
+    def _refresh(self, now):
+        if self._checked is not None and now - self._checked < PROFILE_CHECK_INTERVAL:
+            return
+        self._checked = now
+        rate = current_limit(self._setup, self.direction)
+        if rate != self._rate:
+            self._rate = rate
+            self._tokens = rate * BURST_SECONDS if rate else 0.0
+            self._updated = now
+
+    def consume(self, nbytes):
+        """
+        Account for transferred bytes and wait until the limit allows them.
+
+        Workers reserve their bytes under the lock and sleep outside of it,
+        so the limit applies to the sum of all workers.
+
+        Args:
+            nbytes (int): Number of bytes transferred or about to be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self._rate is None:
+                return
+            burst = self._rate * BURST_SECONDS
+            self._tokens = min(burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= nbytes
+            delay = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            self.throttled_seconds += delay
+        if delay:
+            time.sleep(delay)
+
+    def report(self):
+        """
+        Print the time the workers spent waiting for the limit, if any.
+        """
+        if self.throttled_seconds > 0:
+            print(f"🐢 {self.direction.capitalize()} throttled for {self.throttled_seconds:.1f}s "
+                  f"(summed over workers)")
@@ -4,35 +4,77 @@ get_all.py
 
 A command-line script to authenticate with a local API using OAuth2 client credentials,
 retrieve a list of media items, and download them into organized local directories
-based on media type. Supports automated installation of missing dependencies
-(`requests`), structured downloads, and cleanup of outdated files.
+based on media type. Supports structured downloads and cleanup of outdated
+files.
 
 Features:
 - Reads OAuth2 client credentials from config/credentials.json.
-- Automatically installs the 'requests' package if not available.
-- Obtains an access token via the client credentials grant flow.
-- Fetches media metadata (images, videos, texts) from the API.
+- Obtains an access token via the client credentials grant flow, reusing the
+  shared on-disk token cache (token_cache.py) across runs.
+- Fetches media metadata (images, videos, texts) from the API. The request is
+  conditional (ETag / Last-Modified stored in config/media_state.json); a 304
+  answer ends the cycle immediately. If the server hands out a sync cursor,
+  later requests only ask for the changes `since=<cursor>`.
+- Keeps the sync state in an SQLite manifest (manifest.py) keyed by media id,
+  so each cycle only downloads new or changed items and knows which files
+  belong to removed items without scanning the directories.
+- Verifies downloads against the size / SHA-256 reported by the API while
+  streaming, and re-checks existing files by size and mtime (hashing only on
+  mismatch) so truncated or modified copies are fetched again.
 - Downloads media files into categorized directories under 'downloads/':
     - images/   → .jpg files
     - videos/   → .mp4 files
     - texts/    → .txt files with metadata for images/videos
     - messages/ → .txt files for standalone text content
 - Saves accompanying text content as .txt files when available.
+- Downloads stream into `<name>.<version>.part` next to the target, resume
+  with HTTP Range requests after an interruption (only for the same version
+  of the item) and are fsynced and atomically renamed into place when
+  complete.
+- Downloads run concurrently on a bounded worker pool (`download_workers` in
+  config/setup.json, default 4) and the run ends with a throughput summary.
+- Downloads are queued by priority: images in slideshow order first, then
+  videos, items of LARGE_ITEM_BYTES or more last. media-index.json is written
+  as soon as the first items are on disk, so the slideshow starts before the
+  sync is complete. The time until `first_display_items` (default 10) items
+  were displayable is recorded in config/sync_metrics.json.
+- Optional bandwidth limits with time-of-day profiles (bandwidth.py,
+  `download_limit_mbit` / `bandwidth_profiles` in config/setup.json), lifted
+  while the display is off; the run reports the time spent throttled.
 - Cleans up previously downloaded files that are no longer part of the current media list.
+- Optional storage budget (storage_budget.py, `storage_budget_mb` /
+  `storage_reserve_mb` / `eviction_policy` in config/setup.json): items are
+  evicted (least recently shown or oldest first) until downloads/ fits, and
+  fetched again once they fit. Each run reports the bytes used per category.
+- Files mirrored before the manifest existed are adopted without re-downloading.
+- Optionally creates display-sized, EXIF-rotated image renditions after the
+  download (renditions.py, `"image_renditions": true` in config/setup.json).
+- Optionally remuxes videos to faststart, caps their resolution and extracts
+  poster frames (videoprep.py, `"video_prep": true`).
+- Takes over images imported from USB (local_imports.py) as soon as they are
+  copied, and links them to their server id once the upload is confirmed, so
+  they are shown right away and never downloaded again.
+- Writes a versioned downloads/media-index.json (type, URLs, subtitle,
+  dimensions, mtime) at the end of each sync, so GET /media can answer from
+  memory instead of scanning the directories on every request. Updates are
+  serialized with the other writers of the index (media_index.py).
+- Only one sync cycle runs at a time (flock on config/sync.lock): a run
+  started while the sync daemon or another get_all.py is busy waits for it.
 
 Directory structure:
 downloads/
 ├── images/
 ├── videos/
 ├── texts/
-└── messages/
+├── messages/
+└── media-index.json
 
 Usage:
     python get_all.py
 
 Requirements:
 - Python 3.x
-- requests library (auto-installed if not present)
+- requests (see requirements.txt)
 - OAuth2 credentials in config/credentials.json
 
 Example credentials.json:
@@ -48,66 +90,190 @@ Exit Codes:
 
 import sys
 import os
+import fcntl
+import glob
 import json
-import tempfile
-import shutil
+import hashlib
+import string
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-API_BASE_URL = "https://three-pics.com/api"
-OAUTH2_TOKEN_URL = "https://three-pics.com/o/token/"
 DOWNLOAD_DIR = os.path.join(os.path.dirname(__file__), "../downloads")
+SETUP_FILE = os.path.join("config", "setup.json")
+MEDIA_STATE_FILE = os.path.join("config", "media_state.json")
+# Metrics of the last sync run (time to first displayable items, throughput)
+SYNC_METRICS_FILE = os.path.join("config", "sync_metrics.json")
+# Held for the duration of a sync cycle (run_sync())
+SYNC_LOCK_FILE = os.path.join("config", "sync.lock")
+# Output of the background video preparation (start_video_preparation())
+VIDEOPREP_LOG_FILE = os.path.join("config", "videoprep.log")
+# Precomputed listing served by routes/media.js
+MEDIA_INDEX_FILE = os.path.join(DOWNLOAD_DIR, "media-index.json")
+MEDIA_INDEX_VERSION = 1
+# Partial downloads live next to their target as <name>.<version tag>.part
+PART_SUFFIX = ".part"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_DOWNLOAD_WORKERS = 4
+# Items from this size on are queued behind all smaller images and videos
+LARGE_ITEM_BYTES = 50 * 1024 * 1024
+# Displayable items the "time to first items" metric waits for
+DEFAULT_FIRST_DISPLAY_ITEMS = 10
+# Minimum seconds between two media-index.json updates while downloading
+INDEX_REFRESH_INTERVAL = 30
+
+import requests
+
+import api_client
+import bandwidth
+import local_imports
+import mark_to_delete
+import media_index
+import renditions
+import storage_budget
+import token_cache
+import videoprep
+from manifest import Manifest
+
+
+API_BASE_URL = api_client.API_BASE_URL
+OAUTH2_TOKEN_URL = api_client.OAUTH2_TOKEN_URL
+CREDENTIALS_FILE = os.path.join("config", "credentials.json")
+
+# Set by sync_cycle(); shared by all download workers
+_throttle = None
+
+
+def load_credentials():
+    """
+    Load and validate the OAuth2 client credentials from config/credentials.json.
+
+    Returns:
+        tuple: (client_id, client_secret)
+
+    Raises:
+        FileNotFoundError: If the credentials file is missing.
+        ValueError: If the file is invalid JSON or required fields are missing.
+    """
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise FileNotFoundError("config/credentials.json not found. Please provide credentials.")
+
+    with open(CREDENTIALS_FILE, "r", encoding="utf-8") as credsfile:
+        try:
+            creds = json.load(credsfile)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON decode error in credentials.json: {e}") from e
 
-try:
-    import requests
-except ImportError:
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
+    client_id = creds.get("client_id")
+    client_secret = creds.get("client_secret")
 
+    if not client_id or not client_secret:
+        raise ValueError("Missing 'client_id' or 'client_secret' in credentials.json.")
 
-credentials_path = os.path.join("config", "credentials.json")
+    return client_id, client_secret
 
-if not os.path.exists(credentials_path):
-    print("❌ config/credentials.json not found. Please provide credentials.")
-    sys.exit(1)
 
-with open(credentials_path, "r", encoding="utf-8") as credsfile:
+def load_setup():
+    """
+    Load the local setup configuration written by get_setup.py.
+
+    Returns:
+        dict: The parsed setup.json, or an empty dict if missing or invalid.
+    """
     try:
-        creds = json.load(credsfile)
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON decode error in credentials.json: {e}")
-        sys.exit(1)
+        with open(SETUP_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
 
-CLIENT_ID = creds.get("client_id")
-CLIENT_SECRET = creds.get("client_secret")
 
-if not CLIENT_ID or not CLIENT_SECRET:
-    print("❌ Missing 'client_id' or 'client_secret' in credentials.json.")
-    sys.exit(1)
+def get_download_workers(setup):
+    """
+    Determine the number of concurrent download workers.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        int: The configured worker count (at least 1).
+    """
+    try:
+        workers = int(setup.get("download_workers", DEFAULT_DOWNLOAD_WORKERS))
+    except (TypeError, ValueError):
+        workers = DEFAULT_DOWNLOAD_WORKERS
+    return max(1, workers)
 
 
-def get_oauth2_token(client_id, client_secret):
+def get_first_display_items(setup):
     """
-    Retrieve an OAuth2 access token using client credentials.
+    Determine how many displayable items the "time to first items" metric
+    waits for.
 
     Args:
-        client_id (str): The client ID from the credentials file.
-        client_secret (str): The client secret from the credentials file.
+        setup (dict): The setup configuration.
 
     Returns:
-        str: The access token as a string.
-    
-    Raises:
-        requests.exceptions.HTTPError: If the request to obtain the token fails.
+        int: The configured count (at least 1).
     """
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'scope': 'read write',
-    }
-    response = requests.post(OAUTH2_TOKEN_URL, data=data)
-    response.raise_for_status()
-    return response.json().get('access_token')
+    try:
+        count = int(setup.get("first_display_items", DEFAULT_FIRST_DISPLAY_ITEMS))
+    except (TypeError, ValueError):
+        count = DEFAULT_FIRST_DISPLAY_ITEMS
+    return max(1, count)
+
+
+def load_media_state():
+    """
+    Load the state of the last successful media-list fetch.
+
+    Returns:
+        dict: Stored etag, last_modified, cursor and items (empty if unavailable).
+    """
+    # Without the download directories the stored state does not describe
+    # anything on disk, so force a full fetch.
+    if not os.path.isdir(os.path.join(DOWNLOAD_DIR, "images")):
+        return {}
+
+    try:
+        with open(MEDIA_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_media_state(state):
+    """
+    Atomically persist the media-list state for the next conditional fetch.
+
+    Args:
+        state (dict): The state returned by list_media().
+    """
+    os.makedirs(os.path.dirname(MEDIA_STATE_FILE), exist_ok=True)
+    tmp_path = MEDIA_STATE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, MEDIA_STATE_FILE)
+
+
+def load_skipped(manifest):
+    """
+    Return the ids of the items whose download was discarded in the last
+    cycle (empty body, size or checksum mismatch).
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+
+    Returns:
+        list: Media ids, retried by the next cycle even if the media list
+        is unchanged.
+    """
+    try:
+        skipped = json.loads(manifest.get_meta("skipped_items", "[]"))
+    except ValueError:
+        return []
+    return skipped if isinstance(skipped, list) else []
 
 
 def prepare_directories(base_dir):
@@ -116,54 +282,477 @@ def prepare_directories(base_dir):
 
     Args:
         base_dir (str): The root directory to create subfolders in.
-
-    Returns:
-        dict: A dictionary with empty sets for each media category.
     """
     subdirs = ["images", "videos", "texts", "messages"]
     for subdir in subdirs:
         os.makedirs(os.path.join(base_dir, subdir), exist_ok=True)
 
-    return {subdir: set() for subdir in subdirs}
+
+def item_version(item):
+    """
+    Build a fingerprint of the server-side version of a media item.
+
+    Uses whichever of 'checksum', 'size' and 'updated_at' the API provides,
+    so a re-uploaded file under the same name is detected as changed.
+
+    Args:
+        item (dict): A media item returned by the API.
+
+    Returns:
+        str: The fingerprint (empty if the API provides none of the fields).
+    """
+    return "|".join(str(item.get(field) or "") for field in ("checksum", "size", "updated_at")).strip("|")
+
+
+def text_hash(item):
+    """
+    Hash the text content that is written to disk for a media item.
+
+    Args:
+        item (dict): A media item returned by the API.
+
+    Returns:
+        str: SHA-1 hex digest, or None if the item carries no text.
+    """
+    if item.get("type") == "text":
+        fields = ("text", "telegram_user_id", "telegram_username",
+                  "telegram_first_name", "telegram_last_name")
+        content = json.dumps([item.get(field) for field in fields], ensure_ascii=False)
+    else:
+        content = (item.get("text1") or "").strip()
+        if not content:
+            return None
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def media_filename(item):
+    """
+    Return the local category and filename of a media item.
+
+    Args:
+        item (dict): A media item returned by the API.
+
+    Returns:
+        tuple: (category, filename), or (None, None) for unknown types.
+    """
+    mtype = item.get("type")
+    if mtype in ("image", "video"):
+        return ("images" if mtype == "image" else "videos"), item.get("filename")
+    if mtype == "text":
+        return "messages", f"text_{item.get('id')}.txt"
+    return None, None
+
+
+def caption_filename(filename):
+    """
+    Return the name of the caption file in texts/ for a media filename.
+    """
+    return os.path.splitext(filename)[0] + ".txt"
 
 
-def process_media_item(item, token, expected_files):
+def expected_size(item):
     """
-    Process and download a single media item and its associated text (if any).
+    Return the file size reported by the API for a media item.
 
     Args:
         item (dict): A media item returned by the API.
+
+    Returns:
+        int: The size in bytes, or None if unknown.
+    """
+    try:
+        return int(item["size"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def expected_digest(item):
+    """
+    Return the SHA-256 digest reported by the API for a media item.
+
+    Accepts 'sha256' or 'checksum' fields as bare hex or "sha256:<hex>".
+
+    Args:
+        item (dict): A media item returned by the API.
+
+    Returns:
+        str: Lower-case hex digest, or None if the API provides none.
+    """
+    value = str(item.get("sha256") or item.get("checksum") or "").strip().lower()
+    if value.startswith("sha256:"):
+        value = value[len("sha256:"):]
+    if len(value) == 64 and all(c in string.hexdigits for c in value):
+        return value
+    return None
+
+
+def file_sha256(path):
+    """
+    Compute the SHA-256 digest of a local file.
+
+    Args:
+        path (str): The file to hash.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_matches_item(path, item):
+    """
+    Check an existing file against the size and digest reported by the API.
+
+    Args:
+        path (str): The local file.
+        item (dict): A media item returned by the API.
+
+    Returns:
+        bool: False if the API reports a size or digest that does not match.
+    """
+    size = expected_size(item)
+    if size is not None and os.path.getsize(path) != size:
+        return False
+    digest = expected_digest(item)
+    return digest is None or file_sha256(path) == digest
+
+
+def local_file_intact(entry, manifest):
+    """
+    Cheaply check that a mirrored file is still the one in the manifest.
+
+    Size and mtime are compared first; only if the size matches but the mtime
+    differs is the file hashed. A matching hash refreshes the stored mtime.
+
+    Args:
+        entry (dict): The manifest entry of a media item.
+        manifest (Manifest): The sync-state manifest.
+
+    Returns:
+        bool: True if the file is present and unchanged.
+    """
+    path = os.path.join(DOWNLOAD_DIR, entry["category"], entry["filename"])
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry["mtime"]:
+        return True
+    if entry["mtime"] is None:
+        # Entry recorded before mtimes were tracked: trust the size once
+        manifest.update(entry["id"], mtime=stat.st_mtime_ns)
+        return True
+    if entry["content_hash"] and file_sha256(path) == entry["content_hash"]:
+        manifest.update(entry["id"], mtime=stat.st_mtime_ns)
+        return True
+    return False
+
+
+def mirror_intact(manifest):
+    """
+    Check every mirrored image and video with local_file_intact().
+
+    Run when the media list is unchanged, so files truncated or deleted on
+    the device are repaired without waiting for a change on the server.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+
+    Returns:
+        bool: True if no mirrored file is missing or modified.
+    """
+    return all(
+        local_file_intact(entry, manifest)
+        for entry in manifest.entries().values()
+        if entry["category"] in storage_budget.EVICTABLE_CATEGORIES
+        and not entry["evicted"]
+        and not entry["id"].startswith(local_imports.LOCAL_ID_PREFIX)
+    )
+
+
+def ingest_local_imports(manifest, cycle):
+    """
+    Add images imported from USB (see local_imports.py) to the manifest.
+
+    Unconfirmed imports are kept under a "local:<sha256>" id and marked as
+    seen, so cleanup leaves them alone. Once the upload returned a server id,
+    the entry is keyed by that id and the spool record is dropped.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        cycle (int): The current sync cycle.
+
+    Returns:
+        int: Number of spool records processed.
+    """
+    records = local_imports.pending_imports()
+    if not records:
+        return 0
+
+    entries = manifest.entries()
+    for record in records:
+        content_hash = record["content_hash"]
+        local_id = local_imports.LOCAL_ID_PREFIX + content_hash
+        path = os.path.join(DOWNLOAD_DIR, "images", record["filename"])
+        media_id = record.get("media_id")
+        entry_id = str(media_id) if media_id is not None else local_id
+
+        if not os.path.exists(path):
+            # Deleted on the dashboard before the upload was confirmed
+            manifest.remove(local_id)
+            local_imports.remove_record(content_hash)
+            continue
+
+        server_entry = entries.get(entry_id) if media_id is not None else None
+        if server_entry is not None and server_entry["filename"] != record["filename"]:
+            # The server copy was mirrored already: the local one is redundant
+            remove_local_file(path)
+        elif entry_id in entries:
+            manifest.update(entry_id, last_seen=cycle)
+        else:
+            stat = os.stat(path)
+            width, height = media_dimensions(path, "image")
+            manifest.record({
+                "id": entry_id,
+                "type": "image",
+                "category": "images",
+                "filename": record["filename"],
+                "size": stat.st_size,
+                "content_hash": content_hash,
+                "mtime": stat.st_mtime_ns,
+                "width": width,
+                "height": height,
+                "text_hash": None,
+                "version": None,
+                "last_seen": cycle,
+            })
+            print(f"📥 Local import: {record['filename']}")
+
+        if media_id is not None:
+            manifest.remove(local_id)
+            local_imports.remove_record(content_hash)
+    return len(records)
+
+
+def adopt_local_import(entry, item, manifest, cycle):
+    """
+    Take over a USB-imported image as the mirror of a server item.
+
+    If the local copy matches the size / digest reported by the API, it is
+    renamed to the server filename and recorded with the item's id and
+    version instead of being downloaded again.
+
+    Args:
+        entry (dict): Manifest entry of the import (server id or local id).
+        item (dict): The media item returned by the API.
+        manifest (Manifest): The sync-state manifest.
+        cycle (int): The current sync cycle.
+
+    Returns:
+        dict: The adopted entry, or the given entry if the copy does not match.
+    """
+    category, filename = media_filename(item)
+    old_path = os.path.join(DOWNLOAD_DIR, category, entry["filename"])
+    new_path = os.path.join(DOWNLOAD_DIR, category, filename)
+    try:
+        if not file_matches_item(old_path, item):
+            return entry
+        if old_path != new_path:
+            os.replace(old_path, new_path)
+    except OSError:
+        return entry
+
+    media_id = str(item.get("id"))
+    adopted = {**entry, "id": media_id, "filename": filename,
+               "version": item_version(item), "last_seen": cycle}
+    if entry["id"] != media_id:
+        manifest.remove(entry["id"])
+        local_imports.remove_record(entry["content_hash"])
+    manifest.record(adopted)
+    print(f"🔗 Linked local import to media {media_id}: {filename}")
+    return adopted
+
+
+def plan_sync(media_items, manifest, cycle):
+    """
+    Diff the API response against the manifest.
+
+    Marks every listed item as seen in this cycle and returns the items that
+    are new or changed (filename, server version or text differ), plus those
+    whose local file is missing, truncated or otherwise modified. Images
+    imported from USB are adopted for their server item (by id or digest).
+
+    Args:
+        media_items (list): Media items returned by the API.
+        manifest (Manifest): The sync-state manifest.
+        cycle (int): The current sync cycle.
+
+    Returns:
+        list: Tuples of (item, manifest entry or None, refetch) that need
+        processing; refetch forces a new download of the media file.
+    """
+    entries = manifest.entries()
+    manifest.mark_seen([item.get("id") for item in media_items], cycle)
+    local_by_hash = {
+        entry["content_hash"]: entry for entry in entries.values()
+        if entry["id"].startswith(local_imports.LOCAL_ID_PREFIX)
+    }
+
+    plan = []
+    for item in media_items:
+        category, filename = media_filename(item)
+        if category is None:
+            continue
+        entry = entries.get(str(item.get("id")))
+        if category == "images":
+            if entry is None and expected_digest(item) in local_by_hash:
+                entry = adopt_local_import(local_by_hash.pop(expected_digest(item)),
+                                           item, manifest, cycle)
+                if entry["id"] != str(item.get("id")):
+                    entry = None
+            elif entry is not None and entry["version"] is None:
+                entry = adopt_local_import(entry, item, manifest, cycle)
+        if entry is not None and entry["evicted"]:
+            # Fetched again by readmit_evicted() once it fits the storage budget
+            continue
+        if (
+            entry is None
+            or entry["filename"] != filename
+            or entry["version"] != item_version(item)
+        ):
+            plan.append((item, entry, False))
+        elif category != "messages" and not local_file_intact(entry, manifest):
+            print(f"🩹 Local copy missing or modified, fetching again: {filename}")
+            plan.append((item, entry, True))
+        elif entry["text_hash"] != text_hash(item):
+            plan.append((item, entry, False))
+    return plan
+
+
+def download_priority(plan_entry):
+    """
+    Sort key of the download queue.
+
+    Text messages (no download) come first, then images and videos in the
+    order the slideshow shows them (images first, each by filename). Items of
+    LARGE_ITEM_BYTES or more go last, smallest first, so a single large video
+    does not hold back the photos queued behind it.
+
+    Args:
+        plan_entry (tuple): (item, manifest entry, refetch), see plan_sync().
+
+    Returns:
+        tuple: The sort key.
+    """
+    item = plan_entry[0]
+    category, filename = media_filename(item)
+    if category == "messages":
+        return (0, 0, filename)
+    size = expected_size(item)
+    if size is not None and size >= LARGE_ITEM_BYTES:
+        return (3, size, filename)
+    return (1 if category == "images" else 2, 0, filename)
+
+
+def remove_local_file(path):
+    """
+    Delete a file from the download directory, logging the outcome.
+
+    Args:
+        path (str): The file to delete.
+    """
+    try:
+        os.remove(path)
+        print(f"🗑️  Deleted outdated file: {path}")
+    except FileNotFoundError:
+        pass
+    except (OSError, PermissionError) as e:
+        print(f"⚠️  Failed to delete {path}: {e}")
+
+
+def process_media_item(item, entry, token, manifest, cycle, refetch=False):
+    """
+    Process and download a single media item and its associated text (if any),
+    then record it in the manifest.
+
+    Args:
+        item (dict): A media item returned by the API.
+        entry (dict): The manifest entry of the item, or None if it is new.
         token (str): Access token for authenticated API calls.
-        expected_files (dict): Tracks downloaded filenames per media type.
+        manifest (Manifest): The sync-state manifest.
+        cycle (int): The current sync cycle.
+        refetch (bool): Download the media file even if the entry is current.
+
+    Returns:
+        int: Number of bytes downloaded for this item, or None if it could not
+        be mirrored (it is then not recorded and retried next cycle).
     """
+    downloaded = 0
     mtype = item.get("type")
     uid = item.get("id")
-    original_filename = item.get("filename")
+    category, filename = media_filename(item)
+    version = item_version(item)
+    new_text_hash = text_hash(item)
+    renamed = entry is not None and entry["filename"] != filename
+
+    record = {
+        "id": uid,
+        "type": mtype,
+        "category": category,
+        "filename": filename,
+        "size": entry["size"] if entry else None,
+        "content_hash": entry["content_hash"] if entry else None,
+        "mtime": entry["mtime"] if entry else None,
+        "width": entry["width"] if entry else None,
+        "height": entry["height"] if entry else None,
+        "text_hash": new_text_hash,
+        "version": version,
+        "last_seen": cycle,
+    }
 
     if mtype in ("image", "video"):
         file_url = f"{API_BASE_URL}/download/{mtype}/{uid}/"
-        subdir = "images" if mtype == "image" else "videos"
-        filepath = os.path.join(DOWNLOAD_DIR, subdir, original_filename)
-
-        if not os.path.exists(filepath):
-            download_file(token, file_url, filepath)
+        filepath = os.path.join(DOWNLOAD_DIR, category, filename)
+
+        if entry is None and os.path.exists(filepath) and file_matches_item(filepath, item):
+            # File mirrored before the manifest existed: adopt it as-is
+            stat = os.stat(filepath)
+            record["size"] = stat.st_size
+            record["mtime"] = stat.st_mtime_ns
+            record["width"], record["height"] = media_dimensions(filepath, mtype)
+        elif entry is None or renamed or refetch or entry["version"] != version:
+            downloaded, content_hash = download_file(
+                token, file_url, filepath, expected_size(item), expected_digest(item), version
+            )
+            if not downloaded:
+                return None
             print(f"⬇️  Load: {filepath}")
-
-        expected_files[subdir].add(original_filename)
+            record["size"] = downloaded
+            record["content_hash"] = content_hash
+            record["mtime"] = os.stat(filepath).st_mtime_ns
+            record["width"], record["height"] = media_dimensions(filepath, mtype)
 
         # Optional text metadata
-        text1 = item.get("text1", "")
-        if text1:
-            text_filename = os.path.splitext(original_filename)[0] + ".txt"
-            text_path = os.path.join(DOWNLOAD_DIR, "texts", text_filename)
-            if not os.path.exists(text_path):
-                save_text_item(text1.strip(), text_path)
-            expected_files["texts"].add(text_filename)
+        text_path = os.path.join(DOWNLOAD_DIR, "texts", caption_filename(filename))
+        if new_text_hash:
+            if entry is None or renamed or entry["text_hash"] != new_text_hash:
+                save_text_item(item["text1"].strip(), text_path)
+        elif entry and entry["text_hash"]:
+            remove_local_file(text_path)
+
+        if renamed:
+            remove_entry_files(entry)
 
     elif mtype == "text":
         # Text aus API-Daten direkt speichern (statt Download-Endpunkt zu nutzen)
-        text_filename = f"text_{uid}.txt"
-        text_path = os.path.join(DOWNLOAD_DIR, "messages", text_filename)
+        text_path = os.path.join(DOWNLOAD_DIR, "messages", filename)
 
         telegram_meta = {
             "telegram_user_id": item.get("telegram_user_id"),
@@ -175,84 +764,507 @@ def process_media_item(item, token, expected_files):
         text_content = item.get("text", "").strip()
         save_text_item(text_content, text_path, telegram_meta)
 
-        expected_files["messages"].add(text_filename)
+    manifest.record(record)
+    return downloaded
+
+
+def media_dimensions(path, mtype):
+    """
+    Read the pixel dimensions of a mirrored image or video.
+
+    Args:
+        path (str): The media file.
+        mtype (str): "image" or "video".
+
+    Returns:
+        tuple: (width, height), or (None, None) if they cannot be determined
+        (Pillow / ffprobe missing or unreadable file).
+    """
+    if mtype == "image":
+        size = renditions.image_dimensions(path)
+    else:
+        size = videoprep.video_dimensions(path)
+    return size or (None, None)
+
+
+def remove_entry_files(entry, keep=()):
+    """
+    Delete the media file and caption of a manifest entry. Standalone
+    messages are left alone; they are removed by the user via the dashboard.
+
+    Args:
+        entry (dict): The manifest entry.
+        keep (set): (category, filename) pairs still used by other entries;
+            these files are left in place.
+    """
+    if entry["category"] == "messages":
+        return
+
+    if (entry["category"], entry["filename"]) not in keep:
+        media_path = os.path.join(DOWNLOAD_DIR, entry["category"], entry["filename"])
+        remove_local_file(media_path)
+        for part_path in part_files(media_path):
+            remove_local_file(part_path)
+    caption = caption_filename(entry["filename"])
+    if entry["text_hash"] and ("texts", caption) not in keep:
+        remove_local_file(os.path.join(DOWNLOAD_DIR, "texts", caption))
+
+
+def cleanup_files(manifest, cycle):
+    """
+    Remove previously downloaded files whose items are no longer listed in the
+    media API, i.e. whose manifest entry was not seen in this cycle.
+
+    Files that an entry seen in this cycle uses as well (an item uploaded
+    again under a new id and the same filename) are kept.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        cycle (int): The current sync cycle.
+    """
+    stale = manifest.stale(cycle)
+    if not stale:
+        return
+
+    live = set()
+    for entry in manifest.entries().values():
+        if entry["last_seen"] >= cycle:
+            live.add((entry["category"], entry["filename"]))
+            if entry["text_hash"]:
+                live.add(("texts", caption_filename(entry["filename"])))
+    for entry in stale:
+        remove_entry_files(entry, keep=live)
+        manifest.remove(entry["id"])
+
+
+def download_usage():
+    """
+    Return the bytes currently used by the download directory.
+    """
+    return sum(storage_budget.category_usage(DOWNLOAD_DIR).values())
+
+
+def incoming_bytes(plan):
+    """
+    Estimate the bytes a sync plan is going to download.
+
+    Args:
+        plan (list): Result of plan_sync().
+
+    Returns:
+        int: Sum of the sizes reported by the API (unknown sizes count as 0).
+    """
+    total = 0
+    for item, entry, refetch in plan:
+        category, filename = media_filename(item)
+        if category not in storage_budget.EVICTABLE_CATEGORIES:
+            continue
+        if entry is None or refetch or entry["filename"] != filename \
+                or entry["version"] != item_version(item):
+            total += expected_size(item) or 0
+    return total
+
+
+def storage_action_needed(manifest, settings):
+    """
+    Check whether the storage budget requires evictions or allows evicted
+    items back, even though the media list did not change.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        settings (dict): Result of storage_budget.budget_settings(), or None.
 
+    Returns:
+        bool: True if a full sync cycle should run.
+    """
+    evicted = [entry for entry in manifest.entries().values() if entry["evicted"]]
+    if settings is None:
+        return bool(evicted)
+    if not os.path.isdir(DOWNLOAD_DIR):
+        return False
+    used = download_usage()
+    headroom = storage_budget.effective_budget(settings, DOWNLOAD_DIR, used) - used
+    return headroom < 0 or any((entry["size"] or 0) <= headroom for entry in evicted)
 
 
-def cleanup_files(expected_files):
+def enforce_storage_budget(manifest, settings, incoming=0, keep=()):
     """
-    Remove any previously downloaded files that are no longer listed in the media API.
+    Evict mirrored images and videos until the download directory plus the
+    expected downloads fit the storage budget.
+
+    The media file and its post-processing outputs are deleted and dropped
+    from downloads/media-index.json right away; the manifest entry stays
+    (marked evicted), so the caption and the server version are kept.
 
     Args:
-        expected_files (dict): Dictionary of expected filenames per category.
+        manifest (Manifest): The sync-state manifest.
+        settings (dict): Result of storage_budget.budget_settings().
+        incoming (int): Bytes about to be downloaded.
+        keep (iterable): Ids of items processed in this cycle, never evicted.
+
+    Returns:
+        set: Ids of the evicted items.
     """
-    for category, filenames in expected_files.items():
-        if category == "messages":
+    used = download_usage()
+    excess = used + incoming - storage_budget.effective_budget(settings, DOWNLOAD_DIR, used)
+    if excess <= 0:
+        return set()
+
+    derived = storage_budget.derived_files(DOWNLOAD_DIR)
+
+    def paths(entry):
+        media_path = os.path.join(DOWNLOAD_DIR, entry["category"], entry["filename"])
+        key = f"{entry['category']}/{entry['filename']}"
+        return [media_path, *part_files(media_path), *derived.get(key, [])]
+
+    def cost(entry):
+        return sum(os.path.getsize(path) for path in paths(entry) if os.path.exists(path))
+
+    keep = {str(media_id) for media_id in keep}
+    candidates = [
+        entry for entry in manifest.entries().values()
+        if storage_budget.evictable(entry) and entry["id"] not in keep
+    ]
+    victims = storage_budget.select_evictions(
+        candidates, storage_budget.load_shown(), settings["policy"], excess, cost,
+    )
+    freed = 0
+    for entry, size in victims:
+        for path in paths(entry):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"⚠️  Failed to delete {path}: {e}")
+        manifest.update(entry["id"], evicted=1)
+        freed += size
+    if victims:
+        mark_to_delete.update_media_index(
+            drop_urls=[storage_budget.entry_url(entry) for entry, _ in victims]
+        )
+        print(f"🧹 Evicted {len(victims)} item(s) ({freed / storage_budget.MB:.1f} MB) "
+              f"to stay within the storage budget ({settings['policy']}).")
+    return {entry["id"] for entry, _ in victims}
+
+
+def readmit_evicted(manifest, media_items, settings, incoming=0, skip=()):
+    """
+    Plan downloads of evicted items that fit the storage budget again,
+    the ones kept longest by the eviction policy first.
+
+    Items evicted in the current cycle are skipped: the last victim usually
+    frees more than needed, and that space must not pull the other victims
+    straight back in.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        media_items (list): Media items returned by the API.
+        settings (dict): Result of storage_budget.budget_settings(), or None
+            (unlimited: every evicted item is fetched again).
+        incoming (int): Bytes the regular plan is about to download.
+        skip (iterable): Ids of the items evicted in this cycle.
+
+    Returns:
+        list: Plan tuples of (item, manifest entry, True), see plan_sync().
+    """
+    entries = manifest.entries()
+    skip = set(skip)
+    evicted = {
+        entry_id: entry for entry_id, entry in entries.items()
+        if entry["evicted"] and entry_id not in skip
+    }
+    if not evicted:
+        return []
+    items = {str(item.get("id")): item for item in media_items if str(item.get("id")) in evicted}
+
+    if settings is None:
+        headroom = float("inf")
+    else:
+        used = download_usage()
+        headroom = storage_budget.effective_budget(settings, DOWNLOAD_DIR, used) - used - incoming
+
+    plan = []
+    policy = settings["policy"] if settings else storage_budget.DEFAULT_POLICY
+    ordered = storage_budget.retention_order(
+        [evicted[entry_id] for entry_id in items], storage_budget.load_shown(), policy,
+    )
+    for entry in reversed(ordered):
+        item = items[entry["id"]]
+        size = expected_size(item) or entry["size"] or 0
+        if size > headroom:
             continue
+        headroom -= size
+        plan.append((item, entry, True))
+    if plan:
+        print(f"♻️  {len(plan)} evicted item(s) fit the storage budget again, fetching them.")
+    return plan
+
+
+def print_storage_report(manifest, settings):
+    """
+    Print the bytes used per category of the download directory.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        settings (dict): Result of storage_budget.budget_settings(), or None.
+    """
+    usage = storage_budget.category_usage(DOWNLOAD_DIR)
+    budget = None
+    if settings is not None:
+        budget = storage_budget.effective_budget(settings, DOWNLOAD_DIR, sum(usage.values()))
+    evicted = sum(1 for entry in manifest.entries().values() if entry["evicted"])
+    storage_budget.print_report(usage, budget, evicted)
+
+
+def sweep_orphans(manifest):
+    """
+    Remove files that are not referenced by any manifest entry.
+
+    Only needed once, when the manifest is created for an existing mirror;
+    afterwards cleanup_files() keeps the directories in sync.
 
+    Args:
+        manifest (Manifest): The sync-state manifest.
+    """
+    expected = {"images": set(), "videos": set(), "texts": set()}
+    for entry in manifest.entries().values():
+        if entry["category"] in expected:
+            expected[entry["category"]].add(entry["filename"])
+            if entry["text_hash"]:
+                expected["texts"].add(caption_filename(entry["filename"]))
+
+    for category, filenames in expected.items():
         dir_path = os.path.join(DOWNLOAD_DIR, category)
         for fname in os.listdir(dir_path):
-            if fname not in filenames:
-                fpath = os.path.join(dir_path, fname)
-                try:
-                    os.remove(fpath)
-                    print(f"🗑️  Deleted outdated file: {fpath}")
-                except (OSError, PermissionError) as e:
-                    print(f"⚠️  Failed to delete {fpath}: {e}")
+            if fname not in filenames and not fname.endswith(PART_SUFFIX):
+                remove_local_file(os.path.join(dir_path, fname))
 
 
-def list_media(access_token):
+def apply_media_delta(previous_items, delta):
+    """
+    Apply a `since=` delta response to the previously known media list.
+
+    Args:
+        previous_items (list): The media items from the last successful fetch.
+        delta (dict): Response with 'added' (items) and 'removed' (ids or items).
+
+    Returns:
+        list: The updated, complete list of media items.
+    """
+    removed = {
+        entry.get("id") if isinstance(entry, dict) else entry
+        for entry in delta.get("removed", [])
+    }
+    added = delta.get("added", [])
+    replaced = {item.get("id") for item in added}
+
+    items = [
+        item for item in previous_items
+        if item.get("id") not in removed and item.get("id") not in replaced
+    ]
+    return items + added
+
+
+def list_media(access_token, state=None):
     """
     Fetch the list of available media items from the API.
 
+    The request carries If-None-Match / If-Modified-Since from the previous
+    state. If that state contains a sync cursor, only the changes since then
+    are requested (`?since=<cursor>`). The server may answer with:
+    - 304 Not Modified,
+    - a plain list of all media items,
+    - a dict with 'items' (full list) and an optional 'cursor', or
+    - a dict with 'added', 'removed' and 'cursor' (delta).
+
     Args:
         access_token (str): Bearer token for authenticated API access.
+        state (dict): State of the last successful fetch, see load_media_state().
 
     Returns:
-        list: A list of media item dictionaries retrieved from the API.
+        tuple: (media_items, new_state). media_items is the full, up-to-date
+        list and new_state the state to persist once the cycle succeeded.
+        Both are None on 304.
 
     Raises:
         requests.exceptions.HTTPError: If the request fails.
     """
+    state = state or {}
     url = f"{API_BASE_URL}/media-list/"
     headers = {"Authorization": f"Bearer {access_token}", "Accept-Encoding": "gzip"}
-    response = requests.get(url, headers=headers)
+    params = {}
+
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    if state.get("cursor"):
+        params["since"] = state["cursor"]
+
+    response = api_client.get(url, headers=headers, params=params)
+    if response.status_code == 304:
+        return None, None
     response.raise_for_status()
-    return response.json()
+    payload = response.json()
+
+    cursor = response.headers.get("X-Media-Cursor")
+    if isinstance(payload, dict) and ("added" in payload or "removed" in payload):
+        media_items = apply_media_delta(state.get("items", []), payload)
+        cursor = payload.get("cursor", cursor)
+    else:
+        if isinstance(payload, dict):
+            cursor = payload.get("cursor", cursor)
+            payload = payload.get("items", [])
+        media_items = payload
+
+    new_state = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "cursor": cursor,
+        "items": media_items,
+    }
+    return media_items, new_state
+
+
+def fsync_directory(path):
+    """
+    Flush a directory entry to disk so a preceding rename survives a power cut.
+
+    Args:
+        path (str): The directory to sync.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
-def download_file(access_token, url, save_path):
+def part_path_for(save_path, version):
+    """
+    Return the partial-download path of a file for one version of its item.
+
+    Args:
+        save_path (str): Final path of the file.
+        version (str): Result of item_version(), empty if unknown.
+
+    Returns:
+        str: `<save_path>.<version tag>.part`
+    """
+    tag = hashlib.sha1(version.encode("utf-8")).hexdigest()[:12] if version else "unversioned"
+    return f"{save_path}.{tag}{PART_SUFFIX}"
+
+
+def part_files(save_path):
+    """
+    List the partial downloads of a file, of any version.
+
+    Args:
+        save_path (str): Final path of the file.
+
+    Returns:
+        list: Existing .part paths (including the untagged <name>.part of
+        older versions of this script).
+    """
+    paths = glob.glob(glob.escape(save_path) + ".*" + PART_SUFFIX)
+    if os.path.exists(save_path + PART_SUFFIX):
+        paths.append(save_path + PART_SUFFIX)
+    return paths
+
+
+def download_file(access_token, url, save_path, expected_bytes=None, expected_hash=None,
+                  version=""):
     """
     Download a file from the specified URL and save it to the given path.
 
+    The data is streamed into a .part file next to the target (same
+    filesystem, no copy through /tmp) with large buffers. The .part file is
+    named after the item version (part_path_for()); if one from an
+    interrupted run exists, the transfer resumes with an HTTP Range request.
+    Partial data of other versions is deleted, and without a version, size or
+    digest to tell versions apart nothing is resumed, so old and new bytes
+    are never spliced together.
+    Once complete, the file is fsynced and atomically renamed into place, so
+    readers never see half-written media. The SHA-256 digest is computed
+    while streaming; if the size or digest does not match what the API
+    reported, the data is discarded. The transfer rate is limited by the
+    bandwidth settings of the current run (bandwidth.py).
+
     Args:
         access_token (str): Bearer token for authenticated API access.
         url (str): The URL of the file to download.
         save_path (str): Local filesystem path to save the file to.
+        expected_bytes (int): Size reported by the API, if any.
+        expected_hash (str): SHA-256 hex digest reported by the API, if any.
+        version (str): Result of item_version() for the item.
+
+    Returns:
+        tuple: (file size in bytes, SHA-256 hex digest). (0, None) if the file was discarded.
 
     Raises:
         requests.exceptions.HTTPError: If the file download fails.
     """
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    part_path = part_path_for(save_path, version)
+    for stale_path in part_files(save_path):
+        if stale_path != part_path:
+            os.remove(stale_path)
+    resumable = bool(version or expected_bytes is not None or expected_hash)
+    offset = os.path.getsize(part_path) if resumable and os.path.exists(part_path) else 0
+
     headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers, stream=True)
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    response = api_client.get(url, headers=headers, stream=True)
+
+    if offset and response.status_code == 416:
+        # The partial file does not fit the server copy any more: start over
+        response.close()
+        os.remove(part_path)
+        return download_file(access_token, url, save_path, expected_bytes, expected_hash, version)
     response.raise_for_status()
 
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    digest = hashlib.sha256()
+    if offset and response.status_code == 206:
+        print(f"⏯️  Resuming at {offset} bytes: {save_path}")
+        with open(part_path, "rb") as existing:
+            for block in iter(lambda: existing.read(DOWNLOAD_CHUNK_SIZE), b""):
+                digest.update(block)
+        mode = "ab"
+    else:
+        # Server ignored the Range header (or nothing to resume): full download
+        offset = 0
+        mode = "wb"
 
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-        tmp_path = tmp_file.name
-        total_bytes = 0
-        for chunk in response.iter_content(chunk_size=8192):
+    total_bytes = offset
+    with open(part_path, mode, buffering=DOWNLOAD_CHUNK_SIZE) as part_file:
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
             if chunk:  # Skip keep-alive chunks
-                tmp_file.write(chunk)
+                if _throttle:
+                    _throttle.consume(len(chunk))
+                part_file.write(chunk)
+                digest.update(chunk)
                 total_bytes += len(chunk)
+        part_file.flush()
+        os.fsync(part_file.fileno())
 
     if total_bytes == 0:
         print(f"⚠️  Datei hat 0 Bytes, wird verworfen: {url}")
-        os.remove(tmp_path)
-    else:
-        shutil.move(tmp_path, save_path)
-        print(f"✅ Heruntergeladen: {save_path}")
+        os.remove(part_path)
+        return 0, None
+
+    content_hash = digest.hexdigest()
+    if (expected_bytes is not None and total_bytes != expected_bytes) or \
+            (expected_hash and content_hash != expected_hash):
+        print(f"⚠️  Size or checksum mismatch, discarding: {url}")
+        os.remove(part_path)
+        return 0, None
+
+    os.replace(part_path, save_path)
+    fsync_directory(os.path.dirname(save_path))
+    print(f"✅ Heruntergeladen: {save_path}")
+    return total_bytes, content_hash
 
 
 def save_text_item(text, save_path, telegram_meta=None):
@@ -283,24 +1295,501 @@ def save_text_item(text, save_path, telegram_meta=None):
     print(f"📝 Gespeichert: {save_path}")
 
 
-def main():
+class FirstItemsTimer:
+    """
+    Measure how long a sync run takes until a number of items can be shown.
+
+    Args:
+        target (int): Number of displayable items to wait for.
+        started (float): time.monotonic() at the start of the run.
+        available (int): Items that were displayable before any download.
+    """
+
+    def __init__(self, target, started, available):
+        self.target = target
+        self.started = started
+        self.available = available
+        self.seconds = 0.0 if available >= target else None
+
+    def add(self):
+        """
+        Count one more displayable item.
+
+        Returns:
+            bool: True if this item reached the target.
+        """
+        self.available += 1
+        if self.seconds is None and self.available >= self.target:
+            self.seconds = time.monotonic() - self.started
+            print(f"⏱️  First {self.target} displayable item(s) after {self.seconds:.1f}s")
+            return True
+        return False
+
+
+def save_sync_metrics(metrics):
+    """
+    Atomically write the metrics of the last sync run.
+
+    Args:
+        metrics (dict): JSON-serializable metrics.
+    """
+    os.makedirs(os.path.dirname(SYNC_METRICS_FILE), exist_ok=True)
+    tmp_path = SYNC_METRICS_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(tmp_path, SYNC_METRICS_FILE)
+
+
+def print_throughput(total_bytes, elapsed, workers):
+    """
+    Print the aggregate download throughput of a sync run.
+
+    Args:
+        total_bytes (int): Bytes downloaded across all workers.
+        elapsed (float): Wall-clock duration of the download phase in seconds.
+        workers (int): Number of download workers used.
+    """
+    mbytes = total_bytes / (1024 * 1024)
+    rate = mbytes / elapsed if elapsed > 0 else 0.0
+    print(f"📊 Downloaded {mbytes:.1f} MB in {elapsed:.1f}s "
+          f"({rate:.2f} MB/s, {workers} worker(s))")
+
+
+def mirrored_files(manifest, category):
     """
-    Main execution logic:
-    - Authenticate and obtain an access token.
-    - Retrieve the list of media items.
-    - Download each media item (image, video, text).
+    List the mirrored files of a category together with their content hash.
+
+    Files adopted without a content hash are hashed once, since the
+    post-processing caches are keyed by the SHA-256 of the source.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        category (str): "images" or "videos".
+
+    Returns:
+        list: Tuples of (filename, SHA-256 hex digest).
+    """
+    files = []
+    for entry in manifest.entries().values():
+        if entry["category"] != category or entry["evicted"]:
+            continue
+        content_hash = entry["content_hash"]
+        if not content_hash:
+            path = os.path.join(DOWNLOAD_DIR, category, entry["filename"])
+            if not os.path.exists(path):
+                continue
+            content_hash = file_sha256(path)
+            manifest.update(entry["id"], content_hash=content_hash)
+        files.append((entry["filename"], content_hash))
+    return files
+
+
+def post_processing_current(setup):
+    """
+    Check whether the optional post-processing outputs match the current setup.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        bool: True if neither renditions nor prepared videos need a rebuild.
+    """
+    return (
+        renditions.is_current(DOWNLOAD_DIR, renditions.rendition_settings(setup))
+        and videoprep.is_current(DOWNLOAD_DIR, videoprep.prep_settings(setup))
+    )
+
+
+def run_post_processing(manifest, setup):
+    """
+    Update the optional display-sized image renditions and start the video
+    preparation in the background (see start_video_preparation()).
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        setup (dict): The setup configuration.
+
+    Returns:
+        bool: True if the renditions changed, so the media index needs to be
+        written again.
+    """
+    previous = renditions.load_index(DOWNLOAD_DIR)
+    settings = renditions.rendition_settings(setup)
+    images = mirrored_files(manifest, "images") if settings is not None else []
+    renditions.update_renditions(DOWNLOAD_DIR, images, settings, renditions.rendition_workers(setup))
+    start_video_preparation(manifest, setup)
+    return renditions.load_index(DOWNLOAD_DIR) != previous
+
+
+def start_video_preparation(manifest, setup):
+    """
+    Run videoprep.py as a separate low-priority process if the prepared
+    videos do not match the mirrored ones.
+
+    ffmpeg jobs can take minutes per clip, so they run outside the sync
+    cycle: neither the media index nor the next cycle waits for them. The
+    job rewrites the media index itself once it is done; its output is
+    appended to config/videoprep.log.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        setup (dict): The setup configuration.
+    """
+    settings = videoprep.prep_settings(setup)
+    index = videoprep.load_index(DOWNLOAD_DIR)
+    if settings is None:
+        if videoprep.is_current(DOWNLOAD_DIR, None):
+            return
+    elif index.get("settings") == settings and set(index.get("videos", {})) == {
+        filename for filename, _ in mirrored_files(manifest, "videos")
+    }:
+        return
+
+    print("🎞️  Preparing videos in the background.")
+    # Appended: a job that is still running may be writing to it
+    with open(VIDEOPREP_LOG_FILE, "a", encoding="utf-8") as log:
+        # Not waited for; a job still running makes the new one skip (lock)
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(videoprep.__file__)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+
+def build_media_index(manifest, media_items):
+    """
+    Build the content of downloads/media-index.json for routes/media.js.
+
+    The index lists every mirrored image and video (images first, each sorted
+    by filename) with its original URL, the display URL from the
+    post-processing indexes, the poster frame, the caption, the pixel
+    dimensions and the mtime in milliseconds. Dimensions missing from older
+    manifest entries are read once and stored.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        media_items (list): The current media list (source of the captions).
+
+    Returns:
+        dict: The index (version, generated_at, media).
+    """
+    captions = {
+        str(item.get("id")): (item.get("text1") or "").strip()
+        for item in media_items or []
+    }
+    prepared_images = renditions.load_index(DOWNLOAD_DIR).get("images", {})
+    prepared_videos = videoprep.load_index(DOWNLOAD_DIR).get("videos", {})
+
+    media = []
+    entries = sorted(
+        (entry for entry in manifest.entries().values() if entry["type"] in ("image", "video")),
+        key=lambda entry: (entry["type"] != "image", entry["filename"]),
+    )
+    for entry in entries:
+        category, filename = entry["category"], entry["filename"]
+        path = os.path.join(DOWNLOAD_DIR, category, filename)
+        if not os.path.exists(path):
+            continue
+
+        width, height = entry["width"], entry["height"]
+        if width is None:
+            width, height = media_dimensions(path, entry["type"])
+            if width is not None:
+                manifest.update(entry["id"], width=width, height=height)
+
+        url = f"/downloads/{category}/{filename}"
+        poster = None
+        if entry["type"] == "image":
+            display = prepared_images.get(filename)
+        else:
+            prepared = prepared_videos.get(filename) or {}
+            display = prepared.get("video")
+            poster = prepared.get("poster")
+
+        mtime = entry["mtime"]
+        media.append({
+            "type": entry["type"],
+            "url": url,
+            "displayUrl": f"/downloads/{display}" if display else url,
+            "poster": f"/downloads/{poster}" if poster else None,
+            "subtitle": captions.get(entry["id"], ""),
+            "width": width,
+            "height": height,
+            "mtime": mtime // 1_000_000 if mtime is not None else None,
+        })
+
+    return {"version": MEDIA_INDEX_VERSION, "generated_at": int(time.time()), "media": media}
+
+
+def write_media_index(manifest, media_items):
+    """
+    Atomically write downloads/media-index.json (see build_media_index()).
+
+    The index is built and replaced under the lock of media_index.py, so the
+    background video preparation and mark_to_delete.py never interleave with
+    this update or overwrite it with an older listing.
+
+    Args:
+        manifest (Manifest): The sync-state manifest.
+        media_items (list): The current media list (source of the captions).
+    """
+    with media_index.locked(MEDIA_INDEX_FILE):
+        media_index.replace(MEDIA_INDEX_FILE, build_media_index(manifest, media_items))
+
+
+def sync_cycle(token):
+    """
+    Run a single sync cycle with an already obtained access token:
+    - Retrieve the list of media items (conditional / delta fetch). If the
+      server reports no changes, the cycle ends right away unless a mirrored
+      file is missing or modified (size / mtime check against the manifest).
+    - Download each new or changed media item on a bounded worker pool,
+      small images in slideshow order first and large videos last. The media
+      index is updated as soon as the first items can be shown and then
+      every INDEX_REFRESH_INTERVAL seconds; the time until the first
+      `first_display_items` items were displayable is stored in
+      config/sync_metrics.json.
     - Save associated text metadata.
-    - Clean up old files not listed in the latest media response.
+    - Clean up old files not listed in the latest media response, but only
+      once every worker has finished.
+    - Evict items to stay within the optional storage budget and fetch
+      evicted items again once they fit (also when the list is unchanged).
+    - Rewrite downloads/media-index.json, update the optional image
+      renditions (and the index again if they changed) and start the video
+      preparation as a separate background job.
+    - Report the storage used.
+    - Report aggregate download throughput and the time spent throttled.
+
+    Args:
+        token (str): Access token for authenticated API calls.
+
+    Returns:
+        bool: True if every item was processed, False if any download failed.
+        Items whose download was discarded (empty body, size or checksum
+        mismatch) do not count as failed; they are retried next cycle, also
+        if the media list is unchanged.
+
+    Raises:
+        requests.exceptions.HTTPError: If the media list cannot be fetched.
+    """
+    global _throttle
+    run_started = time.monotonic()
+    setup = load_setup()
+    storage = storage_budget.budget_settings(setup)
+    media_items, new_state = list_media(token, load_media_state())
+    if media_items is None:
+        manifest = Manifest()
+        try:
+            retry = load_skipped(manifest)
+            if storage_action_needed(manifest, storage):
+                # Budget changed, card filled up or items were deleted: run a
+                # full cycle on the stored media list
+                print("ℹ️  Media list unchanged, applying the storage budget.")
+                media_items = load_media_state().get("items") or []
+            elif not mirror_intact(manifest):
+                # plan_sync() fetches the damaged files again
+                print("ℹ️  Media list unchanged, repairing the local mirror.")
+                media_items = load_media_state().get("items") or []
+            elif retry:
+                # Not recorded in the manifest, so plan_sync() picks them up
+                print(f"ℹ️  Media list unchanged, retrying {len(retry)} skipped item(s).")
+                media_items = load_media_state().get("items") or []
+            else:
+                print("ℹ️  Media list unchanged. Nothing to sync.")
+                if (
+                    not post_processing_current(setup)
+                    or not os.path.exists(MEDIA_INDEX_FILE)
+                    or local_imports.pending_imports()
+                ):
+                    # Post-processing settings changed since the last sync, the
+                    # media index has not been written yet or images were
+                    # imported from USB
+                    ingest_local_imports(manifest, int(manifest.get_meta("cycle", 0)))
+                    media_list = load_media_state().get("items")
+                    write_media_index(manifest, media_list)
+                    if run_post_processing(manifest, setup):
+                        write_media_index(manifest, media_list)
+                else:
+                    # A previous job may have skipped clips (lock held)
+                    start_video_preparation(manifest, setup)
+        finally:
+            manifest.close()
+        if media_items is None:
+            return True
+
+    prepare_directories(DOWNLOAD_DIR)
+    workers = get_download_workers(setup)
+    _throttle = bandwidth.Throttle(setup, "download")
+
+    manifest = Manifest()
+    try:
+        cycle = manifest.begin_cycle()
+        ingest_local_imports(manifest, cycle)
+        plan = plan_sync(media_items, manifest, cycle)
+        print(f"🧮 {len(plan)} of {len(media_items)} item(s) new or changed.")
+        incoming = incoming_bytes(plan)
+        evicted_now = set()
+        if storage is not None:
+            evicted_now = enforce_storage_budget(manifest, storage, incoming,
+                                                 keep=[item.get("id") for item, _, _ in plan])
+        plan += readmit_evicted(manifest, media_items, storage, incoming, skip=evicted_now)
+        plan.sort(key=download_priority)
+
+        refetched = sum(1 for _, entry, refetch in plan if refetch and not entry["evicted"])
+        displayable = sum(
+            1 for entry in manifest.entries().values()
+            if entry["category"] in storage_budget.EVICTABLE_CATEGORIES and not entry["evicted"]
+        )
+        first_items = FirstItemsTimer(get_first_display_items(setup), run_started,
+                                      displayable - refetched)
+        index_written = time.monotonic()
+
+        started = time.monotonic()
+        total_bytes = 0
+        failed = 0
+        skipped = []
+
+        # The pool takes the work in submission order, so the sorted plan
+        # acts as the priority queue
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for item, entry, refetch in plan:
+                future = executor.submit(process_media_item, item, entry, token, manifest,
+                                         cycle, refetch)
+                # The item id, and True if the item can be shown once this
+                # download is done
+                futures[future] = (
+                    item.get("id"),
+                    media_filename(item)[0] in storage_budget.EVICTABLE_CATEGORIES
+                    and (entry is None or refetch),
+                )
+            for future in as_completed(futures):
+                try:
+                    downloaded = future.result()
+                except requests.exceptions.RequestException as e:
+                    failed += 1
+                    print(f"❌ Download failed: {e}")
+                    continue
+                except Exception as e:
+                    # One broken item (disk error, unexpected data) must not
+                    # abort the cycle before cleanup and the final index
+                    failed += 1
+                    print(f"❌ Processing failed: {e}")
+                    continue
+                media_id, displayable = futures[future]
+                if downloaded is None:
+                    # Empty or corrupt body: not a reason to hold back cleanup
+                    # and the media state, just try again next cycle
+                    skipped.append(media_id)
+                    continue
+                total_bytes += downloaded
+                if not displayable:
+                    continue
+
+                # Newly displayable item: let the slideshow start with what
+                # is there instead of waiting for the whole sync
+                if first_items.add() or time.monotonic() - index_written >= INDEX_REFRESH_INTERVAL:
+                    write_media_index(manifest, media_items)
+                    index_written = time.monotonic()
+
+        elapsed = time.monotonic() - started
+        print_throughput(total_bytes, elapsed, workers)
+        _throttle.report()
+        manifest.set_meta("skipped_items", json.dumps(skipped))
+        if skipped:
+            print(f"⚠️  {len(skipped)} item(s) skipped, retrying next cycle.")
+
+        if failed:
+            # Keep existing files if the media list could not be mirrored completely
+            print(f"⚠️  {failed} item(s) failed, skipping cleanup.")
+        else:
+            cleanup_files(manifest, cycle)
+            if not manifest.get_meta("orphans_swept"):
+                sweep_orphans(manifest)
+                manifest.set_meta("orphans_swept", 1)
+
+        if storage is not None:
+            enforce_storage_budget(manifest, storage)
+        # Show the new items first, then add their display-sized copies
+        write_media_index(manifest, media_items)
+        if run_post_processing(manifest, setup):
+            write_media_index(manifest, media_items)
+        print_storage_report(manifest, storage)
+        save_sync_metrics({
+            "finished_at": int(time.time()),
+            "cycle": cycle,
+            "items_processed": len(plan),
+            "items_failed": failed,
+            "items_skipped": len(skipped),
+            "bytes_downloaded": total_bytes,
+            "download_seconds": round(elapsed, 3),
+            "total_seconds": round(time.monotonic() - run_started, 3),
+            "first_display_items": first_items.target,
+            "time_to_first_items": (
+                round(first_items.seconds, 3) if first_items.seconds is not None else None
+            ),
+        })
+    finally:
+        manifest.close()
+
+    if failed:
+        return False
+
+    # Only remember the validators once everything is on disk, so a failed
+    # download is retried instead of being hidden behind a 304.
+    if new_state is not None:
+        save_media_state(new_state)
+    return True
+
+
+def run_sync(token):
     """
-    token = get_oauth2_token(CLIENT_ID, CLIENT_SECRET)
-    media_items = list_media(token)
+    Run sync_cycle() while holding config/sync.lock, so the sync daemon,
+    get_all.py and `threepics sync` never download into the same .part files
+    or update the manifest at the same time. A second caller waits until the
+    running cycle is done.
+
+    Args:
+        token (str): Access token for authenticated API calls.
 
-    expected_files = prepare_directories(DOWNLOAD_DIR)
+    Returns:
+        bool: Result of sync_cycle().
 
-    for item in media_items:
-        process_media_item(item, token, expected_files)
+    Raises:
+        requests.exceptions.HTTPError: If the media list cannot be fetched.
+    """
+    os.makedirs(os.path.dirname(SYNC_LOCK_FILE), exist_ok=True)
+    # Read-only is enough for flock and works for every user
+    fd = os.open(SYNC_LOCK_FILE, os.O_RDONLY | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("⏳ Another sync cycle is running, waiting for it to finish.")
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        return sync_cycle(token)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def main():
+    """
+    Main execution logic: load credentials, authenticate and run one sync cycle.
+    """
+    try:
+        client_id, client_secret = load_credentials()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    ok = token_cache.call_with_token(
+        client_id, client_secret, run_sync,
+        token_url=OAUTH2_TOKEN_URL, session=api_client.SESSION,
+    )
+    if not ok:
+        sys.exit(1)
 
-    cleanup_files(expected_files)
 
 if __name__ == "__main__":
     main()
@@ -7,17 +7,24 @@ retrieves setup configuration data, and stores it locally as `config/setup.json`
 
 Features:
 - Reads client credentials from `config/credentials.json`
-- Automatically installs the `requests` package if not installed
-- Authenticates via OAuth2 and retrieves a bearer token
-- Fetches setup data from the API
-- Writes data to disk only if the content has changed
+- Authenticates via OAuth2, reusing the shared token cache (token_cache.py)
+- Fetches setup data conditionally (ETag / Last-Modified stored in
+  config/setup_state.json); a 304 answer ends the run without a download
+- Writes data to disk only if the content has changed, atomically (temp file +
+  rename), so readers never see a half-written file and the backend's file
+  watcher only fires on real changes
+- Optional long-poll mode (`--watch`, started by the backend when
+  `"setup_long_poll": true`): the request asks the server to hold it open
+  (`Prefer: wait=<seconds>`) until the setup changes, so changes arrive within
+  seconds. Servers that answer right away are polled at most every
+  POLL_INTERVAL seconds, no more often than the regular 5-minute job.
 
 Usage:
-    python fetch_setup.py
+    python get_setup.py [--watch]
 
 Requirements:
 - Python 3.x
-- requests (auto-installed if not present)
+- requests (see requirements.txt)
 
 Example credentials.json:
 {
@@ -26,22 +33,27 @@ Example credentials.json:
 }
 """
 
+import argparse
 import os
 import json
+import time
 
-API_BASE_URL = "https://three-pics.com/api"
-OAUTH2_TOKEN_URL = "https://three-pics.com/o/token/"
 CONFIG_DIR = "config"
 OUTPUT_FILE = os.path.join(CONFIG_DIR, "setup.json")
+SETUP_STATE_FILE = os.path.join(CONFIG_DIR, "setup_state.json")
+# Seconds the server may hold a long-poll request, and the minimum time
+# between two requests in long-poll mode
+POLL_INTERVAL = 300
+# Wait before retrying when credentials are missing or the API is unreachable
+RETRY_DELAY = 60
 
-# Ensure requests is available
-try:
-    import requests
-except ImportError:
-    import subprocess
-    import sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
+import requests
+
+import api_client
+import token_cache
+
+API_BASE_URL = api_client.API_BASE_URL
+OAUTH2_TOKEN_URL = api_client.OAUTH2_TOKEN_URL
 
 
 def load_credentials():
@@ -62,49 +74,80 @@ def load_credentials():
     return creds["client_id"], creds["client_secret"]
 
 
-def get_oauth2_token(client_id, client_secret):
+def load_setup_state():
     """
-    Request an OAuth2 access token using client credentials.
-
-    Args:
-        client_id (str): The client ID.
-        client_secret (str): The client secret.
+    Load the validators of the last successful setup fetch.
 
     Returns:
-        str: The access token.
+        dict: Stored etag and last_modified (empty if unavailable or if
+        setup.json is missing, which forces a full fetch).
+    """
+    if not os.path.exists(OUTPUT_FILE):
+        return {}
+    try:
+        with open(SETUP_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return state if isinstance(state, dict) else {}
 
-    Raises:
-        requests.exceptions.HTTPError: If the token request fails.
+
+def write_json_atomic(path, data, indent=None):
     """
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'scope': 'read',
-    }
-    response = requests.post(OAUTH2_TOKEN_URL, data=data)
-    response.raise_for_status()
-    return response.json().get('access_token')
+    Write JSON to a temp file and rename it over the target.
 
+    Args:
+        path (str): The target file.
+        data: JSON-serializable data.
+        indent (int): Indentation passed to json.dump.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
-def fetch_setup_data(token):
+
+def fetch_setup_data(token, state=None, wait=None):
     """
     Fetch setup data from the API using the provided token.
 
     Args:
         token (str): The OAuth2 bearer token.
+        state (dict): Validators of the last fetch, see load_setup_state().
+        wait (int): Seconds the server may hold the request until the setup
+            changes (long-poll), or None for an immediate answer.
 
     Returns:
-        dict: Parsed JSON response from the API.
+        tuple: (setup data, new state), or (None, None) if the setup is
+        unchanged (304).
 
     Raises:
         requests.exceptions.HTTPError: If the request fails.
     """
+    state = state or {}
     url = f"{API_BASE_URL}/setup/"
     headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"}
-    response = requests.get(url, headers=headers)
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    if wait:
+        headers["Prefer"] = f"wait={wait}"
+
+    connect_timeout, read_timeout = api_client.DEFAULT_TIMEOUT
+    response = api_client.get(url, headers=headers,
+                              timeout=(connect_timeout, read_timeout + (wait or 0)))
+    if response.status_code == 304:
+        return None, None
     response.raise_for_status()
-    return response.json()
+
+    new_state = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    return response.json(), new_state
 
 
 def save_setup_to_file(setup_data):
@@ -113,6 +156,9 @@ def save_setup_to_file(setup_data):
 
     Args:
         setup_data (dict): The setup data to save.
+
+    Returns:
+        bool: True if setup.json was rewritten.
     """
     os.makedirs(CONFIG_DIR, exist_ok=True)
 
@@ -126,22 +172,82 @@ def save_setup_to_file(setup_data):
 
         if existing_data == setup_data:
             print("ℹ️  Setup is unchanged. Nothing to update.")
-            return
+            return False
 
     # Write new setup data
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(setup_data, f, indent=2, ensure_ascii=False)
+    write_json_atomic(OUTPUT_FILE, setup_data, indent=2)
     print(f"✅ Setup data has been updated and saved to: {OUTPUT_FILE}")
+    return True
+
+
+def refresh_setup(token, wait=None):
+    """
+    Fetch the setup if it changed on the server and store it.
+
+    Args:
+        token (str): The OAuth2 bearer token.
+        wait (int): Long-poll time in seconds, see fetch_setup_data().
+
+    Returns:
+        bool: True if setup.json was rewritten.
+    """
+    setup, new_state = fetch_setup_data(token, load_setup_state(), wait)
+    if setup is None:
+        print("ℹ️  Setup not modified on the server.")
+        return False
+
+    changed = save_setup_to_file(setup)
+    if new_state.get("etag") or new_state.get("last_modified"):
+        write_json_atomic(SETUP_STATE_FILE, new_state)
+    return changed
+
+
+def watch_setup(client_id, client_secret):
+    """
+    Keep a long-poll request open and store every setup change.
+
+    Args:
+        client_id (str): OAuth2 client ID.
+        client_secret (str): OAuth2 client secret.
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            changed = token_cache.call_with_token(
+                client_id, client_secret,
+                lambda token: refresh_setup(token, wait=POLL_INTERVAL),
+                scope="read", token_url=OAUTH2_TOKEN_URL, session=api_client.SESSION,
+            )
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"❌ Setup request failed: {e}")
+            time.sleep(RETRY_DELAY)
+            continue
+
+        # A server without long-poll support answers right away: keep the
+        # request rate of the regular job unless a change just came in
+        elapsed = time.monotonic() - started
+        if not changed and elapsed < POLL_INTERVAL:
+            time.sleep(POLL_INTERVAL - elapsed)
 
 
 def main():
     """
     Main entry point: authenticate, fetch setup data, and store it if changed.
     """
+    parser = argparse.ArgumentParser(description="Fetch config/setup.json from three-pics.com.")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and long-poll the server for changes")
+    args = parser.parse_args()
+
     client_id, client_secret = load_credentials()
-    token = get_oauth2_token(client_id, client_secret)
-    setup = fetch_setup_data(token)
-    save_setup_to_file(setup)
+    if args.watch:
+        watch_setup(client_id, client_secret)
+        return
+
+    token_cache.call_with_token(
+        client_id, client_secret, refresh_setup,
+        scope="read", token_url=OAUTH2_TOKEN_URL, session=api_client.SESSION,
+    )
 
 
 if __name__ == "__main__":
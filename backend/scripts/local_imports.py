@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+local_imports.py
+
+Local-first display of images imported from a USB stick.
+
+`threepics_usbcopy.py` hands every newly imported image to `add_local_image()`,
+which places it in downloads/images/ right away and leaves a small spool
+record in downloads/.imports/. The next sync (triggered immediately through
+the sync daemon) adds it to the manifest and the media index, so the photo
+shows up without waiting for the upload and a download of the same bytes.
+
+Once the server confirms the upload, `confirm_upload()` stores the server
+media id in the spool record. `get_all.py` then keys the manifest entry by
+that id, so the next sync treats the local copy as already mirrored instead of
+downloading it again.
+
+Spool record (downloads/.imports/<sha256>.json):
+{
+    "content_hash": "<sha256>",
+    "filename": "usb_<sha256[:16]>.jpg",
+    "size": 123456,
+    "media_id": null
+}
+"""
+
+import json
+import os
+import shutil
+import socket
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DOWNLOAD_DIR = os.path.join(BACKEND_DIR, "downloads")
+SYNC_SOCKET = os.path.join(BACKEND_DIR, "sync.sock")
+SPOOL_SUBDIR = ".imports"
+FILENAME_PREFIX = "usb_"
+# Manifest ids of imports the server has not confirmed yet
+LOCAL_ID_PREFIX = "local:"
+
+
+def _spool_dir():
+    return os.path.join(DOWNLOAD_DIR, SPOOL_SUBDIR)
+
+
+def _spool_path(content_hash):
+    return os.path.join(_spool_dir(), f"{content_hash}.json")
+
+
+def _match_owner(path):
+    """
+    Give files created by root (udev import) to the owner of the download
+    directory, so the backend can rename and delete them later.
+    """
+    if os.geteuid() != 0:
+        return
+    stat = os.stat(DOWNLOAD_DIR)
+    os.chown(path, stat.st_uid, stat.st_gid)
+
+
+def _write_record(record):
+    path = _spool_path(record["content_hash"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    _match_owner(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def local_filename(content_hash, source_name):
+    """
+    Return the name of a local import in downloads/images/.
+
+    Args:
+        content_hash (str): SHA-256 of the image.
+        source_name (str): Original filename (for the extension).
+
+    Returns:
+        str: A name that is stable for the same content.
+    """
+    ext = os.path.splitext(source_name)[1].lower()
+    return f"{FILENAME_PREFIX}{content_hash[:16]}{ext}"
+
+
+def add_local_image(src, content_hash, size):
+    """
+    Put an imported image into the local slideshow set.
+
+    Args:
+        src (str): Path of the image (on the stick or in uploads/).
+        content_hash (str): SHA-256 of the image.
+        size (int): Its size in bytes.
+
+    Returns:
+        str: The filename in downloads/images/.
+    """
+    images_dir = os.path.join(DOWNLOAD_DIR, "images")
+    for directory in (images_dir, _spool_dir()):
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            _match_owner(directory)
+
+    filename = local_filename(content_hash, src)
+    dest = os.path.join(images_dir, filename)
+    if not os.path.exists(dest):
+        # .part files are ignored by the watcher and GET /media
+        tmp_path = dest + ".part"
+        shutil.copy2(src, tmp_path)
+        _match_owner(tmp_path)
+        os.replace(tmp_path, dest)
+
+    _write_record({"content_hash": content_hash, "filename": filename,
+                   "size": size, "media_id": None})
+    return filename
+
+
+def confirm_upload(content_hash, media_id):
+    """
+    Link a local import to the server media id returned by the upload.
+
+    Args:
+        content_hash (str): SHA-256 of the uploaded image.
+        media_id: The id the server assigned (ignored if None).
+    """
+    if media_id is None:
+        return
+    record = load_record(content_hash)
+    if record is not None:
+        record["media_id"] = media_id
+        _write_record(record)
+
+
+def load_record(content_hash):
+    """
+    Load the spool record of an import.
+
+    Args:
+        content_hash (str): SHA-256 of the image.
+
+    Returns:
+        dict: The record, or None if there is none.
+    """
+    try:
+        with open(_spool_path(content_hash), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def pending_imports():
+    """
+    List the spool records that have not been taken over by a sync yet.
+
+    Returns:
+        list: Records as dicts.
+    """
+    try:
+        names = os.listdir(_spool_dir())
+    except FileNotFoundError:
+        return []
+
+    records = []
+    for name in names:
+        if name.endswith(".json"):
+            record = load_record(name[:-len(".json")])
+            if record and record.get("content_hash") and record.get("filename"):
+                records.append(record)
+    return records
+
+
+def remove_record(content_hash):
+    """
+    Delete the spool record of an import.
+
+    Args:
+        content_hash (str): SHA-256 of the image.
+    """
+    try:
+        os.remove(_spool_path(content_hash))
+    except FileNotFoundError:
+        pass
+
+
+def notify_sync():
+    """
+    Ask the sync daemon to run a cycle now (best effort).
+
+    Returns:
+        bool: True if the daemon accepted the trigger.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(2)
+            sock.connect(SYNC_SOCKET)
+            sock.sendall(b"sync\n")
+            return sock.recv(16).startswith(b"ok")
+    except OSError:
+        return False
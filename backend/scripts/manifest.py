@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+manifest.py
+
+SQLite-backed sync-state manifest for the local media mirror.
+
+Every media item that has been mirrored into `downloads/` is recorded with its
+API id, local filename, type, byte size, content hash, mtime, pixel dimensions,
+caption (text) hash, the server-side version fingerprint, the sync cycle it
+was last seen in and whether its file was evicted to stay within the storage
+budget (storage_budget.py).
+`get_all.py` plans each sync as an indexed diff of the API response against
+this table instead of probing the filesystem for every file.
+
+Database location:
+    config/sync_manifest.db
+
+Requirements:
+- Python 3.x (sqlite3 from the standard library)
+"""
+
+import os
+import sqlite3
+import threading
+
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "sync_manifest.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER,
+    content_hash TEXT,
+    mtime INTEGER,
+    width INTEGER,
+    height INTEGER,
+    text_hash TEXT,
+    version TEXT,
+    last_seen INTEGER NOT NULL,
+    evicted INTEGER
+);
+CREATE INDEX IF NOT EXISTS media_last_seen ON media (last_seen);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = ("id", "type", "category", "filename", "size", "content_hash",
+           "mtime", "width", "height", "text_hash", "version", "last_seen", "evicted")
+
+
+class Manifest:
+    """
+    Thread-safe wrapper around the sync manifest database.
+
+    Args:
+        path (str): Path of the SQLite database file.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        """
+        Add columns introduced after the manifest was first created.
+        """
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(media)")}
+        for column in ("mtime", "width", "height", "evicted"):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE media ADD COLUMN {column} INTEGER")
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def get_meta(self, key, default=None):
+        """
+        Read a value from the meta table.
+
+        Args:
+            key (str): The meta key.
+            default: Returned if the key is not set.
+
+        Returns:
+            str: The stored value or default.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        """
+        Store a value in the meta table.
+
+        Args:
+            key (str): The meta key.
+            value: The value (stored as text).
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+            )
+            self._conn.commit()
+
+    def begin_cycle(self):
+        """
+        Start a new sync cycle.
+
+        Returns:
+            int: The number of the new cycle.
+        """
+        cycle = int(self.get_meta("cycle", 0)) + 1
+        self.set_meta("cycle", cycle)
+        return cycle
+
+    def entries(self):
+        """
+        Return all manifest entries.
+
+        Returns:
+            dict: Entries (as dicts) keyed by media id.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM media").fetchall()
+        return {row["id"]: dict(row) for row in rows}
+
+    def mark_seen(self, media_ids, cycle):
+        """
+        Mark existing entries as present in the current API response.
+
+        Args:
+            media_ids (iterable): Ids of the items listed by the API.
+            cycle (int): The current sync cycle.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE media SET last_seen = ? WHERE id = ?",
+                [(cycle, str(media_id)) for media_id in media_ids],
+            )
+            self._conn.commit()
+
+    def record(self, entry):
+        """
+        Insert or replace a manifest entry.
+
+        Args:
+            entry (dict): Values for the columns in COLUMNS; missing ones are NULL.
+        """
+        values = [entry.get(column) for column in COLUMNS]
+        values[0] = str(values[0])
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO media ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                values,
+            )
+            self._conn.commit()
+
+    def update(self, media_id, **fields):
+        """
+        Update single columns of an existing entry, e.g. a verified mtime.
+
+        Args:
+            media_id: The API id of the media item.
+            **fields: Column values to set (names from COLUMNS).
+        """
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown manifest columns: {sorted(unknown)}")
+
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE media SET {assignments} WHERE id = ?",
+                [*fields.values(), str(media_id)],
+            )
+            self._conn.commit()
+
+    def stale(self, cycle):
+        """
+        Return entries that were not listed by the API in the given cycle.
+
+        Args:
+            cycle (int): The current sync cycle.
+
+        Returns:
+            list: Stale entries as dicts.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM media WHERE last_seen < ?", (cycle,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove(self, media_id):
+        """
+        Delete the entry for the given media id.
+
+        Args:
+            media_id: The API id of the media item.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM media WHERE id = ?", (str(media_id),))
+            self._conn.commit()
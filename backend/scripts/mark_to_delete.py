@@ -3,16 +3,24 @@
 mark_to_delete.py
 
 This script authenticates with the 'three-pics.com' API using OAuth2 client credentials
-and marks a specified media file (by filename) for deletion.
+and marks one or more media files (by filename) for deletion.
 
 Features:
 - Reads credentials from config/credentials.json
-- Authenticates using the OAuth2 client credentials flow
-- Sends a POST request to mark the media for deletion
+- Authenticates using the OAuth2 client credentials flow via the shared token cache
+- Takes any number of filenames from the command line or stdin (one per line)
+  and marks them with one token over one pooled session, several requests in
+  flight at a time
+- Hides the local copies right away (moved to a hold directory of this run
+  below downloads/.deleting/ and dropped from downloads/media-index.json) and
+  puts them back if the server rejects the request, so the slideshow does not
+  wait for the next sync; runs may overlap, each one only touches its own
+  hold directory
 - Provides clear CLI error messages
 
 Usage:
-    python mark_to_delete.py <filename>
+    python mark_to_delete.py <filename> [<filename> ...]
+    printf '%s\\n' a.jpg b.jpg | python mark_to_delete.py -
 
 Requirements:
 - Python 3.x
@@ -25,13 +33,31 @@ Example:
 import sys
 import os
 import json
+import fcntl
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
+import api_client
+import media_index
+import token_cache
+
 # Configuration
 CONFIG_DIR = "config"
 CREDENTIALS_FILE = os.path.join(CONFIG_DIR, "credentials.json")
-API_URL = "https://three-pics.com/api/mark-to-delete/"
-OAUTH2_TOKEN_URL = "https://three-pics.com/o/token/"
+API_URL = f"{api_client.API_BASE_URL}/mark-to-delete/"
+OAUTH2_TOKEN_URL = api_client.OAUTH2_TOKEN_URL
+DOWNLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "downloads")
+MEDIA_INDEX_FILE = os.path.join(DOWNLOAD_DIR, "media-index.json")
+# Local copies wait here until the server accepted the deletion
+HOLD_SUBDIR = ".deleting"
+# Held shared by every live run; leftovers are only purged under an exclusive lock
+HOLD_LOCK_NAME = ".lock"
+MEDIA_CATEGORIES = ("images", "videos")
+DELETE_WORKERS = 4
 
 
 def load_credentials():
@@ -59,40 +85,131 @@ def load_credentials():
         raise ValueError(f"⚠️ Invalid JSON format in {CREDENTIALS_FILE}") from exc
 
 
-def get_access_token(client_id, client_secret):
+def read_filenames(args, stdin=sys.stdin):
     """
-    Obtain an access token via OAuth2 client credentials flow.
+    Collect the filenames to mark from the arguments or stdin.
 
     Args:
-        client_id (str): OAuth2 client ID.
-        client_secret (str): OAuth2 client secret.
+        args (list): Command line arguments; "-" means read stdin.
+        stdin (file): Stream with one filename per line.
 
     Returns:
-        str: Bearer access token.
+        list: Unique bare filenames in the given order.
 
     Raises:
-        ValueError: If no token is received or request fails.
-        requests.exceptions.RequestException: For any request-related failure.
+        ValueError: If no filename was given.
     """
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'scope': 'read write',
-    }
-    response = requests.post(OAUTH2_TOKEN_URL, data=data)
+    names = stdin.read().splitlines() if args == ["-"] else args
+    filenames = []
+    for name in names:
+        name = os.path.basename(name.strip())
+        if name and name not in filenames:
+            filenames.append(name)
+    if not filenames:
+        raise ValueError("⚠️ Please provide at least one filename (as arguments or on stdin).")
+    return filenames
+
+
+def hide_local_file(filename, hold_dir):
+    """
+    Move the local copy of a media file out of the slideshow.
 
-    if response.status_code != 200:
-        print(f"❌ Failed to retrieve token: {response.status_code} {response.text}")
-        response.raise_for_status()
+    Args:
+        filename (str): Name of the media file.
+        hold_dir (str): The hold directory of this run (see open_hold_dir()).
+
+    Returns:
+        tuple: (original path, held path), or None if there is no local copy.
+    """
+    for category in MEDIA_CATEGORIES:
+        path = os.path.join(DOWNLOAD_DIR, category, filename)
+        if not os.path.isfile(path):
+            continue
+        held = os.path.join(hold_dir, category, filename)
+        os.makedirs(os.path.dirname(held), exist_ok=True)
+        os.replace(path, held)
+        return path, held
+    return None
+
+
+def update_media_index(drop_urls=(), restore_entries=()):
+    """
+    Remove entries from and re-add entries to downloads/media-index.json.
 
-    token_data = response.json()
-    access_token = token_data.get("access_token")
+    The read-modify-write holds the lock of media_index.py, so it never
+    overwrites an index written meanwhile by a sync or the video preparation.
 
-    if not access_token:
-        raise ValueError("No access_token received from the OAuth2 response.")
+    Args:
+        drop_urls (iterable): URLs ('/downloads/images/x.jpg') to remove.
+        restore_entries (iterable): Previously removed entries to add back.
 
-    return access_token
+    Returns:
+        list: The removed entries (empty if there is no index).
+    """
+    if not os.path.exists(MEDIA_INDEX_FILE):
+        return []
+
+    with media_index.locked(MEDIA_INDEX_FILE):
+        try:
+            with open(MEDIA_INDEX_FILE, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return []
+        media = index.get("media")
+        if not isinstance(media, list):
+            return []
+
+        drop_urls = set(drop_urls)
+        removed = [entry for entry in media if entry.get("url") in drop_urls]
+        index["media"] = [entry for entry in media if entry.get("url") not in drop_urls]
+        if not removed and not restore_entries:
+            return []
+        if restore_entries:
+            # Keep the order written by get_all.py: images first, then by name
+            index["media"] = sorted(
+                index["media"] + list(restore_entries),
+                key=lambda entry: (entry.get("type") != "image", entry.get("url", "")),
+            )
+
+        media_index.replace(MEDIA_INDEX_FILE, index)
+    return removed
+
+
+def open_hold_dir():
+    """
+    Create the hold directory of this run below downloads/.deleting/.
+
+    Every live run holds a shared lock on downloads/.deleting/.lock. Copies
+    left behind by interrupted runs are deleted first, but only if no other
+    run holds the lock, so overlapping runs never lose each other's files; if
+    the server still lists them, the next sync downloads them again.
+
+    Returns:
+        tuple: (hold directory, lock file descriptor for close_hold_dir())
+    """
+    root = os.path.join(DOWNLOAD_DIR, HOLD_SUBDIR)
+    os.makedirs(root, exist_ok=True)
+    lock_fd = os.open(os.path.join(root, HOLD_LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        pass
+    else:
+        for name in os.listdir(root):
+            if name != HOLD_LOCK_NAME:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    # Hold directories are only created under the shared lock, so a purge
+    # (exclusive lock) never sees one of a live run
+    fcntl.flock(lock_fd, fcntl.LOCK_SH)
+    return tempfile.mkdtemp(prefix="run-", dir=root), lock_fd
+
+
+def close_hold_dir(hold_dir, lock_fd):
+    """
+    Delete the hold directory of this run and release the shared lock.
+    """
+    shutil.rmtree(hold_dir, ignore_errors=True)
+    os.close(lock_fd)
 
 
 def mark_media_to_delete(access_token, filename):
@@ -103,7 +220,11 @@ def mark_media_to_delete(access_token, filename):
         access_token (str): Bearer token for authentication.
         filename (str): Name of the media file to be marked.
 
+    Returns:
+        bool: True if the server accepted the request.
+
     Raises:
+        requests.exceptions.HTTPError: If the token was rejected (401).
         requests.exceptions.RequestException: If the API call fails.
     """
     headers = {
@@ -115,33 +236,120 @@ def mark_media_to_delete(access_token, filename):
         "filename": filename,
     }
 
-    response = requests.post(API_URL, json=data, headers=headers)
+    # Marking a file twice is harmless, so transient failures are retried
+    response = api_client.post(API_URL, json=data, headers=headers,
+                               retries=api_client.MAX_RETRIES)
+
+    if response.status_code == 401:
+        response.raise_for_status()
 
     if response.status_code == 200:
-        print(f"✅ File successfully marked for deletion: {response.json()}")
-    else:
-        print(f"❌ Failed to mark file: {response.status_code} {response.text}")
+        print(f"✅ File successfully marked for deletion: {filename}")
+        return True
+    print(f"❌ Failed to mark {filename}: {response.status_code} {response.text}")
+    return False
 
 
-def main():
+def mark_batch(filenames, client_id, client_secret):
     """
-    Main entry point: validates arguments, loads credentials, authenticates,
-    and marks the provided filename for deletion.
+    Mark several files for deletion with one shared token.
+
+    A rejected token (401) is replaced once for the whole batch.
+
+    Args:
+        filenames (list): Names of the media files.
+        client_id (str): OAuth2 client ID.
+        client_secret (str): OAuth2 client secret.
+
+    Returns:
+        dict: True/False per filename, depending on whether the server
+        accepted the request.
+
+    Raises:
+        requests.exceptions.RequestException: If no token can be obtained.
     """
-    try:
-        if len(sys.argv) < 2:
-            raise ValueError("⚠️ Please provide a filename as an argument.")
+    lock = threading.Lock()
+    token = {"value": token_cache.get_token(
+        client_id, client_secret, token_url=OAUTH2_TOKEN_URL, session=api_client.SESSION,
+    )}
+
+    def refresh(rejected):
+        with lock:
+            if token["value"] == rejected:
+                token["value"] = token_cache.get_token(
+                    client_id, client_secret, token_url=OAUTH2_TOKEN_URL,
+                    session=api_client.SESSION, rejected_token=rejected,
+                )
+            return token["value"]
+
+    def mark(filename):
+        current = token["value"]
+        try:
+            try:
+                return mark_media_to_delete(current, filename)
+            except requests.exceptions.HTTPError as e:
+                if not token_cache.is_unauthorized(e):
+                    raise
+            return mark_media_to_delete(refresh(current), filename)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ API request for {filename} failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=min(DELETE_WORKERS, len(filenames))) as executor:
+        return dict(zip(filenames, executor.map(mark, filenames)))
 
-        filename = sys.argv[1]
 
-        client_id, client_secret = load_credentials()
-        token = get_access_token(client_id, client_secret)
-        mark_media_to_delete(token, filename)
+def main():
+    """
+    Main entry point: reads the filenames, hides the local copies, marks
+    them for deletion and restores those the server did not accept.
 
-    except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+    Exits with status 1 if any file could not be marked.
+    """
+    try:
+        filenames = read_filenames(sys.argv[1:])
+        client_id, client_secret = load_credentials()
+    except (FileNotFoundError, ValueError) as e:
         print(f"❌ Error: {e}")
-    except requests.exceptions.RequestException as e:
+        sys.exit(1)
+
+    hold_dir, lock_fd = open_hold_dir()
+    hidden = {}
+    for filename in filenames:
+        try:
+            moved = hide_local_file(filename, hold_dir)
+        except OSError as e:
+            print(f"⚠️  Could not hide {filename}: {e}")
+            continue
+        if moved:
+            hidden[filename] = moved
+    urls = {
+        "/downloads/" + os.path.relpath(original, DOWNLOAD_DIR).replace(os.sep, "/"): filename
+        for filename, (original, _) in hidden.items()
+    }
+    removed = update_media_index(drop_urls=urls)
+
+    try:
+        results = mark_batch(filenames, client_id, client_secret)
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"❌ API request failed: {e}")
+        results = dict.fromkeys(filenames, False)
+
+    for filename, (original, held) in hidden.items():
+        if results.get(filename):
+            os.remove(held)
+            continue
+        os.replace(held, original)
+        print(f"↩️  Restored {filename}")
+    restore = [entry for entry in removed if not results.get(urls[entry["url"]])]
+    if restore:
+        update_media_index(restore_entries=restore)
+    close_hold_dir(hold_dir, lock_fd)
+
+    failed = [filename for filename in filenames if not results.get(filename)]
+    print(f"🧾 Marked {len(filenames) - len(failed)} of {len(filenames)} file(s) for deletion.")
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+media_index.py
+
+Serialized updates of downloads/media-index.json, the precomputed listing
+served by routes/media.js.
+
+The index is written by get_all.py (every sync cycle), by the background
+video preparation (videoprep.py, through get_all.write_media_index()) and by
+mark_to_delete.py (hides and restores single entries). These run as separate
+processes, so every update:
+- holds an exclusive flock on downloads/media-index.json.lock for the whole
+  read-modify-write (`locked()`), and
+- writes a temp file with a unique name next to the index and renames it
+  into place (`replace()`), so readers never see a half-written index.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+LOCK_SUFFIX = ".lock"
+
+
+def _match_owner(fd, directory):
+    """
+    Give a file opened by root to the owner of its directory, so the backend
+    user can open it later (see local_imports._match_owner()).
+    """
+    if os.geteuid() != 0:
+        return
+    stat = os.stat(directory)
+    os.fchown(fd, stat.st_uid, stat.st_gid)
+
+
+@contextmanager
+def locked(index_path):
+    """
+    Hold an exclusive lock on the media index for the duration of the block.
+
+    Args:
+        index_path (str): Path of media-index.json.
+    """
+    directory = os.path.dirname(index_path)
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(index_path + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _match_owner(fd, directory)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def replace(index_path, index):
+    """
+    Atomically replace the media index. Call it inside `locked()`.
+
+    Args:
+        index_path (str): Path of media-index.json.
+        index (dict): The new index.
+    """
+    directory = os.path.dirname(index_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(index_path) + ".",
+                                    suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        # mkstemp creates the file 0600; routes/media.js may run as another user
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
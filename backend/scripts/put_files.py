@@ -2,14 +2,44 @@
 """
 threepics_upload.py
 
-This script scans the local upload directory for image files, uploads them
-to the ThreePics API using OAuth2 client credentials, and deletes each file
-after a successful upload.
+This script scans the local upload directory for image and video files,
+uploads them to the ThreePics API using OAuth2 client credentials, and deletes
+each file after a successful upload.
+
+Features:
+- Uploads run in parallel on a bounded worker pool (`upload_workers` in
+  config/setup.json, default 4) over the shared api_client.py session.
+- Failed uploads are retried with jittered exponential backoff on 5xx responses,
+  timeouts and connection errors.
+- Every file is deleted as soon as its own upload succeeded.
+- Small files are sent as a streamed multipart body (one block in memory at a
+  time). Files from CHUNKED_UPLOAD_THRESHOLD on use the resumable chunked
+  protocol: the upload is opened once, sent in CHUNK_SIZE pieces with
+  Content-Range headers, and the acknowledged offset is recorded in
+  config/upload_state.json, so an interrupted upload continues where it
+  stopped (also across runs). Servers without the chunked endpoint get the
+  streamed multipart upload instead.
+- Optional pre-upload downscaling (`"upload_downscale": true` in
+  config/setup.json): images whose longest edge exceeds `upload_max_edge`
+  (default 2560) are scaled down and re-encoded at `upload_quality` (default
+  85) in a low-priority process pool (`upload_encode_workers`, default 2).
+  EXIF data (orientation, capture date) and the colour profile are kept.
+  Uploads start as soon as each image is encoded, so encoding and uploading
+  overlap. Requires Pillow; without it originals are uploaded.
+- The media id the server returns for an upload is passed on to
+  local_imports.py, which links USB imports shown locally to their server item.
+- Content already uploaded from this device (upload_ledger.py, keyed by
+  SHA-256) is skipped and deleted locally instead of being sent again; so
+  are identical copies within one run.
+- Optional bandwidth limits with time-of-day profiles (bandwidth.py,
+  `upload_limit_mbit` / `bandwidth_profiles` in config/setup.json), lifted
+  while the display is off.
+- The run ends with a files/s and MB/s summary and the time spent throttled.
 
 Requirements:
 - credentials.json in ./config with client_id and client_secret
 - Internet access
-- requests library (installed automatically if missing)
+- requests (see requirements.txt)
 
 Target folder:
     /opt/threepics/threepics-dashboard/backend/uploads
@@ -19,107 +49,834 @@ Author: Björn Becker
 
 import os
 import sys
+import io
 import json
+import mimetypes
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
-API_BASE_URL = "https://three-pics.com/api"
-OAUTH2_TOKEN_URL = "https://three-pics.com/o/token/"
 UPLOAD_DIR = "/opt/threepics/threepics-dashboard/backend/uploads"
 CONFIG = "/opt/threepics/threepics-dashboard/backend/config/credentials.json"
+SETUP_FILE = "/opt/threepics/threepics-dashboard/backend/config/setup.json"
+UPLOAD_STATE_FILE = "/opt/threepics/threepics-dashboard/backend/config/upload_state.json"
+# Media type (and multipart field / upload endpoint) per file extension
+MEDIA_TYPES = {
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".png": "image",
+    ".mp4": "video",
+    ".mov": "video",
+    ".m4v": "video",
+}
+CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+STREAM_BLOCK_SIZE = 64 * 1024
+DEFAULT_UPLOAD_WORKERS = 4
+# Downscaled copies are written here before they are uploaded
+PREPARED_DIR = os.path.join(UPLOAD_DIR, ".prepared")
+DEFAULT_MAX_EDGE = 2560
+DEFAULT_UPLOAD_QUALITY = 85
+DEFAULT_ENCODE_WORKERS = 2
+ENCODER_NICENESS = 10
+UPLOAD_TIMEOUT = (10, 60)
+# Attempts per file and the ceiling of the first retry delay (doubled each
+# time, jittered by api_client.backoff_delay)
+MAX_ATTEMPTS = 4
+RETRY_BACKOFF = 2
+
+import requests
+
+import api_client
+import bandwidth
+import local_imports
+import token_cache
+import upload_ledger
+
+# Pillow, imported by _load_pil()
+Image = None
+
+API_BASE_URL = api_client.API_BASE_URL
+OAUTH2_TOKEN_URL = api_client.OAUTH2_TOKEN_URL
+
+_token_lock = threading.Lock()
+_token = None
+_credentials = None
+_state_lock = threading.Lock()
+# Opened by main(); shared by all upload workers
+_ledger = None
+# Cleared once the server turned out not to offer chunked uploads
+_chunked_supported = True
+_throttle_lock = threading.Lock()
+_throttle = None
+
+
+class MultipartStream:
+    """
+    File-like multipart/form-data body that reads the file lazily.
+
+    requests sends it with a Content-Length header and pulls it block by
+    block, so memory use does not grow with the file size.
+
+    Args:
+        field (str): Name of the form field.
+        filepath (str): The file to send.
+        throttle (bandwidth.Throttle): Rate limiter for the body, if any.
+    """
+
+    def __init__(self, field, filepath, throttle=None):
+        boundary = uuid.uuid4().hex
+        filename = os.path.basename(filepath).replace('"', "%22")
+        mime_type = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._file = open(filepath, "rb")
+        self._length = len(head) + os.fstat(self._file.fileno()).st_size + len(tail)
+        self._parts = [io.BytesIO(head), self._file, io.BytesIO(tail)]
+        self._throttle = throttle
+
+    def __len__(self):
+        return self._length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, size=-1):
+        """
+        Read up to size bytes of the encoded body.
+
+        Args:
+            size (int): Maximum number of bytes (-1 for one block).
+
+        Returns:
+            bytes: The next part of the body (empty at the end).
+        """
+        if size is None or size < 0:
+            size = STREAM_BLOCK_SIZE
+        while self._parts:
+            data = self._parts[0].read(size)
+            if data:
+                if self._throttle:
+                    self._throttle.consume(len(data))
+                return data
+            self._parts.pop(0)
+        return b""
+
+    def close(self):
+        """
+        Close the underlying file.
+        """
+        self._file.close()
+
+
+def load_credentials():
+    """
+    Load OAuth2 client credentials from credentials.json.
+
+    Returns:
+        tuple: (client_id, client_secret)
+
+    Raises:
+        FileNotFoundError: If credentials.json is missing.
+        ValueError: If the JSON is invalid or required fields are missing.
+    """
+    if not os.path.exists(CONFIG):
+        raise FileNotFoundError("config/credentials.json not found.")
+
+    with open(CONFIG, "r", encoding="utf-8") as f:
+        try:
+            creds = json.load(f)
+        except json.JSONDecodeError as err:
+            raise ValueError(f"Invalid JSON in credentials.json: {err}") from err
 
-try:
-    import requests
-except ImportError:
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
+    client_id = creds.get("client_id")
+    client_secret = creds.get("client_secret")
 
-# Load credentials
-if not os.path.exists(CONFIG):
-    print("❌ config/credentials.json not found.")
-    sys.exit(1)
+    if not client_id or not client_secret:
+        raise ValueError("client_id or client_secret missing in credentials.json.")
 
-with open(CONFIG, "r", encoding="utf-8") as f:
+    return client_id, client_secret
+
+
+def load_setup():
+    """
+    Load the local setup configuration written by get_setup.py.
+
+    Returns:
+        dict: The parsed setup.json, or an empty dict if missing or invalid.
+    """
     try:
-        creds = json.load(f)
-    except json.JSONDecodeError as err:
-        print(f"❌ Invalid JSON in credentials.json: {err}")
-        sys.exit(1)
+        with open(SETUP_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def get_upload_workers(setup):
+    """
+    Determine the number of concurrent upload workers.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        int: The configured worker count (at least 1).
+    """
+    try:
+        workers = int(setup.get("upload_workers", DEFAULT_UPLOAD_WORKERS))
+    except (TypeError, ValueError):
+        workers = DEFAULT_UPLOAD_WORKERS
+    return max(1, workers)
+
+
+def load_upload_state():
+    """
+    Load the offsets of unfinished chunked uploads.
+
+    Returns:
+        dict: Entries keyed by file path (empty if missing or invalid).
+    """
+    try:
+        with open(UPLOAD_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def update_upload_state(filepath, entry):
+    """
+    Atomically record (or with entry=None forget) a chunked upload.
+
+    Args:
+        filepath (str): Path of the file being uploaded.
+        entry (dict): upload_id, size, mtime_ns and acknowledged offset.
+    """
+    with _state_lock:
+        state = load_upload_state()
+        if entry is None:
+            if state.pop(filepath, None) is None:
+                return
+        else:
+            state[filepath] = entry
+        tmp_path = UPLOAD_STATE_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, UPLOAD_STATE_FILE)
 
-CLIENT_ID = creds.get("client_id")
-CLIENT_SECRET = creds.get("client_secret")
 
-if not CLIENT_ID or not CLIENT_SECRET:
-    print("❌ client_id or client_secret missing in credentials.json.")
-    sys.exit(1)
+def _setup_int(setup, key, default):
+    try:
+        return int(setup.get(key, default))
+    except (TypeError, ValueError):
+        return default
 
 
-def get_oauth2_token(client_id, client_secret):
+def downscale_settings(setup):
     """
-    Get access token using OAuth2 client credentials.
+    Read the pre-upload downscaling settings from setup.json.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        dict: max_edge, quality and workers, or None if the stage is disabled
+        or Pillow is unavailable.
     """
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "scope": "read write",
+    if not setup.get("upload_downscale"):
+        return None
+    if not _load_pil():
+        print("⚠️  upload_downscale is enabled but Pillow is not installed, uploading originals.")
+        return None
+    return {
+        "max_edge": max(1, _setup_int(setup, "upload_max_edge", DEFAULT_MAX_EDGE)),
+        "quality": _setup_int(setup, "upload_quality", DEFAULT_UPLOAD_QUALITY),
+        "workers": max(1, _setup_int(setup, "upload_encode_workers", DEFAULT_ENCODE_WORKERS)),
     }
-    response = requests.post(OAUTH2_TOKEN_URL, data=data, timeout=60)
-    response.raise_for_status()
-    return response.json().get("access_token")
 
 
-def upload_image(filepath, token):
+def _load_pil():
+    """
+    Import Pillow on first use, so importing this module stays cheap.
+
+    Returns:
+        bool: False if Pillow is not installed.
+    """
+    global Image
+    if Image is None:
+        try:
+            from PIL import Image
+        except ImportError:
+            return False
+    return True
+
+
+def _lower_priority():
+    os.nice(ENCODER_NICENESS)
+
+
+def downscale_image(src, dest, max_edge, quality):
+    """
+    Write a downscaled, re-encoded copy of an image (process pool worker).
+
+    The pixels are not rotated; the original EXIF block (orientation, capture
+    date) and ICC profile are copied, so the copy displays like the original.
+
+    Args:
+        src (str): Path of the original image.
+        dest (str): Path of the copy.
+        max_edge (int): Maximum length of the longest edge.
+        quality (int): JPEG quality.
+
+    Returns:
+        str: dest, or None if the original is small enough already or the
+        copy would not be smaller.
     """
-    Upload a single image file to the API.
+    _load_pil()
+    with Image.open(src) as img:
+        if max(img.size) <= max_edge:
+            return None
+
+        fmt = img.format
+        options = {"optimize": True}
+        for key in ("exif", "icc_profile"):
+            if img.info.get(key):
+                options[key] = img.info[key]
+
+        # Let the JPEG decoder skip detail we are going to throw away anyway
+        img.draft("RGB", (max_edge, max_edge))
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        if fmt == "JPEG":
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            options["quality"] = quality
+        else:
+            fmt = "PNG"
+
+        tmp_path = dest + ".part"
+        img.save(tmp_path, fmt, **options)
+
+    if os.path.getsize(tmp_path) >= os.path.getsize(src):
+        os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, dest)
+    return dest
+
+
+def get_upload_token(rejected_token=None):
+    """
+    Return the access token shared by all upload workers.
+
+    Args:
+        rejected_token (str): A token the API just rejected. Only the first
+            worker that reports it requests a replacement.
+
+    Returns:
+        str: A valid access token.
+
+    Raises:
+        FileNotFoundError: If credentials.json is missing.
+        ValueError: If the credentials are invalid.
+        requests.exceptions.RequestException: If the token request fails.
+    """
+    global _token, _credentials
+    with _token_lock:
+        if _credentials is None:
+            _credentials = load_credentials()
+        if _token is None or _token == rejected_token:
+            client_id, client_secret = _credentials
+            _token = token_cache.get_token(
+                client_id, client_secret, token_url=OAUTH2_TOKEN_URL,
+                session=api_client.SESSION, rejected_token=rejected_token,
+            )
+        return _token
+
+
+def upload_throttle():
+    """
+    Return the rate limiter shared by all uploads of this process.
+
+    It is created from setup.json on first use, so uploads started from
+    threepics_usbcopy.py are limited as well.
+
+    Returns:
+        bandwidth.Throttle: The upload throttle.
+    """
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None:
+            _throttle = bandwidth.Throttle(load_setup(), "upload")
+        return _throttle
+
+
+def media_type(filepath):
+    """
+    Return the media type of an uploadable file.
+
+    Args:
+        filepath (str): Path to the local file
+
+    Returns:
+        str: "image" or "video", or None for unsupported files.
+    """
+    return MEDIA_TYPES.get(os.path.splitext(filepath)[1].lower())
+
+
+def response_payload(response):
+    """
+    Return the JSON object of an upload response.
+
+    Args:
+        response (requests.Response): The response.
+
+    Returns:
+        dict: The parsed body, or an empty dict if it is not a JSON object.
+    """
+    try:
+        payload = response.json()
+    except ValueError:
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def upload_multipart(filepath, token):
+    """
+    Upload a file as a streamed multipart request (one attempt).
+
+    Args:
+        filepath (str): Path to the local file
+        token (str): OAuth2 bearer token
+
+    Returns:
+        dict: The JSON body of the server response.
+
+    Raises:
+        requests.exceptions.RequestException: If the upload fails.
+    """
+    mtype = media_type(filepath)
+    url = f"{API_BASE_URL}/upload/{mtype}/"
+
+    with MultipartStream(mtype, filepath, upload_throttle()) as body:
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": body.content_type}
+        response = api_client.post(url, headers=headers, data=body, timeout=UPLOAD_TIMEOUT)
+        response.raise_for_status()
+    return response_payload(response)
+
+
+def start_chunked_upload(filepath, token):
+    """
+    Open a chunked upload, or resume the one recorded for this file.
 
     Args:
         filepath (str): Path to the local file
         token (str): OAuth2 bearer token
 
     Returns:
-        bool: True if upload was successful, False otherwise
+        dict: The upload state (upload_id, size, mtime_ns, offset), or None if
+        the server does not offer chunked uploads.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
     """
-    url = f"{API_BASE_URL}/upload/image/"
+    global _chunked_supported
     headers = {"Authorization": f"Bearer {token}"}
+    stat = os.stat(filepath)
+
+    entry = load_upload_state().get(filepath)
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        # Ask the server how much it actually has
+        response = api_client.get(f"{API_BASE_URL}/upload/chunked/{entry['upload_id']}/",
+                                  headers=headers, timeout=UPLOAD_TIMEOUT)
+        if response.status_code not in (404, 410):
+            response.raise_for_status()
+            entry["offset"] = int(response.json().get("offset", 0))
+            print(f"⏯️  Resuming {os.path.basename(filepath)} at {entry['offset']} bytes")
+            return entry
+
+    response = api_client.post(
+        f"{API_BASE_URL}/upload/chunked/",
+        headers=headers,
+        json={"filename": os.path.basename(filepath), "type": media_type(filepath),
+              "size": stat.st_size},
+        timeout=UPLOAD_TIMEOUT,
+    )
+    if response.status_code in (404, 405, 501):
+        _chunked_supported = False
+        update_upload_state(filepath, None)
+        return None
+    response.raise_for_status()
+
+    entry = {
+        "upload_id": response.json()["upload_id"],
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "offset": 0,
+    }
+    update_upload_state(filepath, entry)
+    return entry
+
+
+def upload_chunked(filepath, token):
+    """
+    Upload a file with the resumable chunked protocol (one attempt).
+
+    Every chunk is sent with a Content-Range header; the offset acknowledged
+    by the server is recorded, so a retry continues from there.
+
+    Args:
+        filepath (str): Path to the local file
+        token (str): OAuth2 bearer token
+
+    Returns:
+        dict: The JSON body of the final server response (empty if no chunk
+        was left to send), or None if the server does not offer chunked
+        uploads.
+
+    Raises:
+        requests.exceptions.RequestException: If a request fails.
+    """
+    entry = start_chunked_upload(filepath, token)
+    if entry is None:
+        return None
+
+    url = f"{API_BASE_URL}/upload/chunked/{entry['upload_id']}/"
+    size = entry["size"]
+    offset = entry["offset"]
+    payload = {}
+    throttle = upload_throttle()
+
+    with open(filepath, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            data = f.read(CHUNK_SIZE)
+            throttle.consume(len(data))
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/octet-stream",
+                "Content-Range": f"bytes {offset}-{offset + len(data) - 1}/{size}",
+            }
+            response = api_client.put(url, headers=headers, data=data, timeout=UPLOAD_TIMEOUT)
+            if response.status_code in (404, 410):
+                # The server dropped the upload: start over on the next attempt
+                update_upload_state(filepath, None)
+            response.raise_for_status()
+            payload = response_payload(response)
+            offset = int(payload.get("offset", offset + len(data)))
+            entry["offset"] = offset
+            update_upload_state(filepath, entry)
+
+    update_upload_state(filepath, None)
+    return payload
+
+
+def upload_file(filepath, token):
+    """
+    Upload a single image or video file to the API (one attempt).
+
+    Args:
+        filepath (str): Path to the local file
+        token (str): OAuth2 bearer token
+
+    Returns:
+        The media id assigned by the server, or None if it sent none.
+
+    Raises:
+        requests.exceptions.RequestException: If the upload fails.
+    """
+    payload = None
+    if _chunked_supported and os.path.getsize(filepath) >= CHUNKED_UPLOAD_THRESHOLD:
+        payload = upload_chunked(filepath, token)
+    if payload is None:
+        payload = upload_multipart(filepath, token)
+    return payload.get("id")
+
+
+def upload_with_retries(filepath, upload_path=None):
+    """
+    Upload a file, retrying transient failures.
+
+    A rejected token (401) is replaced once; 5xx responses, timeouts and
+    connection errors are retried with exponential backoff.
+
+    Args:
+        filepath (str): Path to the local file
+        upload_path (str): A downscaled copy to send instead of the original.
+
+    Returns:
+        tuple: (size of the uploaded file in bytes, media id assigned by the
+        server or None), or None if the upload failed.
+    """
     filename = os.path.basename(filepath)
+    upload_path = upload_path or filepath
+    try:
+        size = os.path.getsize(upload_path)
+    except OSError as stat_error:
+        print(f"❌ Failed to upload {filename}: {stat_error}")
+        return None
+    token = get_upload_token()
+    token_refreshed = False
+    attempt = 1
+
+    while True:
+        try:
+            media_id = upload_file(upload_path, token)
+            break
+        except (requests.exceptions.RequestException, OSError,
+                KeyError, ValueError) as upload_error:
+            if token_cache.is_unauthorized(upload_error) and not token_refreshed:
+                print("🔐 Token rejected, requesting a new one...")
+                token = get_upload_token(rejected_token=token)
+                token_refreshed = True
+                continue
+            if not api_client.is_retryable(upload_error) or attempt >= MAX_ATTEMPTS:
+                print(f"❌ Failed to upload {filename}: {upload_error}")
+                return None
+            delay = api_client.backoff_delay(attempt, RETRY_BACKOFF)
+            print(f"🔁 Upload of {filename} failed ({upload_error}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            attempt += 1
+
+    print(f"✅ Uploaded: {filename}")
+    return size, media_id
+
 
+def upload_and_delete(filepath, content_hash, upload_path=None):
+    """
+    Upload a file with retries, record it in the upload ledger and delete it
+    once the upload succeeded.
+
+    Args:
+        filepath (str): Path to the local file
+        content_hash (str): SHA-256 of the original file.
+        upload_path (str): A downscaled copy to send instead of the original.
+            Both are deleted after the upload.
+
+    Returns:
+        int: Size of the uploaded file in bytes, or None if the upload failed.
+    """
+    filename = os.path.basename(filepath)
+    result = upload_with_retries(filepath, upload_path)
+    if result is None:
+        return None
+    size, media_id = result
+
+    _ledger.mark_uploaded(content_hash, os.path.getsize(filepath), filename)
+    local_imports.confirm_upload(content_hash, media_id)
     try:
-        with open(filepath, "rb") as file_handle:
-            files = {"image": (filename, file_handle)}
-            response = requests.post(url, headers=headers, files=files, timeout=60)
-            response.raise_for_status()
-            print(f"✅ Uploaded: {filename}")
-            return True
-    except Exception as upload_error:
-        print(f"❌ Failed to upload {filename}: {upload_error}")
-        return False
+        os.remove(filepath)
+        print(f"🗑️  Deleted: {filename}")
+    except OSError as delete_error:
+        print(f"⚠️  Could not delete {filename}: {delete_error}")
+    if upload_path:
+        remove_file(upload_path)
+    return size
+
+
+def remove_file(path):
+    """
+    Delete a local file, ignoring files that are already gone.
+
+    Args:
+        path (str): Path of the file.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as delete_error:
+        print(f"⚠️  Could not delete {path}: {delete_error}")
+
+
+def find_duplicates(paths, workers):
+    """
+    Hash the files to upload and split off content that needs no upload.
+
+    Hashes recorded by threepics_usbcopy.py are reused; other files are hashed
+    on a thread pool.
+
+    Args:
+        paths (list): Paths of the files in the upload directory.
+        workers (int): Size of the hashing pool.
+
+    Returns:
+        tuple: ({path: SHA-256} of the files to upload, list of duplicate paths).
+    """
+    def content_hash(path):
+        try:
+            digest = _ledger.pending_hash(path, os.path.getsize(path))
+            return digest or upload_ledger.file_sha256(path)
+        except OSError as hash_error:
+            print(f"⚠️  Could not read {os.path.basename(path)}: {hash_error}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = list(pool.map(content_hash, paths))
+
+    unique = {}
+    duplicates = []
+    seen = set()
+    for path, digest in zip(paths, hashes):
+        if digest is None:
+            continue
+        if digest in seen or _ledger.is_uploaded(digest):
+            duplicates.append(path)
+        else:
+            seen.add(digest)
+            unique[path] = digest
+    return unique, duplicates
+
+
+def submit_uploads(executor, hashes, settings):
+    """
+    Queue the uploads, downscaling images first if enabled.
+
+    Images are encoded in a process pool; each one is handed to the upload
+    pool as soon as its encoding finished, so both stages run concurrently.
+    Images that cannot be encoded (unreadable file, encoder process died) are
+    uploaded as they are.
+
+    Args:
+        executor (ThreadPoolExecutor): The upload pool.
+        hashes (dict): SHA-256 of each file to upload, keyed by path.
+        settings (dict): Result of downscale_settings(), or None if disabled.
+
+    Returns:
+        list: Futures of upload_and_delete().
+    """
+    images = {path for path in hashes if media_type(path) == "image"} if settings else set()
+    if not images:
+        return [executor.submit(upload_and_delete, path, digest) for path, digest in hashes.items()]
+
+    # Copies left behind by an interrupted run
+    shutil.rmtree(PREPARED_DIR, ignore_errors=True)
+    os.makedirs(PREPARED_DIR, exist_ok=True)
+
+    futures = []
+    print(f"🗜️  Downscaling {len(images)} image(s) to max. {settings['max_edge']} px...")
+    with ProcessPoolExecutor(max_workers=settings["workers"], initializer=_lower_priority) as pool:
+        # Start the encoders before any upload thread exists (fork safety)
+        encodes = {
+            pool.submit(downscale_image, path,
+                        os.path.join(PREPARED_DIR, os.path.basename(path)),
+                        settings["max_edge"], settings["quality"]): path
+            for path in images
+        }
+        futures += [executor.submit(upload_and_delete, path, digest)
+                    for path, digest in hashes.items() if path not in images]
+
+        broken = False
+        for encode in as_completed(encodes):
+            path = encodes[encode]
+            try:
+                prepared = encode.result()
+            except BrokenProcessPool:
+                # An encoder died (e.g. OOM-killed): every image still queued
+                # fails the same way, so upload the remaining originals
+                if not broken:
+                    print("⚠️  Downscaling worker died, uploading the remaining originals.")
+                    broken = True
+                prepared = None
+            except Exception as e:
+                # Corrupt files make Pillow raise more than OSError
+                print(f"⚠️  Could not downscale {os.path.basename(path)}, uploading original: {e!r}")
+                prepared = None
+            futures.append(executor.submit(upload_and_delete, path, hashes[path], prepared))
+    return futures
+
+
+def print_summary(files, total_bytes, elapsed, workers):
+    """
+    Print the aggregate upload throughput of a run.
+
+    Args:
+        files (int): Number of uploaded files.
+        total_bytes (int): Number of uploaded bytes.
+        elapsed (float): Wall-clock duration in seconds.
+        workers (int): Size of the worker pool.
+    """
+    mbytes = total_bytes / (1024 * 1024)
+    files_rate = files / elapsed if elapsed > 0 else 0.0
+    mb_rate = mbytes / elapsed if elapsed > 0 else 0.0
+    print(f"📊 Uploaded {files} file(s), {mbytes:.1f} MB in {elapsed:.1f}s "
+          f"({files_rate:.2f} files/s, {mb_rate:.2f} MB/s, {workers} worker(s))")
 
 
 def main():
     """
-    Main upload loop. Authenticates, uploads all image files in UPLOAD_DIR,
-    and deletes them after successful upload.
+    Main upload loop. Authenticates, uploads all image and video files in
+    UPLOAD_DIR on a bounded worker pool and deletes each one after its
+    successful upload. Content uploaded before is deleted without upload.
     """
+    global _ledger
     print("🔐 Authenticating with API...")
-    token = get_oauth2_token(CLIENT_ID, CLIENT_SECRET)
+    try:
+        get_upload_token()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
 
     files = os.listdir(UPLOAD_DIR)
-    image_files = [f for f in files if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    media_files = [f for f in files if media_type(f)]
 
-    if not image_files:
-        print("📂 No image files found in upload directory.")
+    if not media_files:
+        print("📂 No image or video files found in upload directory.")
         return
 
-    for filename in image_files:
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        if upload_image(filepath, token):
-            try:
-                os.remove(filepath)
-                print(f"🗑️  Deleted: {filename}")
-            except Exception as delete_error:
-                print(f"⚠️  Could not delete {filename}: {delete_error}")
+    # Forget unfinished chunked uploads of files that are gone
+    for path in load_upload_state():
+        if not os.path.exists(path):
+            update_upload_state(path, None)
+
+    setup = load_setup()
+    workers = min(get_upload_workers(setup), len(media_files))
+    started = time.monotonic()
+    uploaded = 0
+    total_bytes = 0
+    failed = 0
+
+    _ledger = upload_ledger.Ledger()
+    try:
+        paths = [os.path.join(UPLOAD_DIR, filename) for filename in media_files]
+        hashes, duplicates = find_duplicates(paths, workers)
+        for path in duplicates:
+            print(f"⏭️  Already uploaded, deleting: {os.path.basename(path)}")
+            remove_file(path)
+        failed = len(paths) - len(hashes) - len(duplicates)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = submit_uploads(executor, hashes, downscale_settings(setup))
+            for future in futures:
+                size = future.result()
+                if size is None:
+                    failed += 1
+                else:
+                    uploaded += 1
+                    total_bytes += size
+    finally:
+        _ledger.close()
 
-    print("✅ All done.")
+    print_summary(uploaded, total_bytes, time.monotonic() - started, workers)
+    upload_throttle().report()
+    if duplicates:
+        print(f"⏭️  Skipped {len(duplicates)} duplicate(s).")
+    if failed:
+        print(f"⚠️  {failed} file(s) could not be uploaded and were kept.")
+    else:
+        print("✅ All done.")
 
 
 if __name__ == "__main__":
@@ -8,7 +8,7 @@ reads device information from a local JSON file, and registers the device via th
 Features:
 - Reads client credentials from config/credentials.json
 - Loads device information from config/device.json
-- Authenticates using OAuth2 client credentials
+- Authenticates using OAuth2 client credentials via the shared token cache
 - Registers the device using the /device/register endpoint
 
 Usage:
@@ -16,7 +16,7 @@ Usage:
 
 Requirements:
 - Python 3.x
-- requests (auto-installed if missing)
+- requests (see requirements.txt)
 
 Example device.json:
 {
@@ -28,20 +28,17 @@ Example device.json:
 import os
 import json
 
-API_BASE_URL = "https://three-pics.com/api"
-OAUTH2_TOKEN_URL = "https://three-pics.com/o/token/"
 CONFIG_DIR = "config"
 DEVICE_FILE = os.path.join(CONFIG_DIR, "device.json")
 CREDENTIALS_FILE = os.path.join(CONFIG_DIR, "credentials.json")
 
-# Ensure 'requests' is installed
-try:
-    import requests
-except ImportError:
-    import subprocess
-    import sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
+import requests
+
+import api_client
+import token_cache
+
+API_BASE_URL = api_client.API_BASE_URL
+OAUTH2_TOKEN_URL = api_client.OAUTH2_TOKEN_URL
 
 
 def load_credentials():
@@ -64,31 +61,6 @@ def load_credentials():
     return creds["client_id"], creds["client_secret"]
 
 
-def get_oauth2_token(client_id, client_secret):
-    """
-    Request an OAuth2 access token using the client credentials flow.
-
-    Args:
-        client_id (str): OAuth2 client ID.
-        client_secret (str): OAuth2 client secret.
-
-    Returns:
-        str: Access token.
-
-    Raises:
-        requests.exceptions.HTTPError: If the token request fails.
-    """
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'scope': 'read write',
-    }
-    response = requests.post(OAUTH2_TOKEN_URL, data=data)
-    response.raise_for_status()
-    return response.json().get('access_token')
-
-
 def load_device_data():
     """
     Load device information from config/device.json and validate required fields.
@@ -130,7 +102,9 @@ def register_device(token, device_data):
         "Content-Type": "application/json",
     }
 
-    response = requests.post(url, headers=headers, json=device_data)
+    # Registering the same device again is harmless, so transient failures are retried
+    response = api_client.post(url, headers=headers, json=device_data,
+                               retries=api_client.MAX_RETRIES)
     response.raise_for_status()
     print(f"✅ Device successfully registered. Status code: {response.status_code}")
 
@@ -142,9 +116,12 @@ def main():
     """
     try:
         client_id, client_secret = load_credentials()
-        token = get_oauth2_token(client_id, client_secret)
         device_data = load_device_data()
-        register_device(token, device_data)
+        token_cache.call_with_token(
+            client_id, client_secret,
+            lambda token: register_device(token, device_data),
+            token_url=OAUTH2_TOKEN_URL, session=api_client.SESSION,
+        )
     except FileNotFoundError as e:
         print(f"❌ File not found: {e}")
 
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+renditions.py
+
+Optional post-download stage that produces display-sized copies of the
+mirrored images. Phone photos (12–24 MP) are decoded once here instead of on
+every slideshow transition in the browser.
+
+Features:
+- Scales images to fit the panel (display_width × display_height from
+  config/setup.json, otherwise the framebuffer size, otherwise 1024×600;
+  swapped for "orientation": "portrait").
+- Applies the EXIF orientation, so renditions are always upright.
+- Runs in a process pool at low CPU priority (`rendition_workers`, default 2).
+- Caches renditions under downloads/renditions/ keyed by the SHA-256 of the
+  source file and the target size, so each image is processed only once.
+- Writes downloads/renditions/index.json, which maps original filenames to
+  their rendition; routes/media.js serves the rendition from that map.
+- Images that already fit the panel and need no rotation are served as-is.
+
+Enable with `"image_renditions": true` in config/setup.json. Requires Pillow;
+if it is not installed the stage is skipped.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Pillow, imported by _load_pil()
+Image = None
+ImageOps = None
+
+RENDITION_SUBDIR = "renditions"
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+FRAMEBUFFER_SIZE_FILE = "/sys/class/graphics/fb0/virtual_size"
+DEFAULT_DISPLAY_SIZE = (1024, 600)
+DEFAULT_QUALITY = 85
+DEFAULT_WORKERS = 2
+WORKER_NICENESS = 10
+# EXIF tag holding the orientation
+EXIF_ORIENTATION = 0x0112
+
+
+def _load_pil():
+    """
+    Import Pillow on first use, so importing this module stays cheap.
+
+    Returns:
+        bool: False if Pillow is not installed.
+    """
+    global Image, ImageOps
+    if Image is None:
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            return False
+    return True
+
+
+def _setup_int(setup, key, default):
+    try:
+        return int(setup.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def display_size(setup):
+    """
+    Determine the target size for renditions.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        tuple: (width, height) in pixels.
+    """
+    width = _setup_int(setup, "display_width", 0)
+    height = _setup_int(setup, "display_height", 0)
+
+    if not width or not height:
+        try:
+            with open(FRAMEBUFFER_SIZE_FILE, "r", encoding="utf-8") as f:
+                width, height = (int(v) for v in f.read().strip().split(","))
+        except (OSError, ValueError):
+            width, height = DEFAULT_DISPLAY_SIZE
+
+    if setup.get("orientation") == "portrait" and width > height:
+        width, height = height, width
+    return width, height
+
+
+def rendition_settings(setup):
+    """
+    Read the rendition settings from setup.json.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        dict: width, height and quality, or None if the stage is disabled or
+        Pillow is unavailable.
+    """
+    if not setup.get("image_renditions"):
+        return None
+    if not _load_pil():
+        print("⚠️  image_renditions is enabled but Pillow is not installed, skipping.")
+        return None
+
+    width, height = display_size(setup)
+    return {
+        "width": width,
+        "height": height,
+        "quality": _setup_int(setup, "rendition_quality", DEFAULT_QUALITY),
+    }
+
+
+def rendition_workers(setup):
+    """
+    Return the size of the rendition process pool.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        int: The configured worker count (at least 1).
+    """
+    return max(1, _setup_int(setup, "rendition_workers", DEFAULT_WORKERS))
+
+
+def image_dimensions(path):
+    """
+    Read the displayed size of an image (after EXIF rotation) from its header.
+
+    Args:
+        path (str): The image file.
+
+    Returns:
+        tuple: (width, height), or None if Pillow is unavailable or the file
+        cannot be read.
+    """
+    if not _load_pil():
+        return None
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+                width, height = height, width
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return width, height
+
+
+def load_index(download_dir):
+    """
+    Load the rendition index.
+
+    Args:
+        download_dir (str): The media download directory.
+
+    Returns:
+        dict: The index, or an empty dict if missing or invalid.
+    """
+    path = os.path.join(download_dir, RENDITION_SUBDIR, INDEX_FILENAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def is_current(download_dir, settings):
+    """
+    Check whether the rendition index was built with the given settings.
+
+    Args:
+        download_dir (str): The media download directory.
+        settings (dict): Result of rendition_settings(), or None if disabled.
+
+    Returns:
+        bool: True if no rebuild is needed.
+    """
+    index = load_index(download_dir)
+    if settings is None:
+        return not index.get("images")
+    return index.get("version") == INDEX_VERSION and index.get("settings") == settings
+
+
+def _write_index(download_dir, settings, images, native):
+    rendition_dir = os.path.join(download_dir, RENDITION_SUBDIR)
+    os.makedirs(rendition_dir, exist_ok=True)
+    path = os.path.join(rendition_dir, INDEX_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "settings": settings, "images": images,
+                   "native": sorted(native)}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _lower_priority():
+    os.nice(WORKER_NICENESS)
+
+
+def render_image(src, dest_base, width, height, quality):
+    """
+    Create a display-sized, upright rendition of an image (process pool worker).
+
+    Args:
+        src (str): Path of the original image.
+        dest_base (str): Rendition path without extension.
+        width (int): Maximum width.
+        height (int): Maximum height.
+        quality (int): JPEG quality.
+
+    Returns:
+        str: Path of the written rendition, or None if the original can be
+        shown as-is (already fits and needs no rotation).
+    """
+    _load_pil()
+    with Image.open(src) as img:
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        if img.width <= width and img.height <= height and orientation in (0, 1):
+            return None
+
+        # Let the JPEG decoder skip detail we are going to throw away anyway
+        img.draft("RGB", (width, height))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+        has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+        if has_alpha:
+            dest, fmt, options = dest_base + ".png", "PNG", {"optimize": True}
+        else:
+            img = img.convert("RGB")
+            dest, fmt, options = dest_base + ".jpg", "JPEG", {"quality": quality, "optimize": True}
+
+        tmp_path = dest + ".part"
+        img.save(tmp_path, fmt, **options)
+        os.replace(tmp_path, dest)
+        return dest
+
+
+def update_renditions(download_dir, images, settings, workers=DEFAULT_WORKERS):
+    """
+    Bring the rendition cache and index in line with the mirrored images.
+
+    Args:
+        download_dir (str): The media download directory.
+        images (list): Tuples of (filename in images/, SHA-256 of the file).
+        settings (dict): Result of rendition_settings(), or None if disabled.
+        workers (int): Size of the process pool.
+    """
+    rendition_dir = os.path.join(download_dir, RENDITION_SUBDIR)
+    if settings is None and not os.path.isdir(rendition_dir):
+        return
+
+    index = load_index(download_dir)
+    # Hashes of sources that already fit the panel and are served unchanged
+    known_native = set(index.get("native", [])) if index.get("settings") == settings else set()
+    native = set()
+    mapping = {}
+    keep = {INDEX_FILENAME}
+
+    if settings is not None:
+        os.makedirs(rendition_dir, exist_ok=True)
+        size_tag = f"{settings['width']}x{settings['height']}q{settings['quality']}"
+        existing = set(os.listdir(rendition_dir))
+        pending = {}
+
+        for filename, content_hash in images:
+            base = f"{content_hash[:32]}_{size_tag}"
+            cached = [name for name in (base + ".jpg", base + ".png") if name in existing]
+            if cached:
+                mapping[filename] = f"{RENDITION_SUBDIR}/{cached[0]}"
+                keep.add(cached[0])
+            elif content_hash in known_native:
+                native.add(content_hash)
+            else:
+                pending[filename] = (base, content_hash)
+
+        if pending:
+            print(f"🖼️  Rendering {len(pending)} image(s) at {settings['width']}×{settings['height']}...")
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority) as pool:
+                    futures = {
+                        filename: pool.submit(
+                            render_image,
+                            os.path.join(download_dir, "images", filename),
+                            os.path.join(rendition_dir, base),
+                            settings["width"], settings["height"], settings["quality"],
+                        )
+                        for filename, (base, _) in pending.items()
+                    }
+                    for filename, future in futures.items():
+                        try:
+                            dest = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            # Corrupt files make Pillow raise more than OSError
+                            print(f"⚠️  Could not render {filename}: {e!r}")
+                            continue
+                        if dest is None:
+                            native.add(pending[filename][1])
+                        else:
+                            name = os.path.basename(dest)
+                            mapping[filename] = f"{RENDITION_SUBDIR}/{name}"
+                            keep.add(name)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); the remaining images are
+                # shown as originals and rendered in the next cycle
+                print("⚠️  Rendering worker died, skipping the remaining renditions this cycle.")
+
+    # Drop renditions of removed images and of previous settings
+    if os.path.isdir(rendition_dir):
+        for name in os.listdir(rendition_dir):
+            if name not in keep:
+                try:
+                    os.remove(os.path.join(rendition_dir, name))
+                except OSError as e:
+                    print(f"⚠️  Failed to delete {name}: {e}")
+
+    _write_index(download_dir, settings, mapping, native)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+storage_budget.py
+
+Storage budget for the local media mirror in downloads/.
+
+Without a budget, get_all.py mirrors the whole account. With one, mirrored
+images and videos are evicted (media file and its rendition / prepared video
+removed, manifest entry kept with `evicted = 1`) until downloads/ fits, and
+evicted items are fetched again as soon as they fit once more (budget raised,
+items deleted on the server). Images imported from USB that the server has
+not confirmed yet are never evicted, since they cannot be fetched again.
+
+Settings in config/setup.json (storage is unlimited unless one of the first
+two is set):
+- `storage_budget_mb`: maximum size of downloads/ in MB
+- `storage_reserve_mb`: free space to keep on the filesystem in MB (default
+  DEFAULT_RESERVE_MB); the budget shrinks when other data fills the card, so
+  downloads and logs keep working
+- `eviction_policy`: "lru" (default) evicts the items shown least recently
+  first; items never shown count as shown when they were downloaded. "oldest"
+  evicts the oldest downloads first.
+
+Last shown times are recorded by the backend (routes/media.js) in
+config/media_shown.json, keyed by the original URL of each item.
+
+Usage:
+    python storage_budget.py
+
+prints the bytes used per category of downloads/ and the active budget.
+
+Requirements:
+- Python 3.x
+"""
+
+import json
+import os
+
+import local_imports
+import renditions
+import videoprep
+from manifest import MANIFEST_FILE, Manifest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DOWNLOAD_DIR = os.path.join(BACKEND_DIR, "downloads")
+SHOWN_FILE = os.path.join(BACKEND_DIR, "config", "media_shown.json")
+POLICIES = ("lru", "oldest")
+DEFAULT_POLICY = "lru"
+DEFAULT_RESERVE_MB = 256
+MB = 1024 * 1024
+# Categories whose files can be evicted and fetched again
+EVICTABLE_CATEGORIES = ("images", "videos")
+
+
+def _megabytes(setup, key):
+    try:
+        value = float(setup.get(key) or 0)
+    except (TypeError, ValueError):
+        return 0
+    return int(value * MB) if value > 0 else 0
+
+
+def budget_settings(setup):
+    """
+    Read the storage settings.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        dict: budget (bytes or None), reserve (bytes) and policy, or None if
+        storage is unlimited.
+    """
+    budget = _megabytes(setup, "storage_budget_mb")
+    reserve = _megabytes(setup, "storage_reserve_mb")
+    if not budget and not reserve:
+        return None
+    policy = setup.get("eviction_policy", DEFAULT_POLICY)
+    return {
+        "budget": budget or None,
+        "reserve": reserve or DEFAULT_RESERVE_MB * MB,
+        "policy": policy if policy in POLICIES else DEFAULT_POLICY,
+    }
+
+
+def category_usage(download_dir):
+    """
+    Sum up the bytes used per top-level directory of downloads/.
+
+    Files directly in downloads/ and hidden directories (spool, held
+    deletions) are counted as "other".
+
+    Args:
+        download_dir (str): The media download directory.
+
+    Returns:
+        dict: Bytes per category.
+    """
+    usage = {}
+    try:
+        names = os.listdir(download_dir)
+    except FileNotFoundError:
+        return usage
+    for name in names:
+        path = os.path.join(download_dir, name)
+        category = name if os.path.isdir(path) and not name.startswith(".") else "other"
+        usage[category] = usage.get(category, 0) + _tree_size(path)
+    return usage
+
+
+def _tree_size(path):
+    if not os.path.isdir(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def effective_budget(settings, download_dir, used):
+    """
+    Return the number of bytes downloads/ may use right now.
+
+    Args:
+        settings (dict): Result of budget_settings().
+        download_dir (str): The media download directory.
+        used (int): Bytes currently used by downloads/.
+
+    Returns:
+        int: The configured budget, lowered if the filesystem has less than
+        the reserve left.
+    """
+    stat = os.statvfs(download_dir)
+    available = used + stat.f_bavail * stat.f_frsize - settings["reserve"]
+    if settings["budget"] is None:
+        return max(0, available)
+    return max(0, min(settings["budget"], available))
+
+
+def load_shown(path=SHOWN_FILE):
+    """
+    Load the last shown times recorded by the backend.
+
+    Returns:
+        dict: Milliseconds since the epoch keyed by original URL (empty if
+        unavailable).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            shown = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return shown if isinstance(shown, dict) else {}
+
+
+def entry_url(entry):
+    """
+    Return the original URL of a manifest entry, as listed in media-index.json.
+    """
+    return f"/downloads/{entry['category']}/{entry['filename']}"
+
+
+def evictable(entry):
+    """
+    Check whether a manifest entry may be evicted.
+
+    Args:
+        entry (dict): The manifest entry.
+
+    Returns:
+        bool: True for mirrored server images and videos not evicted yet.
+    """
+    return (
+        entry["category"] in EVICTABLE_CATEGORIES
+        and not entry["evicted"]
+        and not entry["id"].startswith(local_imports.LOCAL_ID_PREFIX)
+    )
+
+
+def derived_files(download_dir):
+    """
+    Map each mirrored file to the post-processing outputs made from it.
+
+    Args:
+        download_dir (str): The media download directory.
+
+    Returns:
+        dict: Paths of renditions / prepared videos and posters keyed by
+        "<category>/<filename>".
+    """
+    derived = {}
+    for filename, rendition in renditions.load_index(download_dir).get("images", {}).items():
+        derived[f"images/{filename}"] = [os.path.join(download_dir, rendition)]
+    for filename, prepared in videoprep.load_index(download_dir).get("videos", {}).items():
+        derived[f"videos/{filename}"] = [
+            os.path.join(download_dir, prepared[kind])
+            for kind in ("video", "poster") if prepared.get(kind)
+        ]
+    return derived
+
+
+def retention_order(entries, shown, policy):
+    """
+    Sort entries from the first to evict to the last.
+
+    Args:
+        entries (list): Manifest entries.
+        shown (dict): Result of load_shown().
+        policy (str): "lru" or "oldest".
+
+    Returns:
+        list: The entries, least valuable first.
+    """
+    def key(entry):
+        downloaded = (entry["mtime"] or 0) // 1_000_000
+        if policy == "oldest":
+            return downloaded
+        shown_at = shown.get(entry_url(entry))
+        return max(shown_at if isinstance(shown_at, (int, float)) else 0, downloaded)
+
+    return sorted(entries, key=key)
+
+
+def select_evictions(entries, shown, policy, excess, cost):
+    """
+    Pick the entries to evict to free at least `excess` bytes.
+
+    Args:
+        entries (list): Evictable manifest entries.
+        shown (dict): Result of load_shown().
+        policy (str): "lru" or "oldest".
+        excess (int): Bytes to free.
+        cost (callable): Returns the bytes an entry occupies on disk.
+
+    Returns:
+        list: Tuples of (entry, bytes freed), in eviction order.
+    """
+    victims = []
+    for entry in retention_order(entries, shown, policy):
+        if excess <= 0:
+            break
+        size = cost(entry)
+        if size:
+            victims.append((entry, size))
+            excess -= size
+    return victims
+
+
+def print_report(usage, budget=None, evicted=0):
+    """
+    Print the bytes used per category of downloads/.
+
+    Args:
+        usage (dict): Result of category_usage().
+        budget (int): The effective budget in bytes, if any.
+        evicted (int): Number of items currently evicted.
+    """
+    total = sum(usage.values())
+    parts = ", ".join(
+        f"{category} {size / MB:.1f} MB"
+        for category, size in sorted(usage.items(), key=lambda item: -item[1])
+    )
+    limit = f" of {budget / MB:.1f} MB budget" if budget is not None else ""
+    print(f"💾 Storage: {total / MB:.1f} MB used{limit} ({parts or 'empty'})")
+    if evicted:
+        print(f"💾 {evicted} item(s) evicted, fetched again once they fit.")
+
+
+def main():
+    """
+    Print the storage report for downloads/.
+    """
+    setup_file = os.path.join(BACKEND_DIR, "config", "setup.json")
+    try:
+        with open(setup_file, "r", encoding="utf-8") as f:
+            setup = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        setup = {}
+    settings = budget_settings(setup if isinstance(setup, dict) else {})
+
+    usage = category_usage(DOWNLOAD_DIR)
+    budget = None
+    if settings is not None and os.path.isdir(DOWNLOAD_DIR):
+        budget = effective_budget(settings, DOWNLOAD_DIR, sum(usage.values()))
+
+    evicted = 0
+    if os.path.exists(MANIFEST_FILE):
+        manifest = Manifest()
+        try:
+            evicted = sum(1 for entry in manifest.entries().values() if entry["evicted"])
+        finally:
+            manifest.close()
+    print_report(usage, budget, evicted)
+
+
+if __name__ == "__main__":
+    main()
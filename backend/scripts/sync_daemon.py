@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+sync_daemon.py
+
+Long-running sync service for the media mirror. Instead of spawning a fresh
+`get_all.py` process every `sync_interval` seconds, the Node backend starts this
+script once. It keeps the HTTP session and the OAuth2 token warm between
+cycles and runs the same sync logic as `get_all.py` on its own schedule.
+
+Features:
+- Runs a sync cycle at startup and then every `sync_interval` seconds
+  (re-read from config/setup.json before each wait, default 300).
+- Reuses the keep-alive session of api_client.py across cycles.
+- Reuses the shared token cache (token_cache.py), so a new access token is
+  only requested shortly before expiry or after a 401.
+- Listens on a local Unix socket for commands, one per line:
+    sync  → start a cycle now (coalesced if one is already pending)
+    ping  → liveness check
+  Every command is answered with a single "ok" or "error ..." line.
+- Only one daemon runs at a time (flock on sync.sock.lock); a second one
+  exits right away instead of taking over the socket. Cycles of the daemon
+  and of get_all.py / `threepics sync` never overlap (config/sync.lock, see
+  get_all.run_sync()).
+
+Usage:
+    python sync_daemon.py
+
+Requirements:
+- Python 3.x
+- requests library
+- OAuth2 credentials in config/credentials.json
+"""
+
+import fcntl
+import os
+import socketserver
+import sys
+import threading
+import traceback
+
+import api_client
+import get_all
+import requests
+import token_cache
+
+SOCKET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sync.sock")
+# Held by the running daemon for its whole lifetime
+INSTANCE_LOCK_FILE = SOCKET_PATH + ".lock"
+DEFAULT_SYNC_INTERVAL = 300
+# Wait before retrying when credentials are missing, the API is unreachable or
+# a cycle was aborted by an error
+RETRY_DELAY = 60
+
+_wakeup = threading.Event()
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Handle line-based commands received over the Unix socket.
+    """
+
+    def handle(self):
+        for raw in self.rfile:
+            command = raw.decode("utf-8", errors="replace").strip().lower()
+            if command == "sync":
+                _wakeup.set()
+                self.wfile.write(b"ok\n")
+            elif command == "ping":
+                self.wfile.write(b"ok\n")
+            elif command:
+                self.wfile.write(f"error unknown command: {command}\n".encode("utf-8"))
+
+
+def get_sync_interval():
+    """
+    Read the sync interval from config/setup.json.
+
+    Returns:
+        int: The interval in seconds (at least 10).
+    """
+    try:
+        interval = int(get_all.load_setup().get("sync_interval", DEFAULT_SYNC_INTERVAL))
+    except (TypeError, ValueError):
+        interval = DEFAULT_SYNC_INTERVAL
+    return max(10, interval)
+
+
+def run_cycle():
+    """
+    Run one sync cycle, retrying once with a fresh token on HTTP 401.
+    Errors are logged, never raised.
+
+    Returns:
+        bool: True if the cycle ran to the end, also if single items failed
+        (they are retried on the regular schedule); False if it was aborted
+        by an error.
+    """
+    try:
+        client_id, client_secret = get_all.load_credentials()
+        token_cache.call_with_token(
+            client_id, client_secret, get_all.run_sync,
+            token_url=get_all.OAUTH2_TOKEN_URL, session=api_client.SESSION,
+        )
+        return True
+    except requests.exceptions.RequestException as e:
+        print(f"❌ API request failed: {e}")
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+    except Exception as e:
+        # Keep the daemon alive (disk or database error, token lock not
+        # accessible); the cycle is retried after RETRY_DELAY
+        print(f"❌ Sync cycle failed: {e!r}")
+        traceback.print_exc()
+    return False
+
+
+def acquire_instance_lock(path):
+    """
+    Take the single-instance lock of the daemon.
+
+    Args:
+        path (str): Filesystem path of the lock file.
+
+    Returns:
+        int: The locked file descriptor (kept open until exit), or None if
+        another daemon holds the lock.
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def start_socket_server(path):
+    """
+    Bind the command socket and serve it in a background thread. A socket
+    file left at path belongs to a daemon that is gone (the caller holds the
+    instance lock) and is replaced.
+
+    Args:
+        path (str): Filesystem path of the Unix socket.
+
+    Returns:
+        socketserver.ThreadingUnixStreamServer: The running server.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    server = socketserver.ThreadingUnixStreamServer(path, CommandHandler)
+    server.daemon_threads = True
+    os.chmod(path, 0o660)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"🔌 Listening for sync triggers on {path}")
+    return server
+
+
+def remove_socket(path, inode):
+    """
+    Delete the command socket, unless it was replaced by another daemon.
+
+    Args:
+        path (str): Filesystem path of the Unix socket.
+        inode (int): Inode of the socket this process bound.
+    """
+    try:
+        if os.stat(path).st_ino == inode:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    """
+    Main entry point: start the command socket and run sync cycles forever.
+    """
+    lock_fd = acquire_instance_lock(INSTANCE_LOCK_FILE)
+    if lock_fd is None:
+        print("❌ Another sync daemon is already running.")
+        sys.exit(1)
+    server = start_socket_server(SOCKET_PATH)
+    socket_inode = os.stat(SOCKET_PATH).st_ino
+
+    try:
+        while True:
+            _wakeup.clear()
+            print("🔄 Starting sync cycle...")
+            ok = run_cycle()
+            delay = get_sync_interval() if ok else min(RETRY_DELAY, get_sync_interval())
+            print(f"⏱  Next sync in {delay}s (or on trigger).")
+            _wakeup.wait(timeout=delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        remove_socket(SOCKET_PATH, socket_inode)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
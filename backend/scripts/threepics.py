@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+threepics.py
+
+Single command-line entry point for the backend scripts.
+
+Commands:
+    sync      Mirror the media library into downloads/ (get_all.py)
+    setup     Fetch config/setup.json (get_setup.py, accepts --watch)
+    upload    Upload the files in uploads/ (put_files.py)
+    register  Register this device (register_device.py)
+    delete    Mark files for deletion (mark_to_delete.py, filenames or "-")
+    storage   Show the bytes used per category of downloads/ (storage_budget.py)
+
+Only argparse is imported up front; the module behind a command (and with it
+requests, sqlite3, ...) is imported when that command runs, so `--help` and
+typos answer immediately even on a cold Raspberry Pi. The working directory
+is switched to the backend directory first, because the scripts resolve
+config/ relative to it.
+
+Usage:
+    python threepics.py <command> [args...]
+
+Example:
+    python threepics.py delete my_image.jpg other.jpg
+
+Requirements:
+- Python 3.x
+- The packages in requirements.txt (never installed at runtime)
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Command → (module with a main() function, help text)
+COMMANDS = {
+    "sync": ("get_all", "mirror the media library into downloads/"),
+    "setup": ("get_setup", "fetch config/setup.json (--watch to long-poll)"),
+    "upload": ("put_files", "upload the files in uploads/"),
+    "register": ("register_device", "register this device"),
+    "delete": ("mark_to_delete", "mark files for deletion (filenames or - for stdin)"),
+    "storage": ("storage_budget", "show the bytes used per category of downloads/"),
+}
+
+
+def build_parser():
+    """
+    Build the argument parser; command arguments are passed on unparsed.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog="threepics", description="threepics backend commands")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def run(command, args):
+    """
+    Import the module behind a command and run its main().
+
+    The module sees the command arguments in sys.argv, as if it had been
+    started directly.
+
+    Args:
+        command (str): Key of COMMANDS.
+        args (list): Remaining command line arguments.
+    """
+    module_name = COMMANDS[command][0]
+    os.chdir(BACKEND_DIR)
+    sys.argv = [f"{module_name}.py", *args]
+    importlib.import_module(module_name).main()
+
+
+def main():
+    """
+    Main entry point: parse the command and dispatch to its script.
+    """
+    args, rest = build_parser().parse_known_args()
+    run(args.command, rest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+token_cache.py
+
+Shared on-disk cache for OAuth2 access tokens used by all backend scripts.
+
+Instead of requesting a new token on every run, scripts call `get_token()`,
+which returns the cached token from config/token_cache.json as long as it is
+valid for at least EXPIRY_MARGIN more seconds. Tokens are stored per
+client_id and scope together with their absolute expiry time.
+
+Features:
+- Cross-process safety via an exclusive fcntl lock (config/token_cache.lock),
+  so concurrent scripts never request tokens in parallel.
+- Atomic cache writes (temp file + os.replace) with 0600 permissions.
+- Lock and cache files written by root (put_files.py started from the udev
+  USB import) are given to the owner of config/, so scripts running as that
+  user can still open them.
+- `call_with_token()` retries an API call once with a fresh token if the
+  server answers 401, e.g. after the token was revoked early.
+
+Usage:
+    import token_cache
+    token = token_cache.get_token(client_id, client_secret)
+
+Requirements:
+- Python 3.x (POSIX, uses fcntl)
+- requests library
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import requests
+
+import api_client
+
+OAUTH2_TOKEN_URL = api_client.OAUTH2_TOKEN_URL
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config")
+CACHE_FILE = os.path.join(CONFIG_DIR, "token_cache.json")
+LOCK_FILE = os.path.join(CONFIG_DIR, "token_cache.lock")
+
+# Refresh tokens this many seconds before they actually expire
+EXPIRY_MARGIN = 60
+# Lifetime assumed when the token response does not contain expires_in
+DEFAULT_EXPIRES_IN = 300
+
+
+def _match_owner(fd):
+    """
+    Give a file opened by root to the owner of the config directory, so the
+    backend user can open it later (see local_imports._match_owner()).
+    """
+    if os.geteuid() != 0:
+        return
+    stat = os.stat(CONFIG_DIR)
+    os.fchown(fd, stat.st_uid, stat.st_gid)
+
+
+@contextmanager
+def _locked():
+    """
+    Hold an exclusive lock on the token cache for the duration of the block.
+    """
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        # Also repairs a lock file left owned by root by an older version
+        _match_owner(fd)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _cache_key(client_id, scope):
+    return f"{client_id} {scope}"
+
+
+def _read_cache():
+    """
+    Read the token cache from disk.
+
+    Returns:
+        dict: Cached entries keyed by client_id and scope (empty if unreadable).
+    """
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_cache(data):
+    """
+    Atomically write the token cache with owner-only permissions.
+
+    Args:
+        data (dict): Cache entries to persist.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=CONFIG_DIR, prefix=".token_cache.")
+    try:
+        os.fchmod(fd, 0o600)
+        _match_owner(fd)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, CACHE_FILE)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def fetch_token(client_id, client_secret, scope, token_url=OAUTH2_TOKEN_URL, session=None):
+    """
+    Request a new access token using the client credentials flow.
+
+    Args:
+        client_id (str): OAuth2 client ID.
+        client_secret (str): OAuth2 client secret.
+        scope (str): Requested scope, e.g. "read write".
+        token_url (str): OAuth2 token endpoint.
+        session (requests.Session): Optional session to send the request with.
+
+    Returns:
+        tuple: (access_token, expires_in)
+
+    Raises:
+        requests.exceptions.HTTPError: If the token request fails.
+        ValueError: If the response contains no access_token.
+    """
+    data = {
+        'grant_type': 'client_credentials',
+        'client_id': client_id,
+        'client_secret': client_secret,
+        'scope': scope,
+    }
+    # Requesting a token is safe to repeat, so transient failures are retried
+    response = api_client.post(token_url, data=data, session=session,
+                               retries=api_client.MAX_RETRIES)
+    response.raise_for_status()
+    payload = response.json()
+
+    access_token = payload.get("access_token")
+    if not access_token:
+        raise ValueError("No access_token received from the OAuth2 response.")
+
+    try:
+        expires_in = int(payload.get("expires_in", DEFAULT_EXPIRES_IN))
+    except (TypeError, ValueError):
+        expires_in = DEFAULT_EXPIRES_IN
+    return access_token, expires_in
+
+
+def get_token(client_id, client_secret, scope="read write", token_url=OAUTH2_TOKEN_URL,
+              session=None, rejected_token=None):
+    """
+    Return a cached access token, requesting a new one if needed.
+
+    Args:
+        client_id (str): OAuth2 client ID.
+        client_secret (str): OAuth2 client secret.
+        scope (str): Requested scope.
+        token_url (str): OAuth2 token endpoint.
+        session (requests.Session): Optional session to send the request with.
+        rejected_token (str): A token the API just rejected. If it is still the
+            cached one, it is replaced even though it has not expired yet.
+
+    Returns:
+        str: A valid access token.
+
+    Raises:
+        requests.exceptions.HTTPError: If the token request fails.
+        ValueError: If the response contains no access_token.
+    """
+    key = _cache_key(client_id, scope)
+
+    with _locked():
+        cache = _read_cache()
+        entry = cache.get(key) or {}
+        token = entry.get("access_token")
+        expires_at = entry.get("expires_at", 0)
+
+        if token and token != rejected_token and expires_at - EXPIRY_MARGIN > time.time():
+            return token
+
+        token, expires_in = fetch_token(client_id, client_secret, scope, token_url, session)
+        cache[key] = {"access_token": token, "expires_at": time.time() + expires_in}
+        _write_cache(cache)
+        return token
+
+
+def invalidate(client_id, scope="read write"):
+    """
+    Remove the cached token for the given client and scope.
+
+    Args:
+        client_id (str): OAuth2 client ID.
+        scope (str): Scope of the cached token.
+    """
+    with _locked():
+        cache = _read_cache()
+        if cache.pop(_cache_key(client_id, scope), None) is not None:
+            _write_cache(cache)
+
+
+def is_unauthorized(error):
+    """
+    Check whether a requests exception represents an HTTP 401 response.
+
+    Args:
+        error (Exception): The exception to inspect.
+
+    Returns:
+        bool: True for a 401 HTTPError.
+    """
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.exceptions.HTTPError) and \
+        response is not None and response.status_code == 401
+
+
+def call_with_token(client_id, client_secret, func, scope="read write",
+                    token_url=OAUTH2_TOKEN_URL, session=None):
+    """
+    Call func(token) with a cached token and retry once with a fresh token on 401.
+
+    Args:
+        client_id (str): OAuth2 client ID.
+        client_secret (str): OAuth2 client secret.
+        func (callable): Function taking the access token as only argument.
+        scope (str): Requested scope.
+        token_url (str): OAuth2 token endpoint.
+        session (requests.Session): Optional session for token requests.
+
+    Returns:
+        Any: The return value of func.
+
+    Raises:
+        requests.exceptions.RequestException: If the call still fails.
+    """
+    token = get_token(client_id, client_secret, scope, token_url, session)
+    try:
+        return func(token)
+    except requests.exceptions.HTTPError as e:
+        if not is_unauthorized(e):
+            raise
+    token = get_token(client_id, client_secret, scope, token_url, session, rejected_token=token)
+    return func(token)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+upload_ledger.py
+
+SQLite-backed ledger of the content this device has imported and uploaded.
+
+Every file copied from a USB stick is registered as "pending" (with its path
+in the upload directory), and every file uploaded by `put_files.py` as
+"uploaded", keyed by the SHA-256 of its content. `threepics_usbcopy.py` skips
+sources whose content is already known before copying a byte, and
+`put_files.py` skips known content before sending it, so plugging in the same
+stick twice neither fills the SD card nor the account with duplicates.
+
+Files whose size does not occur in the ledger cannot be duplicates, so they
+are hashed while they are copied instead of in a separate pass.
+
+Database location:
+    config/upload_ledger.db
+
+Requirements:
+- Python 3.x (sqlite3 from the standard library)
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+LEDGER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "upload_ledger.db")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    content_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    path TEXT,
+    filename TEXT,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS content_size ON content (size);
+CREATE INDEX IF NOT EXISTS content_path ON content (path);
+"""
+
+PENDING = "pending"
+UPLOADED = "uploaded"
+
+
+def file_sha256(path):
+    """
+    Compute the SHA-256 of a file.
+
+    Args:
+        path (str): The file to hash.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_with_sha256(src, dest):
+    """
+    Copy a file (with its timestamps) and hash it in the same pass.
+
+    Args:
+        src (str): The source file.
+        dest (str): The target path.
+
+    Returns:
+        str: The hex digest of the copied content.
+    """
+    digest = hashlib.sha256()
+    with open(src, "rb") as fin, open(dest, "wb") as fout:
+        for chunk in iter(lambda: fin.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            fout.write(chunk)
+    shutil.copystat(src, dest)
+    return digest.hexdigest()
+
+
+class Ledger:
+    """
+    Thread-safe wrapper around the upload ledger database.
+
+    Args:
+        path (str): Path of the SQLite database file.
+    """
+
+    def __init__(self, path=LEDGER_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def has_size(self, size):
+        """
+        Check whether any known content has the given size.
+
+        Args:
+            size (int): File size in bytes.
+
+        Returns:
+            bool: False if a file of this size cannot be a duplicate.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM content WHERE size = ? LIMIT 1", (size,)
+            ).fetchone()
+        return row is not None
+
+    def is_known(self, content_hash):
+        """
+        Check whether content was already uploaded or is waiting for upload.
+
+        Pending entries only count while their copy still exists in the
+        upload directory.
+
+        Args:
+            content_hash (str): SHA-256 hex digest.
+
+        Returns:
+            bool: True if the content does not need to be imported again.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, path FROM content WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if row is None:
+            return False
+        return row["status"] == UPLOADED or bool(row["path"] and os.path.exists(row["path"]))
+
+    def is_uploaded(self, content_hash):
+        """
+        Check whether content was already uploaded from this device.
+
+        Args:
+            content_hash (str): SHA-256 hex digest.
+
+        Returns:
+            bool: True if it was uploaded before.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM content WHERE content_hash = ? AND status = ?",
+                (content_hash, UPLOADED),
+            ).fetchone()
+        return row is not None
+
+    def pending_hash(self, path, size):
+        """
+        Return the hash recorded when a file was copied into the upload
+        directory, so it does not have to be hashed again.
+
+        Args:
+            path (str): Path of the file in the upload directory.
+            size (int): Its current size.
+
+        Returns:
+            str: The hex digest, or None if unknown or the size changed.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM content WHERE path = ? AND size = ? AND status = ?",
+                (path, size, PENDING),
+            ).fetchone()
+        return row["content_hash"] if row else None
+
+    def add_pending(self, content_hash, size, path):
+        """
+        Register content copied into the upload directory.
+
+        Args:
+            content_hash (str): SHA-256 hex digest.
+            size (int): File size in bytes.
+            path (str): Path of the copy.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO content (content_hash, size, status, path, filename, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, size, PENDING, path, os.path.basename(path), int(time.time())),
+            )
+            self._conn.execute(
+                "UPDATE content SET path = ?, updated_at = ? WHERE content_hash = ? AND status = ?",
+                (path, int(time.time()), content_hash, PENDING),
+            )
+            self._conn.commit()
+
+    def mark_uploaded(self, content_hash, size, filename):
+        """
+        Record content as uploaded.
+
+        Args:
+            content_hash (str): SHA-256 hex digest.
+            size (int): File size in bytes.
+            filename (str): Name the file was uploaded under.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO content (content_hash, size, status, path, filename, updated_at) "
+                "VALUES (?, ?, ?, NULL, ?, ?)",
+                (content_hash, size, UPLOADED, filename, int(time.time())),
+            )
+            self._conn.commit()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+videoprep.py
+
+Optional post-download stage that prepares mirrored videos for smooth
+playback on the frame.
+
+Features:
+- Remuxes clips whose `moov` atom sits behind the media data to "faststart",
+  so playback can begin without reading the whole file from the SD card.
+- Optionally (`"video_transcode": true`) transcodes clips that exceed the
+  panel resolution or are not H.264/yuv420p down to a hardware-decodable
+  H.264 High profile stream at panel size.
+- Extracts a poster JPEG for every clip.
+- Runs as its own low-priority process, started by get_all.py after a sync
+  cycle, so long transcodes delay neither the media index nor the next
+  cycle; it rewrites downloads/media-index.json when it is done.
+- Runs one ffmpeg job at a time at low CPU and I/O priority; a lock file
+  keeps concurrent jobs from preparing in parallel.
+- Caches results under downloads/videoprep/ keyed by the SHA-256 of the source
+  and the settings, so each clip is processed only once. Clips that ffprobe or
+  ffmpeg cannot handle are recorded as failed under the same key and shown
+  as they are, instead of being retried by every job.
+- Writes downloads/videoprep/index.json, which maps original filenames to the
+  prepared clip and poster; routes/media.js serves them from that map.
+
+Enable with `"video_prep": true` in config/setup.json. Requires the ffmpeg and
+ffprobe binaries; if they are missing the stage is skipped.
+
+Usage (from backend/, like get_all.py):
+    python scripts/videoprep.py
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import struct
+import subprocess
+
+from renditions import display_size
+
+PREP_SUBDIR = "videoprep"
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = ".lock"
+INDEX_VERSION = 1
+NICENESS = 15
+POSTER_OFFSET = "00:00:01"
+FFMPEG_TIMEOUT = 60 * 60
+# Encoder settings for the optional transcode (decodable by the Pi's H.264 block)
+X264_OPTIONS = ["-c:v", "libx264", "-profile:v", "high", "-level", "4.1",
+                "-pix_fmt", "yuv420p", "-preset", "veryfast", "-crf", "23"]
+
+# The sync daemon checks the settings every cycle; warn about ffmpeg only once
+_warned_missing = False
+
+
+def prep_settings(setup):
+    """
+    Read the video preparation settings from setup.json.
+
+    Args:
+        setup (dict): The setup configuration.
+
+    Returns:
+        dict: transcode flag and target size, or None if the stage is disabled
+        or ffmpeg is unavailable.
+    """
+    if not setup.get("video_prep"):
+        return None
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        global _warned_missing
+        if not _warned_missing:
+            print("⚠️  video_prep is enabled but ffmpeg/ffprobe are not installed, skipping.")
+            _warned_missing = True
+        return None
+
+    width, height = display_size(setup)
+    return {
+        "transcode": bool(setup.get("video_transcode")),
+        "width": width,
+        "height": height,
+    }
+
+
+def load_index(download_dir):
+    """
+    Load the video preparation index.
+
+    Args:
+        download_dir (str): The media download directory.
+
+    Returns:
+        dict: The index, or an empty dict if missing or invalid.
+    """
+    path = os.path.join(download_dir, PREP_SUBDIR, INDEX_FILENAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def is_current(download_dir, settings):
+    """
+    Check whether the index was built with the given settings.
+
+    Args:
+        download_dir (str): The media download directory.
+        settings (dict): Result of prep_settings(), or None if disabled.
+
+    Returns:
+        bool: True if no rebuild is needed.
+    """
+    index = load_index(download_dir)
+    if settings is None:
+        return not index.get("videos")
+    return index.get("version") == INDEX_VERSION and index.get("settings") == settings
+
+
+def _write_index(download_dir, settings, videos):
+    path = os.path.join(download_dir, PREP_SUBDIR, INDEX_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "settings": settings, "videos": videos},
+                  f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def is_faststart(path):
+    """
+    Check whether the moov atom of an MP4/MOV file precedes its media data.
+
+    Args:
+        path (str): The video file.
+
+    Returns:
+        bool: True if moov comes first (or no mdat was found).
+    """
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return True
+            size, kind = struct.unpack(">I4s", header)
+            header_len = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                header_len = 16
+            if kind == b"moov":
+                return True
+            if kind == b"mdat":
+                return False
+            if size == 0 or size < header_len:
+                # Atom extends to the end of the file (or is malformed)
+                return True
+            f.seek(size - header_len, os.SEEK_CUR)
+
+
+def _low_priority():
+    os.nice(NICENESS)
+
+
+def _run(command):
+    """
+    Run an ffmpeg/ffprobe command at low CPU and I/O priority.
+
+    Args:
+        command (list): The command line.
+
+    Returns:
+        subprocess.CompletedProcess: The finished process.
+
+    Raises:
+        subprocess.CalledProcessError: If the command fails.
+    """
+    if shutil.which("ionice"):
+        command = ["ionice", "-c", "3"] + command
+    return subprocess.run(command, check=True, capture_output=True, text=True,
+                          timeout=FFMPEG_TIMEOUT, preexec_fn=_low_priority)
+
+
+def probe_video(path):
+    """
+    Read codec, pixel format and size of the first video stream.
+
+    Args:
+        path (str): The video file.
+
+    Returns:
+        dict: Stream information from ffprobe (codec_name, pix_fmt, width, height).
+    """
+    result = _run([
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,pix_fmt,width,height", "-of", "json", path,
+    ])
+    streams = json.loads(result.stdout).get("streams") or [{}]
+    return streams[0]
+
+
+def video_dimensions(path):
+    """
+    Read the frame size of a video.
+
+    Args:
+        path (str): The video file.
+
+    Returns:
+        tuple: (width, height), or None if ffprobe is unavailable or fails.
+    """
+    if not shutil.which("ffprobe"):
+        return None
+    try:
+        stream = probe_video(path)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+    if not stream.get("width") or not stream.get("height"):
+        return None
+    return stream["width"], stream["height"]
+
+
+def needs_transcode(stream, settings):
+    """
+    Decide whether a clip has to be transcoded for the panel.
+
+    Args:
+        stream (dict): Result of probe_video().
+        settings (dict): Result of prep_settings().
+
+    Returns:
+        bool: True if transcoding is enabled and the clip is too large or not
+        H.264/yuv420p.
+    """
+    if not settings["transcode"]:
+        return False
+    return (
+        stream.get("codec_name") != "h264"
+        or stream.get("pix_fmt") != "yuv420p"
+        or (stream.get("width") or 0) > settings["width"]
+        or (stream.get("height") or 0) > settings["height"]
+    )
+
+
+def prepare_video(src, dest_base, settings):
+    """
+    Create the faststart/transcoded clip (if needed) and the poster frame.
+
+    Args:
+        src (str): Path of the original video.
+        dest_base (str): Output path without extension.
+        settings (dict): Result of prep_settings().
+
+    Returns:
+        dict: Paths of the prepared 'video' (None if the original plays
+        fine as-is) and the 'poster' (None if extraction failed).
+    """
+    width, height = settings["width"], settings["height"]
+    scale = f"scale='min({width},iw)':'min({height},ih)':force_original_aspect_ratio=decrease"
+    result = {"video": None, "poster": None}
+
+    stream = probe_video(src)
+    video_path = dest_base + ".mp4"
+    tmp_path = dest_base + ".part.mp4"
+
+    if needs_transcode(stream, settings):
+        print(f"🎞️  Transcoding {os.path.basename(src)}...")
+        _run(["ffmpeg", "-y", "-v", "error", "-i", src, "-map", "0:v:0", "-map", "0:a?",
+              "-vf", scale + ",scale=trunc(iw/2)*2:trunc(ih/2)*2", *X264_OPTIONS,
+              "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", tmp_path])
+        os.replace(tmp_path, video_path)
+        result["video"] = video_path
+    elif not is_faststart(src):
+        print(f"🎞️  Remuxing {os.path.basename(src)} to faststart...")
+        _run(["ffmpeg", "-y", "-v", "error", "-i", src, "-map", "0", "-c", "copy",
+              "-movflags", "+faststart", tmp_path])
+        os.replace(tmp_path, video_path)
+        result["video"] = video_path
+
+    poster_path = dest_base + ".jpg"
+    for offset in (POSTER_OFFSET, "0"):
+        try:
+            _run(["ffmpeg", "-y", "-v", "error", "-ss", offset, "-i", src,
+                  "-frames:v", "1", "-vf", scale, "-q:v", "3", poster_path])
+        except subprocess.CalledProcessError:
+            continue
+        if os.path.exists(poster_path):
+            result["poster"] = poster_path
+            break
+
+    return result
+
+
+def update_videos(download_dir, videos, settings):
+    """
+    Bring the prepared-video cache and index in line with the mirrored clips.
+
+    Args:
+        download_dir (str): The media download directory.
+        videos (list): Tuples of (filename in videos/, SHA-256 of the file).
+        settings (dict): Result of prep_settings(), or None if disabled.
+
+    Returns:
+        bool: False if there was nothing to do or another job holds the lock.
+    """
+    prep_dir = os.path.join(download_dir, PREP_SUBDIR)
+    if settings is None and not os.path.isdir(prep_dir):
+        return False
+    os.makedirs(prep_dir, exist_ok=True)
+
+    lock_fd = os.open(os.path.join(prep_dir, LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("ℹ️  Video preparation already running elsewhere, skipping.")
+            return False
+
+        index = load_index(download_dir)
+        previous = index.get("videos", {}) if index.get("settings") == settings else {}
+        mapping = {}
+        keep = {INDEX_FILENAME, LOCK_FILENAME}
+
+        if settings is not None:
+            tag = f"{settings['width']}x{settings['height']}{'t' if settings['transcode'] else ''}"
+            for filename, content_hash in videos:
+                base = f"{content_hash[:32]}_{tag}"
+                cached = previous.get(filename)
+                if cached and cached.get("key") == base:
+                    entry = cached
+                else:
+                    try:
+                        paths = prepare_video(os.path.join(download_dir, "videos", filename),
+                                              os.path.join(prep_dir, base), settings)
+                    except (OSError, ValueError, subprocess.SubprocessError) as e:
+                        print(f"⚠️  Could not prepare {filename}: {e}")
+                        # Retried only once the clip or the settings change
+                        paths = {"video": None, "poster": None}
+                        entry = {"key": base, "failed": True}
+                    else:
+                        entry = {"key": base}
+                    for kind, path in paths.items():
+                        entry[kind] = f"{PREP_SUBDIR}/{os.path.basename(path)}" if path else None
+
+                mapping[filename] = entry
+                for kind in ("video", "poster"):
+                    if entry.get(kind):
+                        keep.add(os.path.basename(entry[kind]))
+
+        # Drop outputs of removed clips and of previous settings
+        for name in os.listdir(prep_dir):
+            if name not in keep:
+                try:
+                    os.remove(os.path.join(prep_dir, name))
+                except OSError as e:
+                    print(f"⚠️  Failed to delete {name}: {e}")
+
+        _write_index(download_dir, settings, mapping)
+        return True
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
+def main():
+    """
+    Prepare the mirrored videos and rewrite the media index with the results.
+    """
+    # get_all imports this module, so it is only imported when run as a job
+    import get_all
+    from manifest import Manifest
+
+    _low_priority()
+    setup = get_all.load_setup()
+    manifest = Manifest()
+    try:
+        settings = prep_settings(setup)
+        videos = get_all.mirrored_files(manifest, "videos") if settings is not None else []
+        if update_videos(get_all.DOWNLOAD_DIR, videos, settings):
+            get_all.write_media_index(manifest, get_all.load_media_state().get("items"))
+    finally:
+        manifest.close()
+
+
+if __name__ == "__main__":
+    main()
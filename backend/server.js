@@ -24,7 +24,7 @@ await import('./watchers/credentials.js');
 import express from 'express';
 import cors from 'cors';
 
-import mediaRouter from './routes/media.js';
+import mediaRouter, { recordShown } from './routes/media.js';
 import { startCronJob } from './jobs/cronjob.js';
 import wifiRouter from './routes/wifi.js';
 import credentialsRouter from './routes/credentials.js';
@@ -37,6 +37,7 @@ import brightnessRouter from './routes/brightness.js';
 
 
 import { startWatcher } from './watchers/watch-downloads.js';
+import { startSetupWatcher } from './watchers/watch-setup.js';
 import os from 'os';
 import crypto from 'crypto';
 
@@ -53,6 +54,7 @@ if (!fs.existsSync(devicePath)) {
 
 const downloadsPath = path.resolve(__dirname, 'downloads');
 startWatcher(downloadsPath);
+startSetupWatcher(configDir);
 
 const app = express();
 const PORT = 3000;
@@ -72,7 +74,7 @@ app.use('/api', rebootRoute);
 app.use('/api/system', brightnessRouter);
 
 // Statischer Pfad korrekt mounten
-app.use('/downloads', express.static(path.resolve(__dirname, 'downloads')));
+app.use('/downloads', recordShown, express.static(path.resolve(__dirname, 'downloads')));
 
 // Cronjob starten
 startCronJob();
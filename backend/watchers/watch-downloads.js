@@ -9,12 +9,25 @@ wss.on('connection', (ws) => {
   console.log('🟢 Frontend verbunden via WebSocket.');
 });
 
+// Nachricht an alle verbundenen Frontends senden
+export function notifyClients(message) {
+  wss.clients.forEach((client) => {
+    if (client.readyState === 1) {
+      client.send(JSON.stringify(message));
+    }
+  });
+}
+
 // Funktion zum Starten des Watchers
 export function startWatcher(downloadsPath) {
   const watcher = chokidar.watch(downloadsPath, {
     ignoreInitial: true,
     persistent: true,
     depth: 3,
+    // Unfertige Downloads erst nach dem atomaren Umbenennen melden,
+    // zum Löschen zurückgestellte Dateien (mark_to_delete.py) gar nicht
+    ignored: (filepath) => filepath.endsWith('.part') || filepath.endsWith('.tmp')
+      || filepath.split(path.sep).includes('.deleting'),
   });
 
   watcher.on('add', (filepath) => { 
@@ -26,6 +39,17 @@ export function startWatcher(downloadsPath) {
     });
   });
 
+  // get_all.py hat den Medienindex neu geschrieben
+  watcher.on('change', (filepath) => {
+    if (path.basename(filepath) !== 'media-index.json') return;
+    console.log('📇 Medienindex aktualisiert');
+    wss.clients.forEach((client) => {
+      if (client.readyState === 1) {
+        client.send(JSON.stringify({ type: 'media-updated', path: filepath }));
+      }
+    });
+  });
+
   watcher.on('unlink', (filepath) => {
     console.log('❌ Datei gelöscht:', filepath);
     wss.clients.forEach((client) => {
@@ -0,0 +1,18 @@
+import fs from 'fs';
+import { notifyClients } from './watch-downloads.js';
+
+// get_setup.py ersetzt setup.json atomar und nur bei echten Änderungen,
+// daher das Verzeichnis beobachten (die alte Datei-Inode verschwindet)
+export function startSetupWatcher(configDir) {
+  let timer = null;
+
+  fs.watch(configDir, { persistent: true }, (eventType, filename) => {
+    if (filename !== 'setup.json') return;
+    // Mehrere Ereignisse pro Umbenennung zusammenfassen
+    clearTimeout(timer);
+    timer = setTimeout(() => {
+      console.log('⚙️ setup.json aktualisiert');
+      notifyClients({ type: 'setup-updated' });
+    }, 200);
+  });
+}
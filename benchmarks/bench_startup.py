@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py
+
+Startup-time check for the `threepics` CLI (backend/scripts/threepics.py).
+
+Every target is started in a fresh interpreter with `python -X importtime`,
+and the import time reported by the interpreter is summed up (median of
+--runs starts):
+
+- cli:      `threepics.py --help`, which must not import any of the heavy
+            modules in FORBIDDEN_AT_STARTUP (checked on every run)
+- <command>: importing the module behind each command (what the command pays
+            before it does any work)
+
+The medians are compared with benchmarks/startup_baseline.json. A target that
+got slower than baseline * (1 + --tolerance) + SLACK_MS fails the run (exit
+status 1). Without a baseline, or with --update, the current numbers are
+written as the new baseline; record it on the device the numbers matter for
+(the file is ignored by git, since it only holds for one machine).
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 7] [--tolerance 0.25] [--update]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "scripts")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+# Absolute slack in ms, so tiny targets do not fail on timer noise
+SLACK_MS = 5.0
+FORBIDDEN_AT_STARTUP = ("requests", "urllib3", "PIL", "sqlite3", "api_client", "token_cache")
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import threepics  # noqa: E402
+
+
+def targets():
+    """
+    Return the command line of every measured target.
+    """
+    result = {"cli": ["threepics.py", "--help"]}
+    for command, (module, _) in threepics.COMMANDS.items():
+        result[command] = ["-c", f"import {module}"]
+    return result
+
+
+def import_profile(args):
+    """
+    Start a fresh interpreter and read its -X importtime report.
+
+    Args:
+        args (list): Arguments after `python -X importtime`.
+
+    Returns:
+        tuple: (total import time in ms, set of imported module names)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True,
+    )
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # Top-level entries (no indentation) contain their nested imports
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def measure(runs):
+    """
+    Measure every target.
+
+    Returns:
+        tuple: (median ms per target, heavy modules imported by the cli target)
+    """
+    medians = {}
+    leaked = set()
+    for name, args in targets().items():
+        samples = []
+        for _ in range(runs):
+            total_ms, modules = import_profile(args)
+            samples.append(total_ms)
+            if name == "cli":
+                leaked |= {m for m in modules if m.split(".")[0] in FORBIDDEN_AT_STARTUP}
+        medians[name] = statistics.median(samples)
+    return medians, leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=7, help="interpreter starts per target")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown against the baseline")
+    parser.add_argument("--update", action="store_true", help="write the results as new baseline")
+    args = parser.parse_args()
+
+    medians, leaked = measure(args.runs)
+    try:
+        with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        baseline = {}
+
+    failed = False
+    print(f"{'target':<10} {'import ms':>10} {'baseline':>10}")
+    for name, ms in medians.items():
+        base = baseline.get(name)
+        status = ""
+        if base is not None and ms > base * (1 + args.tolerance) + SLACK_MS:
+            status = "  REGRESSION"
+            failed = True
+        base_text = f"{base:10.1f}" if base is not None else f"{'-':>10}"
+        print(f"{name:<10} {ms:10.1f} {base_text}{status}")
+
+    if leaked:
+        print(f"\nthreepics --help imported heavy modules: {', '.join(sorted(leaked))}")
+        failed = True
+
+    if args.update or not baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump({name: round(ms, 1) for name, ms in medians.items()}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {BASELINE_FILE}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+bench_sync.py
+
+Offline benchmark of the sync paths against the local stand-in API in
+fake_api.py, so results do not depend on three-pics.com or the uplink.
+
+The backend scripts are copied into a sandbox in a temporary directory (their
+downloads/, config/ and databases stay inside it), and every scenario runs in
+a fresh interpreter against the fake API (median of --runs runs):
+
+- sync_cold:   get_all.py into an empty mirror; also reports the time until the
+               first displayable items were available (sync_metrics.json)
+- sync_warm:   get_all.py again, the media list answers 304
+- sync_verify: get_all.py without media_state.json, so the full list is
+               fetched and checked against the mirror
+- upload_bulk: put_files.py uploading --uploads files of --upload-kb KB
+- upload_chunked: put_files.py uploading --chunked-uploads files of
+               --chunked-mb MB with the chunked protocol while the fake API
+               fails every upload halfway through; checks that each file
+               resumed from the offset the server acknowledged and arrived
+               intact
+- usb_copy:    threepics_usbcopy.copy_images() importing a synthetic stick of
+               --usb-files images (nested folders, duplicates, system folders)
+
+The medians are compared with benchmarks/sync_baseline.json if it was
+recorded with the same parameters. A scenario that got slower than
+baseline * (1 + --tolerance) + SLACK_SECONDS fails the run (exit status 1).
+Without a matching baseline, or with --update, the current numbers are
+written as the new baseline. The baseline only holds for one machine, so it
+is ignored by git. --output stores the results with the git revision, for
+keeping a history.
+
+Usage:
+    python benchmarks/bench_sync.py [--runs 3] [--images 200] [--videos 5]
+        [--image-kb 300] [--video-mb 20] [--latency-ms 20] [--bandwidth-mbit 0]
+        [--uploads 50] [--upload-kb 500] [--chunked-uploads 2] [--chunked-mb 4]
+        [--usb-files 500] [--tolerance 0.25] [--update] [--output results.json]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCH_DIR, "..")
+SCRIPTS_DIR = os.path.join(REPO_DIR, "backend", "scripts")
+USBCOPY_SCRIPT = os.path.join(REPO_DIR, "setup", "debian", "usr", "local", "bin", "threepics_usbcopy.py")
+BASELINE_FILE = os.path.join(BENCH_DIR, "sync_baseline.json")
+SCENARIOS = ("sync_cold", "sync_warm", "sync_verify", "upload_bulk", "upload_chunked", "usb_copy")
+# Files that survive a cold start in the sandbox config/
+KEPT_CONFIG = ("credentials.json", "setup.json")
+# Absolute slack in seconds, so short scenarios do not fail on timer noise
+SLACK_SECONDS = 0.2
+USB_FILE_BYTES = 64 * 1024
+# Every USB_DUPLICATE_EVERY-th file on the stick repeats an earlier one
+USB_DUPLICATE_EVERY = 10
+# put_files.py settings for upload_chunked, so small files take several chunks
+CHUNKED_THRESHOLD_BYTES = 1024 * 1024
+CHUNK_BYTES = 256 * 1024
+# 503 answers per chunked upload: one more than api_client.MAX_RETRIES, so the
+# request fails and put_files.py has to resume from its recorded offset
+CHUNK_FAILURES = 4
+UPLOAD_DIRS = {"upload_bulk": "uploads", "upload_chunked": "chunked_uploads"}
+
+sys.path.insert(0, BENCH_DIR)
+
+import fake_api  # noqa: E402
+
+
+def create_sandbox(root):
+    """
+    Copy the backend scripts into root and write the sandbox configuration.
+
+    Args:
+        root (str): Empty sandbox directory.
+    """
+    scripts = os.path.join(root, "backend", "scripts")
+    os.makedirs(scripts)
+    for path in glob.glob(os.path.join(SCRIPTS_DIR, "*.py")):
+        shutil.copy2(path, scripts)
+    shutil.copy2(USBCOPY_SCRIPT, root)
+
+    config = os.path.join(root, "backend", "config")
+    os.makedirs(config)
+    with open(os.path.join(config, "credentials.json"), "w", encoding="utf-8") as f:
+        json.dump({"client_id": "bench", "client_secret": "bench"}, f)
+    with open(os.path.join(config, "setup.json"), "w", encoding="utf-8") as f:
+        json.dump({}, f)
+
+
+def reset_mirror(root):
+    """
+    Remove the mirror and everything a sync remembers, for a cold start.
+    """
+    backend = os.path.join(root, "backend")
+    shutil.rmtree(os.path.join(backend, "downloads"), ignore_errors=True)
+    config = os.path.join(backend, "config")
+    for name in os.listdir(config):
+        if name not in KEPT_CONFIG:
+            os.remove(os.path.join(config, name))
+
+
+def reset_ledger(root):
+    """
+    Forget imported and uploaded content, so every run does the full work.
+    """
+    for path in glob.glob(os.path.join(root, "backend", "config", "upload_ledger.db*")):
+        os.remove(path)
+
+
+def write_uploads(directory, count, size, extension=".jpg"):
+    """
+    Fill the upload directory with files of random content.
+
+    Returns:
+        set: SHA-256 hex digests of the files.
+    """
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    digests = set()
+    for index in range(count):
+        data = os.urandom(size)
+        with open(os.path.join(directory, f"upload_{index:05d}{extension}"), "wb") as f:
+            f.write(data)
+        digests.add(hashlib.sha256(data).hexdigest())
+    return digests
+
+
+def build_stick(root, files):
+    """
+    Create a synthetic USB stick: camera folders with colliding names,
+    repeated content and system folders that must be skipped.
+
+    Args:
+        root (str): Directory to create.
+        files (int): Number of image files outside the system folders.
+    """
+    contents = []
+    for index in range(files):
+        directory = os.path.join(root, "DCIM", f"{100 + index // 200}CANON", "sub" * (index % 2))
+        os.makedirs(directory, exist_ok=True)
+        if index % USB_DUPLICATE_EVERY == USB_DUPLICATE_EVERY - 1:
+            data = contents[index // USB_DUPLICATE_EVERY]
+        else:
+            data = os.urandom(USB_FILE_BYTES)
+            contents.append(data)
+        with open(os.path.join(directory, f"IMG_{index % 999 + 1:04d}.JPG"), "wb") as f:
+            f.write(data)
+    for system_dir in ("System Volume Information", ".Trashes"):
+        directory = os.path.join(root, system_dir)
+        os.makedirs(directory)
+        for index in range(20):
+            with open(os.path.join(directory, f"junk_{index}.jpg"), "wb") as f:
+                f.write(b"\0" * 1024)
+
+
+def run_child(scenario, root, origin):
+    """
+    Run one scenario in a fresh interpreter.
+
+    Returns:
+        dict: The child's result (seconds, plus time_to_first_items for
+        sync_cold).
+
+    Raises:
+        RuntimeError: If the scenario failed; the message names its log.
+    """
+    result_file = os.path.join(root, f"{scenario}.result.json")
+    log_file = os.path.join(root, f"{scenario}.log")
+    with open(log_file, "a", encoding="utf-8") as log:
+        status = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", scenario, root, result_file],
+            cwd=os.path.join(root, "backend"), stdout=log, stderr=subprocess.STDOUT,
+            env={**os.environ, "THREEPICS_API_ORIGIN": origin},
+        ).returncode
+    if status != 0:
+        with open(log_file, "r", encoding="utf-8") as f:
+            tail = "".join(f.readlines()[-10:])
+        raise RuntimeError(f"{scenario} failed (exit status {status}):\n{tail}")
+    with open(result_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def child_main(scenario, root, result_file):
+    """
+    Body of the child interpreter: run the scenario's entry point and write
+    the time it took to result_file.
+    """
+    scripts = os.path.join(root, "backend", "scripts")
+    sys.path.insert(0, scripts)
+    result = {}
+
+    if scenario.startswith("sync_"):
+        import get_all
+        started = time.perf_counter()
+        get_all.main()
+        result["seconds"] = time.perf_counter() - started
+        if scenario == "sync_cold":
+            with open(get_all.SYNC_METRICS_FILE, "r", encoding="utf-8") as f:
+                result["time_to_first_items"] = json.load(f).get("time_to_first_items")
+
+    elif scenario in ("upload_bulk", "upload_chunked"):
+        import put_files
+        backend = os.path.join(root, "backend")
+        put_files.UPLOAD_DIR = os.path.join(backend, UPLOAD_DIRS[scenario])
+        put_files.PREPARED_DIR = os.path.join(put_files.UPLOAD_DIR, ".prepared")
+        put_files.CONFIG = os.path.join(backend, "config", "credentials.json")
+        put_files.SETUP_FILE = os.path.join(backend, "config", "setup.json")
+        put_files.UPLOAD_STATE_FILE = os.path.join(backend, "config", "upload_state.json")
+        if scenario == "upload_chunked":
+            put_files.CHUNKED_UPLOAD_THRESHOLD = CHUNKED_THRESHOLD_BYTES
+            put_files.CHUNK_SIZE = CHUNK_BYTES
+        started = time.perf_counter()
+        put_files.main()
+        result["seconds"] = time.perf_counter() - started
+        if os.listdir(put_files.UPLOAD_DIR):
+            sys.exit("Not every file was uploaded")
+
+    elif scenario == "usb_copy":
+        # Import the sandbox modules before the script puts the installed
+        # backend in front of sys.path
+        import local_imports
+        import upload_ledger
+        import importlib.util
+        from pathlib import Path
+        local_imports.SYNC_SOCKET = os.path.join(root, "no-sync.sock")
+        spec = importlib.util.spec_from_file_location("threepics_usbcopy",
+                                                      os.path.join(root, "threepics_usbcopy.py"))
+        usbcopy = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(usbcopy)
+        ledger = upload_ledger.Ledger()
+        started = time.perf_counter()
+        try:
+            usbcopy.copy_images(Path(root, "stick"), Path(root, "backend", "usb_uploads"), ledger)
+        finally:
+            ledger.close()
+        result["seconds"] = time.perf_counter() - started
+
+    with open(result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def prepare(scenario, root, args):
+    """
+    Put the sandbox into the state the scenario starts from.
+
+    Returns:
+        set: For upload_chunked, the SHA-256 digests the server must receive.
+    """
+    backend = os.path.join(root, "backend")
+    if scenario == "sync_cold":
+        reset_mirror(root)
+    elif scenario == "sync_verify":
+        os.remove(os.path.join(backend, "config", "media_state.json"))
+    elif scenario == "upload_bulk":
+        reset_ledger(root)
+        write_uploads(os.path.join(backend, UPLOAD_DIRS[scenario]), args.uploads,
+                      args.upload_kb * 1024)
+    elif scenario == "upload_chunked":
+        reset_ledger(root)
+        # Videos are never downscaled, so the server sees the bytes written here
+        return write_uploads(os.path.join(backend, UPLOAD_DIRS[scenario]), args.chunked_uploads,
+                             args.chunked_mb * 1024 * 1024, ".mp4")
+    elif scenario == "usb_copy":
+        reset_ledger(root)
+        shutil.rmtree(os.path.join(backend, "usb_uploads"), ignore_errors=True)
+    return None
+
+
+def check_chunked(server, stats, digests):
+    """
+    Verify that every chunked upload resumed and arrived intact.
+
+    Args:
+        server (fake_api.FakeApiServer): The fake API.
+        stats (dict): The server counters of the run.
+        digests (set): SHA-256 digests of the uploaded files.
+
+    Raises:
+        RuntimeError: If a check failed.
+    """
+    received = {upload["sha256"] for upload in server.chunked_completed.values()}
+    server.chunked_completed.clear()
+    problems = []
+    if received != digests:
+        problems.append(f"{len(digests - received)} of {len(digests)} file(s) missing or corrupt")
+    if stats.get("chunked_status", 0) < len(digests):
+        problems.append(f"only {stats.get('chunked_status', 0)} resume(s) for "
+                        f"{len(digests)} interrupted upload(s)")
+    if stats.get("chunked_conflict"):
+        problems.append(f"{stats['chunked_conflict']} chunk(s) sent at the wrong offset")
+    if stats.get("chunked_start", 0) != len(digests):
+        problems.append(f"{stats.get('chunked_start', 0)} upload(s) opened for {len(digests)} file(s)")
+    if problems:
+        raise RuntimeError("upload_chunked check failed: " + "; ".join(problems))
+
+
+def measure(args, root, server):
+    """
+    Run every scenario --runs times.
+
+    Returns:
+        dict: Per scenario the median seconds, the median of any extra
+        numbers, and the requests the fake API answered in the last run.
+    """
+    samples = {scenario: [] for scenario in SCENARIOS}
+    requests = {}
+    for run in range(args.runs):
+        for scenario in SCENARIOS:
+            expected = prepare(scenario, root, args)
+            server.stats()
+            samples[scenario].append(run_child(scenario, root, server.origin))
+            stats = server.stats()
+            if scenario == "upload_chunked":
+                check_chunked(server, stats, expected)
+            requests[scenario] = sum(value for name, value in stats.items()
+                                     if not name.startswith("bytes_"))
+        print(f"run {run + 1}/{args.runs} done")
+
+    results = {}
+    for scenario, runs in samples.items():
+        results[scenario] = {
+            key: round(statistics.median(run[key] for run in runs), 3)
+            for key in runs[0] if all(run.get(key) is not None for run in runs)
+        }
+        results[scenario]["requests"] = requests[scenario]
+    return results
+
+
+def git_revision():
+    """
+    Return the current commit of the repository, or None outside of git.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    if sys.argv[1:2] == ["--child"]:
+        child_main(*sys.argv[2:5])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    fake_api.add_network_arguments(parser)
+    parser.add_argument("--uploads", type=int, default=50, help="files uploaded by upload_bulk")
+    parser.add_argument("--upload-kb", type=int, default=500, help="size of every upload in KB")
+    parser.add_argument("--chunked-uploads", type=int, default=2,
+                        help="files uploaded by upload_chunked")
+    parser.add_argument("--chunked-mb", type=int, default=4, help="size of every chunked upload in MB")
+    parser.add_argument("--usb-files", type=int, default=500, help="images on the synthetic stick")
+    parser.add_argument("--runs", type=int, default=3, help="runs per scenario")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown against the baseline")
+    parser.add_argument("--update", action="store_true", help="write the results as new baseline")
+    parser.add_argument("--output", help="also write the results with the git revision to this file")
+    args = parser.parse_args()
+
+    params = {key: value for key, value in vars(args).items()
+              if key not in ("runs", "tolerance", "update", "output", "chunk_failures")}
+    args.chunk_failures = CHUNK_FAILURES
+    server = fake_api.server_from_args(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="threepics-bench-") as root:
+            create_sandbox(root)
+            build_stick(os.path.join(root, "stick"), args.usb_files)
+            print(f"Fake API on {server.origin}, sandbox in {root}")
+            try:
+                results = measure(args, root, server)
+            except RuntimeError as e:
+                print(f"\n{e}")
+                sys.exit(1)
+    finally:
+        server.shutdown()
+
+    try:
+        with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        baseline = {}
+    if baseline.get("params") != params:
+        if baseline:
+            print("\nBaseline was recorded with other parameters, not comparing.")
+        baseline = {}
+
+    failed = False
+    print(f"\n{'scenario':<14} {'seconds':>8} {'baseline':>9} {'requests':>9}  extra")
+    for scenario, result in results.items():
+        base = baseline.get("results", {}).get(scenario, {}).get("seconds")
+        status = ""
+        if base is not None and result["seconds"] > base * (1 + args.tolerance) + SLACK_SECONDS:
+            status = "  REGRESSION"
+            failed = True
+        base_text = f"{base:9.2f}" if base is not None else f"{'-':>9}"
+        extra = ", ".join(f"{key} {value}s" for key, value in result.items()
+                          if key not in ("seconds", "requests"))
+        print(f"{scenario:<14} {result['seconds']:8.2f} {base_text} {result['requests']:9d}  "
+              f"{extra}{status}")
+
+    record = {"params": params, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"revision": git_revision(), "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       **record}, f, indent=2)
+            f.write("\n")
+        print(f"\nResults written to {args.output}")
+
+    if args.update or not baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {BASELINE_FILE}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
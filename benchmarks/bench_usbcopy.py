@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+bench_usbcopy.py
+
+Benchmark for the USB import traversal in threepics_usbcopy.py.
+
+Builds a synthetic stick layout in a temporary directory (by default 50,000
+image files spread over camera-style folders, all named IMG_0001.JPG ...
+IMG_0999.JPG, plus system folders and macOS "._*" resource forks) and times:
+
+- baseline: Path.rglob("*") + is_file() per entry, and collision names probed
+  with one exists() call per _1, _2, ... attempt (the previous implementation)
+- scandir:  walk_images() + UniqueNamer from threepics_usbcopy.py
+
+Only traversal and naming are measured; no files are copied, so the numbers
+show the per-entry overhead that dominates on slow vfat/NTFS sticks.
+
+Usage:
+    python benchmarks/bench_usbcopy.py [--files 50000] [--per-dir 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "setup", "debian", "usr", "local", "bin"))
+
+import threepics_usbcopy  # noqa: E402
+
+
+def build_tree(root: Path, files: int, per_dir: int):
+    """
+    Create the synthetic source tree and return the number of noise entries.
+    """
+    folders = (files + per_dir - 1) // per_dir
+    created = 0
+    for folder in range(folders):
+        directory = root / "DCIM" / f"{100 + folder}CANON"
+        directory.mkdir(parents=True)
+        for index in range(min(per_dir, files - created)):
+            (directory / f"IMG_{index % 999 + 1:04d}.JPG").touch()
+            created += 1
+
+    noise = 0
+    for system_dir in ("System Volume Information", "$RECYCLE.BIN", ".Trashes"):
+        directory = root / system_dir / "sub"
+        directory.mkdir(parents=True)
+        for index in range(200):
+            (directory / f"junk_{index}.jpg").touch()
+            noise += 1
+    for index in range(min(files, 2000)):
+        (root / "DCIM" / "100CANON" / f"._IMG_{index}.JPG").touch()
+        noise += 1
+    return noise
+
+
+def baseline(src: Path, dest: Path):
+    """
+    The previous implementation: rglob, is_file() and exists() probing.
+    """
+    supported_exts = {'.jpg', '.jpeg', '.png'}
+    taken = set()
+    found = 0
+
+    def exists(candidate):
+        # Stands in for Path.exists() on the destination, which would see the
+        # files copied so far; the probe itself is one stat call.
+        candidate.exists()
+        return candidate.name in taken
+
+    for path in src.rglob("*"):
+        if path.is_file() and path.suffix.lower() in supported_exts:
+            base, ext = os.path.splitext(path.name)
+            candidate = dest / path.name
+            counter = 1
+            while exists(candidate):
+                candidate = dest / f"{base}_{counter}{ext}"
+                counter += 1
+            taken.add(candidate.name)
+            found += 1
+    return found
+
+
+def scandir_walk(src: Path, dest: Path):
+    """
+    The current implementation: walk_images() and UniqueNamer.
+    """
+    namer = threepics_usbcopy.UniqueNamer(dest)
+    found = 0
+    for entry in threepics_usbcopy.walk_images(src):
+        namer.claim(entry.name)
+        found += 1
+    return found
+
+
+def timed(label, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {result:>7} files  {elapsed:8.2f}s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--files", type=int, default=50000, help="number of image files")
+    parser.add_argument("--per-dir", type=int, default=500, help="files per camera folder")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "stick"
+        dest = Path(tmp) / "uploads"
+        dest.mkdir()
+
+        print(f"Building {args.files} files...")
+        noise = build_tree(src, args.files, args.per_dir)
+        print(f"(plus {noise} entries that must be skipped)\n")
+
+        old = timed("baseline", baseline, src, dest)
+        new = timed("scandir", scandir_walk, src, dest)
+        print(f"\nspeedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+fake_api.py
+
+Local stand-in for the three-pics.com API, used by the offline benchmark
+suite (bench_sync.py) and for trying the backend scripts without an account.
+The scripts talk to it when THREEPICS_API_ORIGIN is set to its address (see
+backend/scripts/api_client.py).
+
+Endpoints:
+    POST /o/token/                    any client credentials get a token
+    GET  /api/media-list/             synthetic album, ETag / 304
+    GET  /api/download/<type>/<id>/   deterministic media bytes, Range requests
+    POST /api/upload/image/           (and /video/) multipart upload, new id
+    POST /api/upload/chunked/         open a chunked upload
+    GET  /api/upload/chunked/<id>/    bytes received so far ({"offset": n})
+    PUT  /api/upload/chunked/<id>/    next chunk (Content-Range), new id once
+                                      complete; a chunk that does not start
+                                      at the received offset answers 409
+    GET  /api/setup/                  empty setup, ETag / 304
+    POST /api/mark-to-delete/         always accepted
+
+Anything else answers 404.
+
+With --chunk-failures N, the first chunk of every chunked upload that starts
+past half of the file is answered with 503 N times in a row, so clients go
+through their retry and resume paths. Completed chunked uploads are kept
+with their size and SHA-256 in `FakeApiServer.chunked_completed`.
+
+The album has --images images and --videos videos of fixed sizes; each item
+lists its size and SHA-256, so get_all.py verifies every download. Every
+request waits --latency-ms before it is answered, and response and upload
+bodies are paced to --bandwidth-mbit per connection (0: unlimited).
+
+Usage:
+    python benchmarks/fake_api.py [--port 8765] [--images 200] [--videos 5]
+        [--image-kb 300] [--video-mb 20] [--latency-ms 20] [--bandwidth-mbit 0]
+        [--chunk-failures 0]
+
+    THREEPICS_API_ORIGIN=http://127.0.0.1:8765 python backend/scripts/get_all.py
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BLOCK_SIZE = 64 * 1024
+FIRST_UPLOAD_ID = 100000
+DOWNLOAD_PATH = re.compile(r"^/api/download/(image|video)/(\d+)/$")
+UPLOAD_PATH = re.compile(r"^/api/upload/(image|video)/$")
+CHUNKED_PATH = re.compile(r"^/api/upload/chunked/(\d+)/$")
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def media_block(media_id):
+    """
+    Return the BLOCK_SIZE pattern the content of a media item repeats.
+    """
+    seed = hashlib.sha256(str(media_id).encode("utf-8")).digest()
+    return seed * (BLOCK_SIZE // len(seed))
+
+
+def media_chunks(media_id, start, end):
+    """
+    Yield the bytes start..end (exclusive) of a media item.
+
+    Args:
+        media_id (int): The item id.
+        start (int): First byte offset.
+        end (int): Offset after the last byte.
+    """
+    block = media_block(media_id)
+    offset = start
+    while offset < end:
+        position = offset % BLOCK_SIZE
+        chunk = block[position:min(BLOCK_SIZE, position + end - offset)]
+        yield chunk
+        offset += len(chunk)
+
+
+class Album:
+    """
+    Synthetic media list with deterministic content.
+
+    Args:
+        images (int): Number of images.
+        videos (int): Number of videos.
+        image_bytes (int): Size of every image.
+        video_bytes (int): Size of every video.
+    """
+
+    def __init__(self, images, videos, image_bytes, video_bytes):
+        self.items = []
+        self.sizes = {}
+        for index in range(1, images + 1):
+            self._add(index, "image", f"bench_{index:05d}.jpg", image_bytes)
+        for index in range(images + 1, images + videos + 1):
+            self._add(index, "video", f"bench_{index:05d}.mp4", video_bytes)
+        self.body = json.dumps(self.items).encode("utf-8")
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:16]}"'
+
+    def _add(self, media_id, mtype, filename, size):
+        digest = hashlib.sha256()
+        for chunk in media_chunks(media_id, 0, size):
+            digest.update(chunk)
+        self.sizes[media_id] = size
+        self.items.append({
+            "id": media_id,
+            "type": mtype,
+            "filename": filename,
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "text1": f"Bench item {media_id}" if media_id % 4 == 0 else "",
+        })
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the album, the simulated network and request counters.
+
+    Args:
+        address (tuple): (host, port); port 0 picks a free one.
+        album (Album): The media served.
+        latency (float): Seconds to wait before answering a request.
+        bandwidth (float): Bytes per second per connection, or None.
+        chunk_failures (int): 503 answers injected in the middle of every
+            chunked upload.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, album, latency=0.0, bandwidth=None, chunk_failures=0):
+        super().__init__(address, FakeApiHandler)
+        self.album = album
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.chunk_failures = chunk_failures
+        self.setup_body = b"{}"
+        self.upload_ids = itertools.count(FIRST_UPLOAD_ID)
+        self.lock = threading.Lock()
+        self.counters = {}
+        # Open chunked uploads by id, and finished ones (size, sha256)
+        self.chunked = {}
+        self.chunked_completed = {}
+
+    @property
+    def origin(self):
+        """
+        Return the base URL to put into THREEPICS_API_ORIGIN.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name, amount=1):
+        """
+        Add to a request or byte counter.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def stats(self):
+        """
+        Return a copy of the counters and reset them.
+
+        Returns:
+            dict: Counter values by name.
+        """
+        with self.lock:
+            counters, self.counters = self.counters, {}
+        return counters
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of FakeApiServer.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _pace(self, started, transferred):
+        # Sleep until the transfer is no faster than the configured bandwidth
+        if self.server.bandwidth:
+            delay = transferred / self.server.bandwidth - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _send(self, status, body=b"", headers=None, chunks=None, length=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if chunks is None:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            chunks = [body] if body else []
+        else:
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self.end_headers()
+
+        started = time.monotonic()
+        sent = 0
+        for chunk in chunks:
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            self._pace(started, sent)
+        self.server.count("bytes_sent", sent)
+
+    def _read_body(self):
+        remaining = int(self.headers.get("Content-Length") or 0)
+        started = time.monotonic()
+        received = 0
+        data = bytearray()
+        while remaining > 0:
+            chunk = self.rfile.read(min(BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            data += chunk
+            received += len(chunk)
+            remaining -= len(chunk)
+            self._pace(started, received)
+        self.server.count("bytes_received", received)
+        return bytes(data)
+
+    def _not_modified(self, etag):
+        return self.headers.get("If-None-Match") == etag
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        path = self.path.split("?", 1)[0]
+        album = self.server.album
+
+        if path == "/api/media-list/":
+            self.server.count("media_list")
+            if self._not_modified(album.etag):
+                return self._send(304, headers={"ETag": album.etag})
+            return self._send(200, album.body, headers={"ETag": album.etag})
+
+        if path == "/api/setup/":
+            self.server.count("setup")
+            etag = f'"{hashlib.sha256(self.server.setup_body).hexdigest()[:16]}"'
+            if self._not_modified(etag):
+                return self._send(304, headers={"ETag": etag})
+            return self._send(200, self.server.setup_body, headers={"ETag": etag})
+
+        match = CHUNKED_PATH.match(path)
+        if match:
+            with self.server.lock:
+                upload = self.server.chunked.get(int(match.group(1)))
+                offset = upload["offset"] if upload else None
+            if offset is None:
+                return self._send(404, b'{"detail": "Not found."}')
+            self.server.count("chunked_status")
+            return self._send(200, json.dumps({"offset": offset}).encode("utf-8"))
+
+        match = DOWNLOAD_PATH.match(path)
+        if match and int(match.group(2)) in album.sizes:
+            self.server.count("download")
+            media_id = int(match.group(2))
+            size = album.sizes[media_id]
+            start, status, headers = 0, 200, {"Accept-Ranges": "bytes"}
+            requested = re.match(r"^bytes=(\d+)-$", self.headers.get("Range", ""))
+            if requested:
+                start = int(requested.group(1))
+                if start >= size:
+                    return self._send(416, headers={"Content-Range": f"bytes */{size}"})
+                status = 206
+                headers["Content-Range"] = f"bytes {start}-{size - 1}/{size}"
+            return self._send(status, headers=headers, chunks=media_chunks(media_id, start, size),
+                              length=size - start)
+
+        self._send(404, b'{"detail": "Not found."}')
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        path = self.path.split("?", 1)[0]
+        body = self._read_body()
+
+        if path == "/o/token/":
+            self.server.count("token")
+            token = {"access_token": "bench-token", "token_type": "Bearer", "expires_in": 3600}
+            return self._send(200, json.dumps(token).encode("utf-8"))
+
+        if UPLOAD_PATH.match(path):
+            self.server.count("upload")
+            return self._send(201, json.dumps({"id": next(self.server.upload_ids)}).encode("utf-8"))
+
+        if path == "/api/upload/chunked/":
+            self.server.count("chunked_start")
+            upload_id = next(self.server.upload_ids)
+            with self.server.lock:
+                self.server.chunked[upload_id] = {
+                    "size": int(json.loads(body or b"{}").get("size") or 0),
+                    "offset": 0,
+                    "digest": hashlib.sha256(),
+                    "failures": self.server.chunk_failures,
+                }
+            return self._send(201, json.dumps({"upload_id": upload_id}).encode("utf-8"))
+
+        if path == "/api/mark-to-delete/":
+            self.server.count("mark_to_delete")
+            filename = json.loads(body or b"{}").get("filename")
+            return self._send(200, json.dumps({"filename": filename}).encode("utf-8"))
+
+        self._send(404, b'{"detail": "Not found."}')
+
+    def do_PUT(self):
+        time.sleep(self.server.latency)
+        path = self.path.split("?", 1)[0]
+        body = self._read_body()
+        match = CHUNKED_PATH.match(path)
+        chunk_range = CONTENT_RANGE.match(self.headers.get("Content-Range", ""))
+        if not match or not chunk_range:
+            return self._send(404, b'{"detail": "Not found."}')
+        upload_id = int(match.group(1))
+        start = int(chunk_range.group(1))
+
+        with self.server.lock:
+            upload = self.server.chunked.get(upload_id)
+            if upload is None:
+                status, payload = 404, {"detail": "Not found."}
+            elif upload["failures"] and start >= upload["size"] // 2:
+                # Simulated outage in the middle of the upload
+                upload["failures"] -= 1
+                status, payload = 503, {"detail": "Service unavailable."}
+            elif start != upload["offset"] or start + len(body) > upload["size"]:
+                status, payload = 409, {"offset": upload["offset"]}
+            else:
+                upload["digest"].update(body)
+                upload["offset"] += len(body)
+                status, payload = 200, {"offset": upload["offset"]}
+                if upload["offset"] == upload["size"]:
+                    del self.server.chunked[upload_id]
+                    self.server.chunked_completed[upload_id] = {
+                        "size": upload["size"], "sha256": upload["digest"].hexdigest(),
+                    }
+                    status, payload["id"] = 201, next(self.server.upload_ids)
+        self.server.count({200: "chunk", 201: "chunk", 404: "chunked_missing",
+                           409: "chunked_conflict", 503: "chunked_failed"}[status])
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+
+def start_server(album, port=0, latency=0.0, bandwidth=None, chunk_failures=0):
+    """
+    Start a FakeApiServer on 127.0.0.1 in a background thread.
+
+    Args:
+        album (Album): The media served.
+        port (int): TCP port, 0 for a free one.
+        latency (float): Seconds to wait before answering a request.
+        bandwidth (float): Bytes per second per connection, or None.
+        chunk_failures (int): 503 answers injected in the middle of every
+            chunked upload.
+
+    Returns:
+        FakeApiServer: The running server; call shutdown() to stop it.
+    """
+    server = FakeApiServer(("127.0.0.1", port), album, latency, bandwidth, chunk_failures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_network_arguments(parser):
+    """
+    Add the album and network options shared with bench_sync.py.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument("--images", type=int, default=200, help="images in the album")
+    parser.add_argument("--videos", type=int, default=5, help="videos in the album")
+    parser.add_argument("--image-kb", type=int, default=300, help="size of every image in KB")
+    parser.add_argument("--video-mb", type=int, default=20, help="size of every video in MB")
+    parser.add_argument("--latency-ms", type=float, default=20, help="delay before each answer")
+    parser.add_argument("--bandwidth-mbit", type=float, default=0,
+                        help="per-connection bandwidth in Mbit/s (0: unlimited)")
+    parser.add_argument("--chunk-failures", type=int, default=0,
+                        help="503 answers in the middle of every chunked upload")
+
+
+def server_from_args(args, port=0):
+    """
+    Build the album and start the server described by add_network_arguments().
+
+    Returns:
+        FakeApiServer: The running server.
+    """
+    album = Album(args.images, args.videos, args.image_kb * 1024, args.video_mb * 1024 * 1024)
+    bandwidth = args.bandwidth_mbit * 1000 * 1000 / 8 if args.bandwidth_mbit > 0 else None
+    return start_server(album, port, args.latency_ms / 1000, bandwidth, args.chunk_failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--port", type=int, default=8765, help="TCP port on 127.0.0.1")
+    add_network_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.port)
+    print(f"Fake three-pics API on {server.origin} "
+          f"({len(server.album.items)} items), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
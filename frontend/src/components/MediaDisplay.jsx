@@ -113,7 +113,7 @@ if (!currentMedia) return null;
     if (currentMedia.type === 'image') {
       return (
         <img
-          src={`${backendUrl}${currentMedia.url}`}
+          src={`${backendUrl}${currentMedia.displayUrl || currentMedia.url}`}
           alt={`Media ${currentIndex}`}
           style={{
             transform: orientation === 'portrait' ? 'rotate(90deg)' : 'none',
@@ -130,7 +130,8 @@ if (!currentMedia) return null;
       return (
         <video
           ref={videoRef}
-          src={`${backendUrl}${currentMedia.url}`}
+          src={`${backendUrl}${currentMedia.displayUrl || currentMedia.url}`}
+          poster={currentMedia.poster ? `${backendUrl}${currentMedia.poster}` : undefined}
           autoPlay
           muted
           style={{
@@ -64,7 +64,7 @@ export default function MediaManagement() {
         </p>
       )}
       <ul style={{ listStyle: 'none', padding: 0 }}>
-        {mediaList.map(({ id, type, url, subtitle }) => (
+        {mediaList.map(({ id, type, url, displayUrl, subtitle }) => (
           <li
             key={id}
             style={{
@@ -77,7 +77,7 @@ export default function MediaManagement() {
           >
             {type === 'image' && (
               <img
-                src={`${backendUrl}${url}`}
+                src={`${backendUrl}${displayUrl || url}`}
                 alt={subtitle || 'Bild'}
                 style={{ height: 60, marginRight: 16, objectFit: 'cover', minWidth: 100, }}
               />
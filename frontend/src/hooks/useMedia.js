@@ -9,10 +9,25 @@ export default function useMedia() {
   const [error, setError] = useState(null);
   const [currentIndex, setCurrentIndex] = useState(0);
   const intervalRef = useRef(null);
+  // URL des gerade gezeigten Mediums, auch im WebSocket-Handler aktuell
+  const currentUrlRef = useRef(null);
+  currentUrlRef.current = media[currentIndex]?.url || null;
   const [delay, setDelay] = useState(30000); 
   const [transitionEffect, setTransitionEffect] = useState("zoom");
   const [transitionDuration, setTransitionDuration] = useState(0.8);
 
+  // Anzeige-Einstellungen aus setup.json übernehmen
+  const loadSetup = () => axios.get(`${backendUrl}/api/setup`)
+    .then(res => {
+      const seconds = res.data?.delay_seconds || 30;
+      const effect = res.data?.transition_effect || "zoom";
+      const duration = parseFloat(res.data?.transition_duration) || 0.8;
+      setDelay(seconds * 1000);
+      setTransitionEffect(effect);
+      setTransitionDuration(duration);
+      return { seconds, effect, duration };
+    });
+
   useEffect(() => {
     console.log('[Frontend] Loading media from:', backendUrl);
 
@@ -28,15 +43,7 @@ export default function useMedia() {
         setLoading(false);
       });
 
-    axios.get(`${backendUrl}/api/setup`)
-      .then(res => {
-        const seconds = res.data?.delay_seconds || 30;
-        const effect = res.data?.transition_effect || "zoom";
-        const duration = parseFloat(res.data?.transition_duration) || 0.8;
-        setDelay(seconds * 1000);
-        setTransitionEffect(effect);
-        setTransitionDuration(duration);
-      })
+    loadSetup()
       .catch(err => {
         console.warn('[Frontend] ⚠️ Fehler beim Laden des Delays:', err);
       });
@@ -45,14 +52,8 @@ export default function useMedia() {
   // Wiederholtes Neuladen des Delay-Werts
   useEffect(() => {
     const interval = setInterval(() => {
-      axios.get(`${backendUrl}/api/setup`)
-        .then(res => {
-          const seconds = res.data?.delay_seconds || 30;
-          const effect = res.data?.transition_effect || "zoom";
-          const duration = parseFloat(res.data?.transition_duration) || 0.8;
-          setDelay(seconds * 1000);
-          setTransitionEffect(effect);
-          setTransitionDuration(duration);
+      loadSetup()
+        .then(({ seconds, effect, duration }) => {
           console.log(`[Frontend] ⏱ Aktualisiert: ${seconds}s – 🎞 ${effect} – ⏳ ${duration}s`);
         })
         .catch(err => {
@@ -97,12 +98,15 @@ export default function useMedia() {
 
     ws.onmessage = (event) => {
       const message = JSON.parse(event.data);
-      if (message.type === 'new-file') {
+      if (message.type === 'new-file' || message.type === 'media-updated') {
         console.log('[Frontend] 🆕 Neue Datei erkannt, Medien neu laden...');
         axios.get(`${backendUrl}/media`)
           .then(res => {
+            // Während eines laufenden Syncs wächst die Liste laufend:
+            // beim aktuellen Medium bleiben statt von vorne zu beginnen
+            const index = res.data.findIndex(m => m.url === currentUrlRef.current);
             setMedia(res.data);
-            setCurrentIndex(0); 
+            setCurrentIndex(index >= 0 ? index : 0);
             setLoading(false);
           })
           .catch(err => {
@@ -110,6 +114,13 @@ export default function useMedia() {
             setError('Fehler beim Neuladen');
           });
       }
+      if (message.type === 'setup-updated') {
+        console.log('[Frontend] ⚙️ Setup geändert, Einstellungen neu laden...');
+        loadSetup()
+          .catch(err => {
+            console.warn('[Frontend] ⚠️ Fehler beim Aktualisieren des Setups:', err);
+          });
+      }
       if (message.type === 'file-deleted') {
         console.log('[Frontend] ❌ Datei gelöscht erkannt, Medien neu laden...');
         axios.get(`${backendUrl}/media`)
@@ -11,8 +11,25 @@ a numeric suffix (e.g., image.jpg → image_1.jpg).
 
 Key Features:
 - Supports mounting of standard Linux filesystems and NTFS (via ntfs-3g).
-- Recursively finds image files with case-insensitive extensions.
+- Recursively finds image files with case-insensitive extensions using a
+  single os.scandir pass (no extra stat per entry) and skips system folders
+  such as "System Volume Information", "$RECYCLE.BIN", ".Trashes" as well as
+  macOS "._*" resource forks.
 - Ensures no copied image overwrites existing ones.
+- Skips images whose content was already imported or uploaded from this device
+  (upload ledger in the backend, keyed by SHA-256), so inserting the same stick
+  twice copies nothing. Only files whose size matches known content are hashed
+  up front; all others are hashed while they are copied.
+- Optional streaming import (`"usb_stream_import": true` in the backend's
+  config/setup.json): while the stick is still being read, upload workers send
+  each image straight from the stick through a bounded queue. Only images
+  whose upload failed are copied to the uploads directory, where put_files.py
+  retries them. Without credentials or network the regular copy is used.
+- Local-first display: every newly imported image is also placed into the
+  backend's downloads/images/ (local_imports.py) and the sync daemon is asked
+  to pick it up, so it appears in the slideshow within seconds instead of
+  after the upload and the next download. Once the upload is confirmed the
+  local copy is linked to the server item and not downloaded again.
 - Uses systemd journal for logging via standard output.
 - Unmounts the device cleanly after the operation.
 
@@ -28,11 +45,44 @@ Author: Björn Becker
 """
 
 import os
+import queue
 import sys
 import subprocess
 import shutil
+import tempfile
+import threading
+import time
 from pathlib import Path
 
+SUPPORTED_EXTS = {'.jpg', '.jpeg', '.png'}
+# Folders created by operating systems that never contain user photos
+PRUNED_DIRS = {
+    "system volume information",
+    "$recycle.bin",
+    "recycler",
+    ".trashes",
+    ".trash",
+    ".spotlight-v100",
+    ".fseventsd",
+    ".temporaryitems",
+    ".documentrevisions-v100",
+    "lost+found",
+}
+
+BACKEND_SCRIPTS = "/opt/threepics/threepics-dashboard/backend/scripts"
+# Queue slots per upload worker in streaming mode
+STREAM_QUEUE_FACTOR = 2
+# Minimum seconds between sync triggers while a stick is being imported
+SYNC_NOTIFY_INTERVAL = 15
+sys.path.insert(0, BACKEND_SCRIPTS)
+
+try:
+    from upload_ledger import Ledger, copy_with_sha256, file_sha256
+    import local_imports
+except ImportError:
+    Ledger = None
+    local_imports = None
+
 
 def mount_device(device: str, mountpoint: str) -> bool:
     """
@@ -73,47 +123,327 @@ def unmount_device(mountpoint: str):
         print(f"[ERROR] Unmount failed: {unmount_error}")
 
 
-def get_unique_filename(dest_dir: Path, filename: str) -> Path:
+def is_pruned_dir(name: str) -> bool:
+    """
+    Returns True for system folders (including per-user trash folders such as
+    .Trash-1000) that are not descended into.
+    """
+    lowered = name.lower()
+    return lowered in PRUNED_DIRS or lowered.startswith(".trash-")
+
+
+def walk_images(src_dir: Path):
+    """
+    Yields os.DirEntry objects for all image files below src_dir.
+
+    Uses os.scandir, so file and directory checks come from the directory
+    listing itself instead of one stat call per entry. System folders and
+    macOS "._*" resource forks are skipped; symlinks are not followed.
+    Unreadable folders are reported and skipped.
+    """
+    pending = [str(src_dir)]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not is_pruned_dir(name):
+                            pending.append(entry.path)
+                    elif (
+                        not name.startswith("._")
+                        and os.path.splitext(name)[1].lower() in SUPPORTED_EXTS
+                        and entry.is_file(follow_symlinks=False)
+                    ):
+                        yield entry
+        except OSError as scan_error:
+            print(f"[ERROR] Cannot read {current}: {scan_error}")
+
+
+class UniqueNamer:
+    """
+    Hands out collision-free file names for the destination directory.
+
+    The directory is listed once; afterwards names are checked against an
+    in-memory table, and the next free numeric suffix is remembered per name,
+    so many files called IMG_0001.JPG do not probe _1, _2, ... again and
+    again (image.jpg → image_1.jpg → image_2.jpg).
+    """
+
+    def __init__(self, dest_dir: Path):
+        self.dest_dir = dest_dir
+        self.used = set(os.listdir(dest_dir))
+        self.next_suffix = {}
+
+    def claim(self, filename: str) -> Path:
+        """
+        Reserves and returns a path in the destination directory that no
+        existing or previously claimed file uses.
+        """
+        candidate = filename
+        if candidate in self.used:
+            base, ext = os.path.splitext(filename)
+            counter = self.next_suffix.get(filename, 1)
+            candidate = f"{base}_{counter}{ext}"
+            while candidate in self.used:
+                counter += 1
+                candidate = f"{base}_{counter}{ext}"
+            self.next_suffix[filename] = counter + 1
+        self.used.add(candidate)
+        return self.dest_dir / candidate
+
+
+class LocalDisplay:
     """
-    Checks if a file with the given name exists in the destination directory.
-    If it exists, appends a counter (_1, _2, ...) to create a unique filename.
+    Shows imported images in the slideshow before they are uploaded.
+
+    Images are handed to local_imports.py, and the sync daemon is triggered
+    at most every SYNC_NOTIFY_INTERVAL seconds (and once more by finish()),
+    so a large stick does not start a sync per file. Safe to use from
+    several threads.
     """
-    base, ext = os.path.splitext(filename)
-    candidate = dest_dir / filename
-    counter = 1
-    while candidate.exists():
-        candidate = dest_dir / f"{base}_{counter}{ext}"
-        counter += 1
-    return candidate
 
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_notify = 0.0
+        self.dirty = False
+
+    def add(self, path: str, content_hash: str, size: int):
+        """
+        Puts an image into the local slideshow set; failures are only logged.
+        """
+        if local_imports is None:
+            return
+        try:
+            filename = local_imports.add_local_image(path, content_hash, size)
+        except OSError as local_error:
+            print(f"[WARN] Could not show {path} locally: {local_error}")
+            return
+        print(f"[LOCAL] {path} → downloads/images/{filename}")
+        with self.lock:
+            self.dirty = True
+            due = time.monotonic() - self.last_notify >= SYNC_NOTIFY_INTERVAL
+        if due:
+            self.notify()
 
-def copy_images(src_dir: Path, dest_dir: Path):
+    def confirm(self, content_hash: str, media_id):
+        """
+        Links a local image to the media id returned by its upload.
+        """
+        if local_imports is None:
+            return
+        try:
+            local_imports.confirm_upload(content_hash, media_id)
+        except OSError as local_error:
+            print(f"[WARN] Could not link {content_hash[:16]} to its upload: {local_error}")
+
+    def notify(self):
+        with self.lock:
+            self.last_notify = time.monotonic()
+            self.dirty = False
+        if not local_imports.notify_sync():
+            print("[LOCAL] Sync daemon not reachable, images appear with the next sync")
+
+    def finish(self):
+        """
+        Triggers a final sync if images were added since the last trigger.
+        """
+        if self.dirty:
+            self.notify()
+
+
+def copy_images(src_dir: Path, dest_dir: Path, ledger=None):
     """
     Recursively scans the source directory for image files (jpg, jpeg, png),
     ignoring case, and copies them to the destination directory without preserving
     subdirectories. Files with conflicting names are renamed to avoid overwrites.
+    With a ledger, content that was imported or uploaded before is skipped and
+    every copy is registered as pending upload and shown locally right away.
     """
     dest_dir.mkdir(parents=True, exist_ok=True)
-    supported_exts = {'.jpg', '.jpeg', '.png'}
+    namer = UniqueNamer(dest_dir)
+    display = LocalDisplay()
 
     count = 0
-    for path in src_dir.rglob("*"):
-        if path.is_file() and path.suffix.lower() in supported_exts:
-            target_path = get_unique_filename(dest_dir, path.name)
-            try:
+    skipped = 0
+    for entry in walk_images(src_dir):
+        path = entry.path
+        try:
+            size = entry.stat(follow_symlinks=False).st_size
+            content_hash = None
+            if ledger is not None and ledger.has_size(size):
+                content_hash = file_sha256(path)
+                if ledger.is_known(content_hash):
+                    print(f"[SKIP] {path} (already imported)")
+                    skipped += 1
+                    continue
+
+            target_path = namer.claim(entry.name)
+            if ledger is None or content_hash is not None:
                 shutil.copy2(path, target_path)
-                print(f"[COPY] {path} → {target_path}")
-                count += 1
-            except OSError as copy_error:
-                print(f"[ERROR] Failed to copy {path}: {copy_error}")
+            else:
+                content_hash = copy_with_sha256(path, target_path)
+            if ledger is not None:
+                ledger.add_pending(content_hash, size, str(target_path))
+            print(f"[COPY] {path} → {target_path}")
+            count += 1
+        except OSError as copy_error:
+            print(f"[ERROR] Failed to copy {path}: {copy_error}")
+            continue
+        if ledger is not None:
+            display.add(str(target_path), content_hash, size)
+
+    display.finish()
+
+    print(f"[SUMMARY] Total images copied: {count}, duplicates skipped: {skipped}")
+
+
+def load_uploader():
+    """
+    Imports put_files.py from the backend for the streaming import.
+    Returns the module, or None if streaming is disabled or unavailable.
+    """
+    if Ledger is None:
+        return None
+    try:
+        import put_files
+    except ImportError as import_error:
+        print(f"[STREAM] Uploader not available: {import_error}")
+        return None
+    if not put_files.load_setup().get("usb_stream_import"):
+        return None
+    return put_files
 
-    print(f"[SUMMARY] Total images copied: {count}")
+
+def stream_images(src_dir: Path, dest_dir: Path, ledger, uploader):
+    """
+    Uploads images directly from the stick while it is being scanned.
+
+    The directory walk feeds a bounded queue that upload workers consume.
+    Each worker hashes its file, skips content known to the ledger, and
+    uploads it straight from the stick (downscaled first if put_files.py is
+    configured to). Every new image is shown locally first; only files whose
+    upload failed are copied into dest_dir and registered as pending, so
+    put_files.py can retry them later.
+
+    Returns the number of staged files, or None if no upload was possible
+    (no credentials or network) and nothing was processed.
+    """
+    try:
+        uploader.get_upload_token()
+    except (FileNotFoundError, ValueError,
+            uploader.requests.exceptions.RequestException) as auth_error:
+        print(f"[STREAM] Cannot authenticate, falling back to copying: {auth_error}")
+        return None
+
+    setup = uploader.load_setup()
+    workers = uploader.get_upload_workers(setup)
+    downscale = uploader.downscale_settings(setup)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    namer = UniqueNamer(dest_dir)
+    display = LocalDisplay()
+
+    work = queue.Queue(maxsize=workers * STREAM_QUEUE_FACTOR)
+    lock = threading.Lock()
+    seen = set()
+    counts = {"uploaded": 0, "skipped": 0, "staged": 0}
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def stage(path, name, size, content_hash):
+        with lock:
+            target_path = namer.claim(name)
+        shutil.copy2(path, target_path)
+        ledger.add_pending(content_hash, size, str(target_path))
+        print(f"[STAGE] {path} → {target_path}")
+        count("staged")
+
+    def upload(path, name, size):
+        content_hash = file_sha256(path)
+        with lock:
+            duplicate = content_hash in seen or ledger.is_known(content_hash)
+            seen.add(content_hash)
+        if duplicate:
+            print(f"[SKIP] {path} (already imported)")
+            count("skipped")
+            return
+
+        display.add(path, content_hash, size)
+        prepared_dir = None
+        prepared = None
+        try:
+            if downscale is not None:
+                prepared_dir = tempfile.mkdtemp(prefix="threepics-")
+                try:
+                    prepared = uploader.downscale_image(
+                        path, os.path.join(prepared_dir, name),
+                        downscale["max_edge"], downscale["quality"],
+                    )
+                except Exception as scale_error:
+                    # Pillow raises all kinds of errors on corrupt files
+                    # (e.g. SyntaxError for a broken PNG)
+                    print(f"[WARN] Could not downscale {path}, uploading original: {scale_error}")
+            result = uploader.upload_with_retries(path, prepared)
+            if result is None:
+                stage(path, name, size, content_hash)
+            else:
+                ledger.mark_uploaded(content_hash, size, name)
+                display.confirm(content_hash, result[1])
+                count("uploaded")
+        finally:
+            if prepared_dir is not None:
+                shutil.rmtree(prepared_dir, ignore_errors=True)
+
+    def worker():
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            try:
+                upload(*item)
+            except Exception as stream_error:
+                # A dead worker would leave the producer blocked on the full
+                # queue, so any error only costs this file its direct upload
+                print(f"[ERROR] Failed to import {item[0]}: {stream_error!r}")
+                try:
+                    path, name, size = item
+                    stage(path, name, size, file_sha256(path))
+                except Exception as stage_error:
+                    print(f"[ERROR] Could not stage {path}: {stage_error!r}")
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for entry in walk_images(src_dir):
+            try:
+                size = entry.stat(follow_symlinks=False).st_size
+            except OSError as stat_error:
+                print(f"[ERROR] Cannot read {entry.path}: {stat_error}")
+                continue
+            work.put((entry.path, entry.name, size))
+    finally:
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+    display.finish()
+
+    print(f"[SUMMARY] Uploaded: {counts['uploaded']}, duplicates skipped: {counts['skipped']}, "
+          f"staged for retry: {counts['staged']}")
+    throttled = uploader.upload_throttle().throttled_seconds
+    if throttled:
+        print(f"[THROTTLE] Uploads waited {throttled:.1f}s for the bandwidth limit")
+    return counts["staged"]
 
 
 def main():
     """
     Main entry point. Expects one argument: the device name (e.g., sda1).
-    Mounts the device, copies image files, and unmounts afterward.
+    Mounts the device, copies (or streams) image files, and unmounts afterward.
     """
     if len(sys.argv) < 2:
         print("Device argument missing. Usage: usbcopy.py <device>")
@@ -126,10 +456,20 @@ def main():
     print(f"[START] Copying from {device}")
 
     if mount_device(device, mountpoint):
-        copy_images(Path(mountpoint), Path(target_dir))
+        ledger = Ledger() if Ledger is not None else None
+        try:
+            uploader = load_uploader()
+            staged = None
+            if uploader is not None:
+                staged = stream_images(Path(mountpoint), Path(target_dir), ledger, uploader)
+            if staged is None:
+                copy_images(Path(mountpoint), Path(target_dir), ledger)
+        finally:
+            if ledger is not None:
+                ledger.close()
         unmount_device(mountpoint)
 
-        # After successful copy, trigger upload script
+        # Upload copied files and retry staged ones (and leftovers of earlier runs)
         try:
             print("[UPLOAD] Running put_files.py...")
             subprocess.run(